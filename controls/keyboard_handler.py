@@ -15,6 +15,8 @@ class KeyboardHandler:
             "scan_all": "alt+1",
             "scan_hovered": "alt+2",
             "clear_overlay": "alt+3",
+            "dump_recording": "alt+4",
+            "toggle_watch": "alt+w",
             "toggle_window": "alt+s",
             "exit": "alt+esc"
         }
@@ -25,7 +27,7 @@ class KeyboardHandler:
 
         key = self.keybinds.get(action)
         if not key:
-            logger.warning(f"No keybind found for action: {action}")
+            logger.warning("No keybind found for action: %s", action)
             return False
 
         if keyboard.is_pressed(key) and (current_time - self.last_key_press) >= self.key_cooldown:
@@ -1,6 +1,7 @@
 import win32api
 import time
 from utils.logger import logger
+from utils.tracing import traced
 from typing import Tuple
 
 class MouseController:
@@ -12,6 +13,7 @@ class MouseController:
         return win32api.GetCursorPos()    
     
     # Move mouse to specific coords
+    @traced('mouse.move')
     def move_to(self, x: int, y: int, smooth: bool = True) -> bool:
         try:
             if smooth:
@@ -30,5 +32,5 @@ class MouseController:
 
             return True
         except Exception as e:
-            logger.error(f"Failed to move mouse to ({x}, {y}): {e}")
+            logger.error("Failed to move mouse to (%s, %s): %s", x, y, e)
             return False
@@ -2,6 +2,11 @@ from ui.app_window import AppWindow
 from ui.transparent_overlay import TransparentOverlay
 from controls.keyboard_handler import KeyboardHandler
 from vision.scanner import MapScanner
+from vision.watcher import HoverWatcher
+from utils.tracing import scan_trace
+from utils.metrics import metrics, export_metrics, METRICS_PORT
+from utils.flight_recorder import flight_recorder
+from vision.worker_pool import shutdown_worker_pool
 import time
 
 def main():
@@ -10,6 +15,13 @@ def main():
     app_window = AppWindow()
     transparent_overlay = TransparentOverlay()    
     keyboard_handler = KeyboardHandler()
+    metrics.start_http_server(METRICS_PORT)
+
+    # Scanner keeps its templates and icons loaded for the whole session
+    settings_manager = app_window.settings_manager
+    scanner = MapScanner(transparent_overlay, settings_manager.get_catalog(), settings_manager)
+    # Opt-in passive identification of the hovered map
+    watcher = HoverWatcher(scanner)
 
     while True:
         # Handle Exit/Quit
@@ -21,35 +33,51 @@ def main():
         if keyboard_handler.check_action("toggle_window"):
             app_window.toggle_visibility()
 
-        # Load Settings and Prepare Scanner
-        settings_manager = app_window.settings_manager
+        # Load Settings and share the map catalog (rebuilt only when favorites or colors changed)
         settings_manager.load_settings()
-        scanner = MapScanner(
-            transparent_overlay,
-            settings_manager.get_maps(),
-            settings_manager.get_favorite_maps(),
-            settings_manager.get_colors(),
-            settings_manager          
-        )        
+        catalog = settings_manager.get_catalog()
+        scanner.refresh(catalog)
+        transparent_overlay.set_catalog(catalog)
+        app_window.set_catalog(catalog)
         
         # Handle Full Scan
         if keyboard_handler.check_action("scan_all"):            
             app_window.hide_app()            
-            transparent_overlay.clear_overlay()
-            transparent_overlay.position_window()
-            matches = scanner.scan_screen()
-            if matches:
-                transparent_overlay.update_overlay(matches)
+            with scan_trace("scan_all"), flight_recorder.record_scan("scan_all"):
+                transparent_overlay.clear_overlay()
+                transparent_overlay.position_window()
+                matches = scanner.scan_screen()
+                if matches:
+                    transparent_overlay.update_overlay(matches)
+            app_window.refresh_last_seen()
+            export_metrics()
 
         # Handle Scanning Single Map
         if keyboard_handler.check_action("scan_hovered"):
             app_window.hide_app()
-            # transparent_overlay.clear_overlay()
+            with scan_trace("scan_hovered"), flight_recorder.record_scan("scan_hovered"):
+                # transparent_overlay.clear_overlay()
+                transparent_overlay.position_window()
+                matches = scanner.scan_hovered_map()
+                if matches:
+                    transparent_overlay.update_overlay(matches)       
+            app_window.refresh_last_seen()
+            export_metrics()
+
+
+        # Handle Watch Mode
+        if keyboard_handler.check_action("toggle_watch"):
+            watcher.toggle()
+
+        matches = watcher.poll()
+        if matches:
             transparent_overlay.position_window()
-            matches = scanner.scan_hovered_map()
-            if matches:
-                transparent_overlay.update_overlay(matches)       
+            transparent_overlay.update_overlay(matches)
+            app_window.refresh_last_seen()
 
+        # Handle Dump Flight Recorder
+        if keyboard_handler.check_action("dump_recording"):
+            flight_recorder.dump()
 
         # Handle Clear Overlay
         if keyboard_handler.check_action("clear_overlay"):
@@ -60,6 +88,8 @@ def main():
         # Small sleep to prevent high CPU usage
         time.sleep(0.01)
 
+    shutdown_worker_pool()
+
 if __name__ == "__main__":
     main()
         
\ No newline at end of file
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+DEFAULT_COLOR = '#ffffff'
+
+
+# Map names compared the way OCR reads them: case and extra spaces do not matter
+def normalize_name(name: str) -> str:
+    return ' '.join(name.lower().split())
+
+
+# One entry of maps.json with everything derived from it precomputed
+@dataclass(frozen=True, slots=True)
+class MapInfo:
+    name: str
+    biomes: Tuple[str, ...]
+    layout: str
+    notes: Optional[str]
+    is_favorite: bool
+    color: str
+    # Table cell and sort key: biomes sorted by name
+    biomes_text: str
+    first_biome: str
+    # Overlay label lines that only depend on the map
+    label: str
+
+    # (name, biomes, layout, notes), the tuple OCR returns
+    @property
+    def info(self) -> Tuple:
+        return self.name, self.biomes, self.layout, self.notes
+
+
+# Compiled, read-only view of maps.json, maps_features.json, the favorites and the layout colors.
+# Features are held as bitsets for the strategy filter.
+# Built once per settings version (SettingsManager.get_catalog) and shared by the scanner, overlay and maps table.
+class MapCatalog:
+    def __init__(self, maps: List, maps_features: Dict, favorite_maps: Iterable, colors: Dict) -> None:
+        self.favorites = frozenset(favorite_maps)
+        self.colors = dict(colors)
+
+        # Feature -> (category, category display name, feature display text)
+        self.features: Dict[str, Tuple[str, str, str]] = {}
+        for category, data in maps_features.get('features', {}).items():
+            for feature, text in data.get('items', {}).items():
+                self.features.setdefault(feature, (category, data['display_name'], text))
+        # One bit per feature, in maps_features.json order
+        self.feature_bits = {feature: 1 << i for i, feature in enumerate(self.features)}
+
+        # Maps in maps.json order, the first entry wins for duplicate names
+        self.by_name: Dict[str, MapInfo] = {}
+        for loc in maps:
+            key = normalize_name(loc['name'])
+            if key not in self.by_name:
+                self.by_name[key] = self.build_info(loc)
+        self.maps = tuple(self.by_name.values())
+        self.names = tuple(sorted(info.name for info in self.maps))
+
+        # Candidates for fuzzy OCR matching by word count: (map, lowercase name words)
+        self.by_word_count: Dict[int, Tuple] = {}
+        for info in self.maps:
+            words = tuple(info.name.lower().split())
+            self.by_word_count[len(words)] = self.by_word_count.get(len(words), ()) + ((info, words),)
+
+    def build_info(self, loc: Dict) -> MapInfo:
+        biomes = tuple(loc['biomes'])
+        sorted_biomes = sorted(biomes)
+        return MapInfo(
+            name=loc['name'],
+            biomes=biomes,
+            layout=loc['layout'],
+            notes=loc.get('notes'),
+            is_favorite=loc['name'] in self.favorites,
+            color=self.get_color(loc['layout']),
+            biomes_text=', '.join(sorted_biomes),
+            first_biome=sorted_biomes[0] if sorted_biomes else '',
+            label=self.format_label(loc['name'], biomes, loc['layout'], loc.get('notes'))
+        )
+
+    # Name, biomes, layout and notes lines of an overlay label
+    @staticmethod
+    def format_label(name: str, biomes: Iterable, layout: Optional[str], notes: Optional[str]) -> str:
+        label = f"Name: {name}\n"
+        if biomes: label += f"Biomes: {','.join(biomes)}\n"
+        label += f"Layout: {layout}\n"
+        if notes is not None: label += f"Notes: {notes}"
+        # Check if hideout
+        if layout and layout.lower() == 'hideout':
+            label += "This map is a hideout"
+        return label
+
+    def __len__(self) -> int:
+        return len(self.maps)
+
+    def get(self, name: Optional[str]) -> Optional[MapInfo]:
+        return self.by_name.get(normalize_name(name)) if name else None
+
+    def get_color(self, layout: Optional[str]) -> str:
+        return self.colors.get(layout, DEFAULT_COLOR)
+
+    # Bitset of the known features among `names` (activities or strategy keys), unknown names are ignored
+    def feature_mask(self, names: Iterable) -> int:
+        mask = 0
+        for name in names:
+            mask |= self.feature_bits.get(name, 0)
+        return mask
+
+    def get_feature_category(self, feature_name: str) -> Optional[str]:
+        entry = self.features.get(feature_name)
+        return entry[0] if entry else None
+
+    # Feature texts grouped by category display name, and whether the map has a boss
+    def get_features_display_text(self, feature_names: Iterable) -> Tuple[Dict, bool]:
+        organized_features = {}
+        contains_boss = False
+        for feature in feature_names:
+            if feature == "Boss":
+                contains_boss = True
+            else:
+                entry = self.features.get(feature)
+                if entry:
+                    _, display_name, feature_text = entry
+                    organized_features.setdefault(display_name, []).append(feature_text)
+        return organized_features, contains_boss
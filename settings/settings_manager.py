@@ -2,6 +2,7 @@ import json
 import os
 from utils.logger import logger
 from typing import List, Dict, Optional, Tuple
+from .map_catalog import MapCatalog
 
 class SettingsManager:
 
@@ -16,6 +17,10 @@ class SettingsManager:
         self.maps_features_file_path = 'data/maps_features.json'
         self.maps_features = self.load_maps_features()
 
+        # Compiled map lookups and the settings version they were built for
+        self.catalog: Optional[MapCatalog] = None
+        self.catalog_version = None
+
     # Handle Maps
     def load_maps(self) -> List:
         try:
@@ -24,7 +29,7 @@ class SettingsManager:
                     data = json.load(f)
                     return data['maps']
         except Exception as e:
-            logger.error(f"Error loading maps: {e}")           
+            logger.error("Error loading maps: %s", e)           
         return []
     
     def get_maps(self) -> List:
@@ -47,7 +52,7 @@ class SettingsManager:
                     self.settings = settings
                     return settings
         except Exception as e:            
-            logger.error(f"Error loading settings: {e}") 
+            logger.error("Error loading settings: %s", e) 
         return {}
     
     def save_settings(self, settings: Dict) -> bool:
@@ -56,7 +61,7 @@ class SettingsManager:
                 json.dump(settings, f, indent=4)
             return True
         except Exception as e:
-            logger.error(f"Error saving settings: {e}") 
+            logger.error("Error saving settings: %s", e) 
             return False
         
 
@@ -72,36 +77,25 @@ class SettingsManager:
         return {}
 
     def get_feature_category(self, feature_name: str) -> Optional[str]:
-        for category, data in self.maps_features.get('features', {}).items():
-            if feature_name in data.get('items', {}):
-                return category
-        return None
+        return self.get_catalog().get_feature_category(feature_name)
 
     def get_features_display_text(self, feature_names: List) -> Tuple:
-        organized_features = {}
-        contains_boss = False
-                
-        for feature in feature_names:
-            if feature == "Boss":
-                contains_boss = True
-            else:
-                category = self.get_feature_category(feature)
-                if category:
-                    category_data = self.maps_features['features'][category]
-                    display_name = category_data['display_name']
-                    
-                    if display_name not in organized_features:
-                        organized_features[display_name] = []
-                    
-                    # Get the display text for this specific feature
-                    feature_text = category_data['items'][feature]
-                    organized_features[display_name].append(feature_text)           
-        
-        return organized_features, contains_boss
+        return self.get_catalog().get_features_display_text(feature_names)
 
 
     # Handle Colors
     def get_colors(self) -> Dict:
         return self.settings['colors']
+
+
+    # Handle Map Catalog
+    # The same catalog object is returned until the favorites or colors change (maps and features load once)
+    def get_catalog(self) -> MapCatalog:
+        favorite_maps = tuple(self.settings.get('favorite_maps', []))
+        colors = tuple(self.settings.get('colors', {}).items())
+        if self.catalog is None or (favorite_maps, colors) != self.catalog_version:
+            self.catalog = MapCatalog(self.maps, self.maps_features, favorite_maps, dict(colors))
+            self.catalog_version = (favorite_maps, colors)
+        return self.catalog
     
 
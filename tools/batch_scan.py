@@ -0,0 +1,167 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import zipfile
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List
+from settings.settings_manager import SettingsManager
+from vision.match import MapMatch
+from vision.pipeline import MapPipeline
+from vision.viewport import ViewportMasker
+from utils.flight_recorder import Recording, decode_image
+from utils.logger import forward_logs, get_process_log_queue
+
+
+IMAGE_PATTERNS = ('*.png', '*.jpg', '*.bmp')
+# Files with this in their name are tooltip crops, the rest atlas screenshots (--kind auto)
+TOOLTIP_MARKER = 'tooltip'
+ARCHIVE_SEPARATOR = '::'
+
+# One pipeline per worker process, so templates, icons and the title index load once per worker
+_pipeline: Dict = {}
+
+def init_worker(log_queue: Any = None) -> None:
+    if log_queue is not None:
+        # Only the main process writes the log file
+        forward_logs(log_queue)
+    # Workers run in parallel already, OpenCV's own threads would only compete with each other
+    cv2.setNumThreads(1)
+    settings_manager = SettingsManager()
+    _pipeline['pipeline'] = MapPipeline(
+        settings_manager.get_catalog(),
+        settings_manager,
+        # Frames come in any order from many sessions: no calibration writes, no learned viewport
+        auto_calibrate=False,
+        viewport=ViewportMasker(auto=False),
+        # Files are already spread over processes
+        worker_pool=False,
+        # Read-only with respect to user data: workers would overwrite each other's title index
+        learn_titles=False
+    )
+
+def get_pipeline() -> MapPipeline:
+    if 'pipeline' not in _pipeline:
+        init_worker()
+    return _pipeline['pipeline']
+
+def get_kind(image_path: str, kind: str) -> str:
+    if kind != 'auto':
+        return kind
+    return 'tooltip' if TOOLTIP_MARKER in os.path.basename(image_path).lower() else 'atlas'
+
+# An image file, or an image inside a flight recorder archive ("archive.zip::member")
+def read_image(image_path: str) -> np.ndarray:
+    if ARCHIVE_SEPARATOR in image_path:
+        archive_path, member = image_path.split(ARCHIVE_SEPARATOR, 1)
+        with zipfile.ZipFile(archive_path) as archive:
+            image = decode_image(archive.read(member))
+        # Recorded frames may be BGRA captures, the pipeline works on BGR
+        if image is not None and image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        return image
+    return cv2.imread(image_path, cv2.IMREAD_COLOR)
+
+# Scan one file: atlas screenshots are detected, tooltip crops identified and strategy filtered.
+# Replayed recordings pass what the live scan found as a third item, it is kept next to the new result.
+def scan_file(task: tuple) -> Dict:
+    image_path, kind = task[:2]
+    record = {'file': image_path, 'kind': kind}
+    if len(task) > 2:
+        record['recorded'] = task[2]
+    start = time.perf_counter()
+    try:
+        image = read_image(image_path)
+        if image is None:
+            record['error'] = 'unreadable image'
+            return record
+        record['size'] = [image.shape[1], image.shape[0]]
+        pipeline = get_pipeline()
+
+        if kind == 'atlas':
+            detect_start = time.perf_counter()
+            matches = pipeline.detect(image)
+            record['detect_ms'] = round((time.perf_counter() - detect_start) * 1000, 2)
+            record['matches'] = [match.to_dict() for match in matches]
+        else:
+            identify_start = time.perf_counter()
+            match = pipeline.identify(image, MapMatch(position=(0, 0), size=(image.shape[1], image.shape[0])))
+            record['identify_ms'] = round((time.perf_counter() - identify_start) * 1000, 2)
+            record['map'] = match.to_dict() if match else None
+            record['included'] = bool(match and pipeline.should_include_match(match))
+    except Exception as e:
+        record['error'] = str(e)
+    record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+def list_images(folder: str, recursive: bool) -> List[str]:
+    files = set()
+    for pattern in IMAGE_PATTERNS:
+        files.update(glob.glob(os.path.join(folder, '**', pattern) if recursive else os.path.join(folder, pattern), recursive=recursive))
+    return sorted(files)
+
+# Replay tasks of a flight recorder archive: every atlas frame and tooltip crop, with the recorded outcome
+def get_recording_tasks(archive_path: str) -> List[tuple]:
+    tasks = []
+    for scan in Recording(archive_path).scans:
+        if scan['frame']:
+            tasks.append((archive_path + ARCHIVE_SEPARATOR + scan['frame'], 'atlas', {'candidates': len(scan['candidates'])}))
+        for tooltip in scan['tooltips']:
+            result = tooltip['result']
+            tasks.append((archive_path + ARCHIVE_SEPARATOR + tooltip['image'], 'tooltip', {'map_name': result['map_name'] if result else None}))
+    return tasks
+
+def run(files: List[str], kind: str, workers: int) -> Iterator[Dict]:
+    tasks = []
+    for image_path in files:
+        if Recording.is_recording(image_path):
+            tasks.extend(get_recording_tasks(image_path))
+        else:
+            tasks.append((image_path, get_kind(image_path, kind)))
+    yield from run_tasks(tasks, workers)
+
+def run_tasks(tasks: List[tuple], workers: int) -> Iterator[Dict]:
+    if workers <= 1:
+        for task in tasks:
+            yield scan_file(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(get_process_log_queue(),)) as executor:
+        # Results come back in input order, chunks keep the inter-process overhead low
+        yield from executor.map(scan_file, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run map detection and identification over saved screenshots, one JSON line per file.")
+    parser.add_argument('folder', help="Folder with atlas screenshots and/or tooltip crops, or a flight recorder archive (.zip)")
+    parser.add_argument('--kind', choices=('auto', 'atlas', 'tooltip'), default='auto', help=f"auto: files named *{TOOLTIP_MARKER}* are tooltip crops")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes (1 = run in this process)")
+    parser.add_argument('--output', help="JSONL file to write (default: stdout)")
+    parser.add_argument('--recursive', action='store_true')
+    args = parser.parse_args()
+
+    files = [args.folder] if os.path.isfile(args.folder) else list_images(args.folder, args.recursive)
+    if not files:
+        print(f"No images found in {args.folder}", file=sys.stderr)
+        return
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    scanned, errors = 0, 0
+    try:
+        for record in run(files, args.kind, args.workers):
+            scanned += 1
+            errors += 'error' in record
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Scanned {scanned} images in {elapsed:.1f}s ({scanned / elapsed:.1f} images/s, {errors} errors)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
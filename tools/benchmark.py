@@ -0,0 +1,149 @@
+import argparse
+import csv
+import json
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List
+from utils.tracing import tracer
+from vision.detection import create_detector, MapDetector, TemplateMatchDetector, DETECTOR, DETECTOR_BACKENDS, MATCH_DOMAIN
+from vision.templates import MATCH_DOMAINS
+from tools.corpus import iter_corpus, load_params, score_detections, summarize_scores
+
+
+# Total time per traced stage (span name) while it is attached to the tracer
+class StageTimer:
+    def __init__(self) -> None:
+        self.totals = defaultdict(float)
+
+    def on_span(self, name: str, duration: float, args: Dict) -> None:
+        self.totals[name] += duration
+
+    def __enter__(self) -> 'StageTimer':
+        tracer.add_listener(self.on_span)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        tracer.remove_listener(self.on_span)
+
+
+# Run a detector over every corpus frame and collect timing and accuracy.
+# `rows` collects one entry per frame (size, node count, per-stage times) for the CSV export.
+def benchmark_detector(corpus: List, detector: MapDetector, domain: str, repeat: int, rows: List = None) -> Dict:
+    # Warm up, so template loading and session setup aren't counted as scan time
+    if corpus:
+        detector.detect(corpus[0][1])
+
+    timings = []
+    totals = {'true_positives': 0, 'false_positives': 0, 'false_negatives': 0}
+    detections = 0
+    has_truth = False
+    for image_path, image, boxes in corpus:
+        frame_timings = []
+        with StageTimer() as stages:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                matches = detector.detect(image)
+                frame_timings.append(time.perf_counter() - start)
+        timings.append(statistics.median(frame_timings))
+        detections += len(matches)
+
+        score = None
+        if boxes is not None:
+            has_truth = True
+            score = score_detections(matches, boxes)
+            for key in totals:
+                totals[key] += score[key]
+
+        if rows is not None:
+            params = load_params(image_path)
+            row = {
+                'file': image_path,
+                'detector': detector.name,
+                'domain': domain,
+                'width': image.shape[1],
+                'height': image.shape[0],
+                'nodes': len(boxes) if boxes is not None else '',
+                'occlusion': params.get('occlusion', ''),
+                'scale': params.get('scale', ''),
+                'background': params.get('background', ''),
+                'median_ms': round(statistics.median(frame_timings) * 1000, 3),
+                'detections': len(matches),
+                'true_positives': score['true_positives'] if score else ''
+            }
+            # Mean time of every stage per run (a stage may run many times per detect)
+            for name, total in stages.totals.items():
+                row[f"stage:{name}"] = round(total / repeat * 1000, 3)
+            rows.append(row)
+
+    precision, recall = summarize_scores(**totals) if has_truth else (None, None)
+    return {
+        'detector': detector.name,
+        'domain': domain,
+        'frames': len(corpus),
+        'median_ms': statistics.median(timings) * 1000 if timings else 0.0,
+        'mean_ms': statistics.mean(timings) * 1000 if timings else 0.0,
+        'detections': detections,
+        'precision': precision,
+        'recall': recall
+    }
+
+def format_row(result: Dict) -> str:
+    def ratio(value):
+        return f"{value:.3f}" if value is not None else '-'
+    return (f"{result['detector']:<10}{result['domain']:<8}{result['frames']:>7}{result['median_ms']:>12.1f}{result['mean_ms']:>10.1f}"
+            f"{result['detections']:>12}{ratio(result['precision']):>11}{ratio(result['recall']):>9}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark map detection over a folder of atlas screenshots.")
+    parser.add_argument('corpus', help="Folder with *.png screenshots and optional <name>.json ground truth")
+    parser.add_argument('--detectors', nargs='+', choices=sorted(DETECTOR_BACKENDS), default=[DETECTOR], help="Detector backends to compare")
+    parser.add_argument('--domains', nargs='+', choices=MATCH_DOMAINS, default=[MATCH_DOMAIN], help="Matching domains to compare (template detector)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per frame, the median is reported")
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--csv', help="Write one row per frame and detector, with frame size, node count and per-stage times")
+    args = parser.parse_args()
+
+    corpus = list(iter_corpus(args.corpus))
+    if not corpus:
+        print(f"No screenshots found in {args.corpus}")
+        return
+
+    results = []
+    rows = [] if args.csv else None
+    print(f"{'detector':<10}{'domain':<8}{'frames':>7}{'median_ms':>12}{'mean_ms':>10}{'detections':>12}{'precision':>11}{'recall':>9}")
+    for name in args.detectors:
+        if name == 'template':
+            runs = [(TemplateMatchDetector(args.threshold, domain), domain) for domain in args.domains]
+        else:
+            detector = create_detector(name)
+            if detector.name != name:
+                print(f"Skipping {name}: detector could not be created")
+                continue
+            runs = [(detector, '-')]
+
+        for detector, domain in runs:
+            result = benchmark_detector(corpus, detector, domain, args.repeat, rows)
+            results.append(result)
+            print(format_row(result))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if rows:
+        write_csv(args.csv, rows)
+
+def write_csv(csv_path: str, rows: List[Dict]) -> None:
+    columns = list(rows[0].keys())
+    # Stages differ per detector, every stage seen gets a column
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__ == '__main__':
+    main()
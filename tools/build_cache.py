@@ -0,0 +1,20 @@
+import argparse
+import os
+import time
+from vision.image_cache import build_image_cache, IMAGE_CACHE_FILE, REFS_FOLDER_PATH, ICONS_DIR
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute all template variants and icons into the memory-mapped image cache.")
+    parser.add_argument('--output', default=IMAGE_CACHE_FILE, help="Cache file (default: image_cache_file setting)")
+    parser.add_argument('--refs', default=REFS_FOLDER_PATH, help="Refs glob pattern (default: refs_folder setting)")
+    parser.add_argument('--icons', default=ICONS_DIR, help="Icons folder")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = build_image_cache(args.output, args.refs, args.icons)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {len(cache.entries)} images ({os.path.getsize(args.output) / 1024:.0f} KB) to {args.output} in {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    main()
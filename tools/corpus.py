@@ -0,0 +1,65 @@
+import glob
+import json
+import os
+import cv2
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# A corpus is a folder of atlas screenshots (*.png). A screenshot may have a sidecar
+# <name>.json with ground truth: {"boxes": [[x, y, w, h], ...]}, and the generator
+# parameters of synthetic frames (tools.synthetic): {"params": {...}}.
+def list_corpus(folder: str) -> List:
+    return sorted(glob.glob(os.path.join(folder, '*.png')))
+
+def load_sidecar(image_path: str) -> Optional[Dict]:
+    truth_path = os.path.splitext(image_path)[0] + '.json'
+    if not os.path.exists(truth_path):
+        return None
+    with open(truth_path, 'r') as f:
+        return json.load(f)
+
+def load_ground_truth(image_path: str) -> Optional[List]:
+    sidecar = load_sidecar(image_path)
+    if sidecar is None:
+        return None
+    return [tuple(box) for box in sidecar.get('boxes', [])]
+
+def load_params(image_path: str) -> Dict:
+    sidecar = load_sidecar(image_path)
+    return sidecar.get('params', {}) if sidecar else {}
+
+def iter_corpus(folder: str) -> Iterator[Tuple[str, np.ndarray, Optional[List]]]:
+    for image_path in list_corpus(folder):
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is not None:
+            yield image_path, image, load_ground_truth(image_path)
+
+# Match detections to ground truth boxes one-to-one: a box is found when a detection center lies inside it
+def score_detections(matches: List, boxes: List) -> Dict:
+    # Box indexes, duplicate boxes are separate ground truth entries
+    unmatched = list(range(len(boxes)))
+    true_positives = 0
+    for match in matches:
+        center_x, center_y = match.center
+        for index in unmatched:
+            x, y, w, h = boxes[index]
+            if x <= center_x < x + w and y <= center_y < y + h:
+                unmatched.remove(index)
+                true_positives += 1
+                break
+
+    found = [index for index in range(len(boxes)) if index not in unmatched]
+    return {
+        'true_positives': true_positives,
+        'false_positives': len(matches) - true_positives,
+        'false_negatives': len(unmatched),
+        'found_indexes': found,
+        'found_boxes': [boxes[index] for index in found]
+    }
+
+# Precision and recall from summed scores
+def summarize_scores(true_positives: int, false_positives: int, false_negatives: int) -> Tuple[float, float]:
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 0.0
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 0.0
+    return precision, recall
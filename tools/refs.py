@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Set
+from vision.detection import match_variant, get_match_regions, REFS_FOLDER_PATH, DEFAULT_SCALES, DEFAULT_ROTATIONS, MATCH_DOMAIN, MAX_OVERLAP, COLOR_GATE_DOWNSCALE
+from vision.color_gate import ColorGate
+from vision.match import MatchBatch
+from vision.templates import TemplateBank, MANIFEST_NAME, get_manifest_path, to_domain
+from tools.corpus import iter_corpus, score_detections
+
+
+# Refs are compared at this size, so small crops of the same map line up
+COMPARE_SIZE = 32
+# Refs whose difference hashes differ in more bits than this are never compared by NCC
+MAX_HASH_DISTANCE = 20
+# Masked refs: a pixel is part of the stable core when every ref is within STABLE_SPREAD gray levels
+# of their median, and a masked ref needs MIN_STABLE_SHARE stable pixels (less would match anything)
+STABLE_SPREAD = 24
+MIN_STABLE_SHARE = 0.5
+MASKED_PREFIX = 'masked_'
+
+
+# 64-bit difference hash: sign of horizontal gradients on an 9x8 grayscale thumbnail
+def difference_hash(image: np.ndarray) -> int:
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(sum(1 << i for i, bit in enumerate(bits) if bit))
+
+# Normalized cross-correlation of two refs resized to the same size
+def ref_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    first = cv2.resize(first, (COMPARE_SIZE, COMPARE_SIZE), interpolation=cv2.INTER_AREA)
+    second = cv2.resize(second, (COMPARE_SIZE, COMPARE_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.matchTemplate(first, second, cv2.TM_CCOEFF_NORMED)[0, 0])
+
+
+class UnionFind:
+    def __init__(self, size: int) -> None:
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, first: int, second: int) -> None:
+        self.parent[self.find(first)] = self.find(second)
+
+    def groups(self) -> List[List[int]]:
+        groups = {}
+        for item in range(len(self.parent)):
+            groups.setdefault(self.find(item), []).append(item)
+        return sorted(groups.values(), key=lambda group: group[0])
+
+
+# Cluster near-identical refs: pairs close in dHash and above the NCC threshold are joined
+def cluster_refs(images: List[np.ndarray], threshold: float) -> List[List[int]]:
+    hashes = [difference_hash(image) for image in images]
+    union_find = UnionFind(len(images))
+    for i in range(len(images)):
+        for j in range(i + 1, len(images)):
+            if bin(hashes[i] ^ hashes[j]).count('1') > MAX_HASH_DISTANCE:
+                continue
+            if ref_similarity(images[i], images[j]) >= threshold:
+                union_find.union(i, j)
+    return union_find.groups()
+
+# Share of pixels two refs agree on (brightness within STABLE_SPREAD) once resized to the same size.
+# Unlike NCC it stays high when an occluder covers part of one ref.
+def pixel_agreement(first: np.ndarray, second: np.ndarray) -> float:
+    first = cv2.cvtColor(cv2.resize(first, (COMPARE_SIZE, COMPARE_SIZE), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    second = cv2.cvtColor(cv2.resize(second, (COMPARE_SIZE, COMPARE_SIZE), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    return float(np.count_nonzero(cv2.absdiff(first, second) <= STABLE_SPREAD)) / first.size
+
+# One ref standing for a whole cluster: the per-pixel median of its refs, transparent where they disagree
+# (effects or structures covering the map in some of them). None when too little of it is stable.
+def derive_masked_ref(images: List[np.ndarray]) -> Optional[np.ndarray]:
+    height, width = images[0].shape[:2]
+    stack = np.stack([cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA) for image in images])
+    median = np.median(stack, axis=0).astype(np.uint8)
+    # Anything covering the map in one of the refs makes its pixels unstable, they are left out of matching
+    brightness = stack.astype(np.float32).mean(axis=3)
+    agreeing = (np.abs(brightness - median.astype(np.float32).mean(axis=2)) <= STABLE_SPREAD).all(axis=0)
+
+    stable = np.where(agreeing, 255, 0).astype(np.uint8)
+    # Drop isolated stable pixels inside unstable areas
+    stable = cv2.morphologyEx(stable, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    if np.count_nonzero(stable) < MIN_STABLE_SHARE * stable.size:
+        return None
+    return np.dstack([median, stable])
+
+# Masked refs for every group of at least two refs agreeing pairwise on `agreement` of their pixels:
+# {masked ref name: (BGRA image, member indexes)}
+def derive_masked_refs(names: List[str], images: List[np.ndarray], agreement: float) -> Dict:
+    # Masked refs of an earlier run are refs too, but are not merged again
+    indexes = [index for index, name in enumerate(names) if not name.startswith(MASKED_PREFIX) and images[index] is not None]
+    # A ref joins the first group it agrees with completely, so occluders shared by different maps don't chain groups
+    groups = []
+    for index in indexes:
+        for group in groups:
+            if all(pixel_agreement(images[index], images[member]) >= agreement for member in group):
+                group.append(index)
+                break
+        else:
+            groups.append([index])
+
+    masked = {}
+    for members in groups:
+        if len(members) < 2 or MASKED_PREFIX + names[members[0]] in names:
+            continue
+        image = derive_masked_ref([images[index] for index in members])
+        if image is not None:
+            masked[MASKED_PREFIX + names[members[0]]] = (image, members)
+    return masked
+
+# Ground truth boxes (frame index, box index) each ref finds on its own over the corpus
+def measure_coverage(bank: TemplateBank, corpus: List, threshold: float) -> List[Set]:
+    coverage = [set() for _ in bank.template_files]
+    for frame_index, (_, image, boxes) in enumerate(corpus):
+        frame = to_domain(image, bank.domain)
+        gate = ColorGate(image, COLOR_GATE_DOWNSCALE)
+        regions = get_match_regions(gate, bank, frame.shape, (0, 0))
+
+        batches = {}
+        for variant in bank.variants:
+            batches.setdefault(variant.template_index, []).extend(match_variant(frame, variant, regions, threshold, (0, 0), gate))
+        for template_index, template_batches in batches.items():
+            matches = MatchBatch.concatenate(template_batches).non_max_suppression(MAX_OVERLAP).to_matches(bank.template_files)
+            for box_index in score_detections(matches, boxes)['found_indexes']:
+                coverage[template_index].add((frame_index, box_index))
+    return coverage
+
+# Boxes each masked ref finds, matched from a temporary refs folder
+def measure_masked_coverage(masked: Dict, corpus: List, threshold: float) -> Dict[str, Set]:
+    with tempfile.TemporaryDirectory() as folder:
+        for name, (image, _) in masked.items():
+            cv2.imwrite(os.path.join(folder, name), image)
+        bank = TemplateBank(os.path.join(folder, '*.png'), DEFAULT_SCALES, DEFAULT_ROTATIONS, MATCH_DOMAIN, use_manifest=False)
+        coverage = measure_coverage(bank, corpus, threshold)
+    return {os.path.basename(template_file): found for template_file, found in zip(bank.template_files, coverage)}
+
+# Greedy set cover: repeatedly keep the ref that finds the most boxes not found yet.
+# `replaced` refs (merged into a masked ref) are never kept.
+def select_refs(coverage: List[Set], clusters: List[List[int]], replaced: Optional[Set] = None) -> List[int]:
+    selected = []
+    covered = set()
+    remaining = set(range(len(coverage))) - (replaced or set())
+    while remaining:
+        best = max(sorted(remaining), key=lambda index: len(coverage[index] - covered))
+        if not coverage[best] - covered:
+            break
+        selected.append(best)
+        covered |= coverage[best]
+        remaining.discard(best)
+
+    # Clusters no corpus box needed still keep one ref, the corpus may just not show those maps
+    for cluster in clusters:
+        if not any(index in selected for index in cluster) and not any(coverage[index] for index in cluster):
+            selected.append(cluster[0])
+    return sorted(selected)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Find redundant refs and write a manifest of the refs worth matching.")
+    parser.add_argument('--refs', default=REFS_FOLDER_PATH, help="Refs glob pattern (default: refs_folder setting)")
+    parser.add_argument('--corpus', help="Folder of screenshots with ground truth, to measure each ref's contribution to recall")
+    parser.add_argument('--similarity', type=float, default=0.9, help="NCC above which two refs are duplicates")
+    parser.add_argument('--threshold', type=float, default=0.7, help="Template matching threshold used on the corpus")
+    parser.add_argument('--masks', action='store_true', help="Merge groups of similar refs into one masked ref (transparent where they differ)")
+    parser.add_argument('--mask-agreement', type=float, default=0.6, help="Share of matching pixels above which refs are merged into a masked ref")
+    parser.add_argument('--write', action='store_true', help=f"Write {MANIFEST_NAME} next to the refs, the scanner then skips the redundant refs")
+    args = parser.parse_args()
+    # Masked refs replace verified refs in the manifest, so they must be verified on a corpus first
+    if args.write and args.masks and not args.corpus:
+        parser.error("--masks --write needs --corpus to verify the masked refs")
+
+    # Every ref is evaluated, including the ones an existing manifest skips
+    bank = TemplateBank(args.refs, DEFAULT_SCALES, DEFAULT_ROTATIONS, MATCH_DOMAIN, use_manifest=False)
+    if not bank.template_files:
+        print(f"No refs found for {args.refs}")
+        return
+    names = [os.path.basename(template_file) for template_file in bank.template_files]
+    images = [cv2.imread(template_file) for template_file in bank.template_files]
+    # Unreadable refs match nothing, they are left out of every cluster and end up skipped
+    readable = [index for index, image in enumerate(images) if image is not None]
+    if len(readable) < len(images):
+        print(f"Unreadable refs, skipped: {', '.join(names[index] for index in range(len(names)) if images[index] is None)}")
+
+    clusters = [[readable[i] for i in cluster] for cluster in cluster_refs([images[index] for index in readable], args.similarity)]
+    print(f"{len(names)} refs in {len(clusters)} clusters")
+    for cluster in clusters:
+        if len(cluster) > 1:
+            print(f"  duplicates: {', '.join(names[index] for index in cluster)}")
+
+    corpus = [item for item in iter_corpus(args.corpus) if item[2] is not None] if args.corpus else []
+    coverage = measure_coverage(bank, corpus, args.threshold) if corpus else None
+
+    masked = derive_masked_refs(names, images, args.mask_agreement) if args.masks else {}
+    if masked and coverage is not None:
+        # A masked ref only replaces its cluster when it finds every box the cluster's refs found
+        masked_coverage = measure_masked_coverage(masked, corpus, args.threshold)
+        for name in list(masked):
+            missing = set().union(*(coverage[index] for index in masked[name][1])) - masked_coverage[name]
+            if missing:
+                print(f"  {name}: misses {len(missing)} boxes its refs find, not used")
+                del masked[name]
+    for name, (_, members) in masked.items():
+        print(f"  {name} covers: {', '.join(names[index] for index in members)}")
+
+    # Masked refs take the place of the refs they cover, duplicates of covered refs go with them
+    replaced = {index for _, members in masked.values() for index in members}
+    masked_names = list(masked)
+    clusters = [cluster for cluster in clusters if not replaced.intersection(cluster)]
+    clusters += [[len(names) + i] for i in range(len(masked_names))]
+    names = names + masked_names
+
+    if coverage is not None:
+        coverage = coverage + [masked_coverage[name] for name in masked_names] if masked_names else coverage
+        total_boxes = sum(len(boxes) for _, _, boxes in corpus)
+        all_covered = set().union(*coverage)
+        print(f"\n{'ref':<24}{'recall':>8}{'marginal':>10}")
+        for index, name in enumerate(names):
+            others = set().union(*(coverage[other] for other in range(len(coverage)) if other != index))
+            marginal = len(coverage[index] - others) / total_boxes if total_boxes else 0.0
+            print(f"{name:<24}{len(coverage[index]) / max(total_boxes, 1):>8.3f}{marginal:>10.3f}")
+        print(f"\nRecall with all refs: {len(all_covered) / max(total_boxes, 1):.3f} over {len(corpus)} frames")
+        selected = select_refs(coverage, clusters, replaced)
+    else:
+        if args.corpus:
+            print("No screenshots with ground truth found, keeping one ref per cluster")
+        if masked_names:
+            print("Masked refs are used without checking their recall (no corpus)")
+            if args.write:
+                print("Not writing: masked refs need screenshots with ground truth to be verified")
+                return
+        selected = sorted(cluster[0] for cluster in clusters)
+
+    excluded = [names[index] for index in range(len(names)) if index not in selected]
+    print(f"\nKeeping {len(selected)} of {len(names)} refs, skipping: {', '.join(excluded) or 'none'}")
+
+    if args.write:
+        # Masked refs are written next to the refs, the manifest keeps them and skips the refs they replace.
+        # A masked ref the selection did not need is not written.
+        masked_names = [name for name in masked_names if names.index(name) in selected]
+        for name in masked_names:
+            cv2.imwrite(os.path.join(os.path.dirname(args.refs), name), masked[name][0])
+        manifest = {
+            'version': 1,
+            'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'similarity': args.similarity,
+            'corpus': args.corpus,
+            'kept': [names[index] for index in selected],
+            'excluded': excluded,
+            'clusters': [[names[index] for index in cluster] for cluster in clusters if len(cluster) > 1],
+            'masked': {name: [names[index] for index in masked[name][1]] for name in masked_names}
+        }
+        manifest_path = get_manifest_path(args.refs)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        print(f"Manifest written to {manifest_path}")
+
+if __name__ == '__main__':
+    main()
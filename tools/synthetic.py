@@ -0,0 +1,153 @@
+import argparse
+import glob
+import itertools
+import json
+import os
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from vision.templates import list_templates
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+REFS_FOLDER_PATH = settings.get('refs_folder', '')
+ICONS_DIR = 'data/icons'
+
+BACKGROUNDS = ('dark', 'noise', 'gradient')
+# Minimum free space between two nodes, in node sizes
+NODE_SPACING = 1.5
+# Placement attempts per node before the frame is declared full
+MAX_PLACEMENT_TRIES = 50
+
+
+def parse_resolution(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+# Images as BGR or BGRA (grayscale files are converted), unreadable files are skipped
+def load_images(pattern: str, flags: int) -> List[np.ndarray]:
+    images = [cv2.imread(path, flags) for path in sorted(glob.glob(pattern))]
+    return [cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image for image in images if image is not None]
+
+# Dark atlas-like backdrop: plain, blurred noise (fog and terrain) or a vertical gradient
+def make_background(size: Tuple[int, int], kind: str, rng: np.random.Generator) -> np.ndarray:
+    width, height = size
+    if kind == 'dark':
+        return np.full((height, width, 3), 18, dtype=np.uint8)
+    if kind == 'noise':
+        # Low resolution noise scaled up gives soft blotches, fine noise on top gives texture
+        coarse = rng.integers(5, 60, size=(max(1, height // 32), max(1, width // 32), 3), dtype=np.uint8)
+        background = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+        fine = rng.integers(0, 12, size=(height, width, 3), dtype=np.uint8)
+        return cv2.add(background, fine)
+    if kind == 'gradient':
+        ramp = np.linspace(8, 70, height, dtype=np.float32)[:, None, None]
+        tint = np.array([1.0, 0.8, 0.6], dtype=np.float32)[None, None, :]
+        return np.broadcast_to(ramp * tint, (height, width, 3)).astype(np.uint8)
+    raise ValueError(f"Unknown background {kind}")
+
+# Alpha blend `overlay` (BGR or BGRA) into `frame` at (x, y), clipped to the frame
+def paste(frame: np.ndarray, overlay: np.ndarray, x: int, y: int) -> None:
+    h, w = overlay.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(frame.shape[1], x + w), min(frame.shape[0], y + h)
+    if x1 <= x0 or y1 <= y0:
+        return
+    part = overlay[y0 - y:y1 - y, x0 - x:x1 - x]
+    if part.shape[2] == 4:
+        alpha = part[:, :, 3:4].astype(np.float32) / 255
+        target = frame[y0:y1, x0:x1].astype(np.float32)
+        frame[y0:y1, x0:x1] = (part[:, :, :3] * alpha + target * (1 - alpha)).astype(np.uint8)
+    else:
+        frame[y0:y1, x0:x1] = part
+
+# Random non-overlapping boxes of the given sizes, fewer than asked when the frame fills up
+def place_nodes(frame_size: Tuple[int, int], sizes: List[Tuple[int, int]], rng: np.random.Generator) -> List[Tuple[int, int, int, int]]:
+    width, height = frame_size
+    boxes = []
+    for w, h in sizes:
+        margin_x, margin_y = int(w * (NODE_SPACING - 1)), int(h * (NODE_SPACING - 1))
+        for _ in range(MAX_PLACEMENT_TRIES):
+            x = int(rng.integers(0, max(1, width - w)))
+            y = int(rng.integers(0, max(1, height - h)))
+            if all(x + w + margin_x <= bx or bx + bw + margin_x <= x or y + h + margin_y <= by or by + bh + margin_y <= y
+                   for bx, by, bw, bh in boxes):
+                boxes.append((x, y, w, h))
+                break
+    return boxes
+
+# One synthetic atlas frame and its ground truth boxes.
+# `occlusion` is the fraction of every node covered by an activity icon (0 = none).
+def generate_frame(refs: List[np.ndarray], icons: List[np.ndarray], resolution: Tuple[int, int], nodes: int, scale: float = 1.0,
+                   occlusion: float = 0.0, background: str = 'noise', rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, List]:
+    rng = rng if rng is not None else np.random.default_rng()
+    frame = make_background(resolution, background, rng)
+
+    chosen = [refs[i] for i in rng.integers(0, len(refs), size=nodes)]
+    if scale != 1.0:
+        chosen = [cv2.resize(ref, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC) for ref in chosen]
+    boxes = place_nodes(resolution, [(ref.shape[1], ref.shape[0]) for ref in chosen], rng)
+
+    for (x, y, w, h), ref in zip(boxes, chosen):
+        # Small brightness changes, nodes are never rendered exactly like the refs
+        node = cv2.convertScaleAbs(ref, alpha=float(rng.uniform(0.9, 1.1)), beta=float(rng.uniform(-8, 8)))
+        paste(frame, node, x, y)
+
+        if occlusion > 0 and icons:
+            # Icon over a random corner, sized to cover `occlusion` of the node area
+            icon = icons[int(rng.integers(0, len(icons)))]
+            side = max(2, int(round(np.sqrt(occlusion * w * h))))
+            icon = cv2.resize(icon, (side, side), interpolation=cv2.INTER_AREA)
+            corner_x = x - side // 3 if rng.random() < 0.5 else x + w - side + side // 3
+            corner_y = y - side // 3 if rng.random() < 0.5 else y + h - side + side // 3
+            paste(frame, icon, corner_x, corner_y)
+
+    return frame, [list(box) for box in boxes]
+
+# Write one frame per parameter combination (and repeat) as a benchmark corpus: <name>.png with a <name>.json ground truth
+def generate_corpus(output: str, refs: List[np.ndarray], icons: List[np.ndarray], resolutions: List, node_counts: List[int], scales: List[float],
+                    occlusions: List[float], backgrounds: List[str], frames: int = 1, seed: int = 0) -> List[str]:
+    os.makedirs(output, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    written = []
+    for resolution, nodes, scale, occlusion, background in itertools.product(resolutions, node_counts, scales, occlusions, backgrounds):
+        for index in range(frames):
+            frame, boxes = generate_frame(refs, icons, resolution, nodes, scale, occlusion, background, rng)
+            name = f"synthetic_{resolution[0]}x{resolution[1]}_n{nodes}_s{scale:g}_o{occlusion:g}_{background}_{index:02d}"
+            image_path = os.path.join(output, name + '.png')
+            cv2.imwrite(image_path, frame)
+            params = {'resolution': list(resolution), 'nodes': nodes, 'placed': len(boxes), 'scale': scale, 'occlusion': occlusion, 'background': background}
+            with open(os.path.join(output, name + '.json'), 'w') as f:
+                json.dump({'boxes': boxes, 'params': params}, f)
+            written.append(image_path)
+    return written
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic atlas frames with ground truth for tools.benchmark.")
+    parser.add_argument('output', help="Folder to write the frames and their ground truth to")
+    parser.add_argument('--refs', default=REFS_FOLDER_PATH, help="Glob pattern of the reference images")
+    parser.add_argument('--icons', default=os.path.join(ICONS_DIR, '*.png'), help="Glob pattern of the activity icons (occluders)")
+    parser.add_argument('--resolutions', nargs='+', type=parse_resolution, default=[(1920, 1080)], help="WIDTHxHEIGHT, e.g. 1920x1080 3840x2160")
+    parser.add_argument('--nodes', nargs='+', type=int, default=[30], help="Nodes per frame")
+    parser.add_argument('--scales', nargs='+', type=float, default=[1.0], help="Node scale relative to the refs")
+    parser.add_argument('--occlusion', nargs='+', type=float, default=[0.0], help="Fraction of each node covered by an icon")
+    parser.add_argument('--backgrounds', nargs='+', choices=BACKGROUNDS, default=['noise'])
+    parser.add_argument('--frames', type=int, default=1, help="Frames per parameter combination")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    refs = [cv2.imread(path, cv2.IMREAD_COLOR) for path in list_templates(args.refs)]
+    refs = [ref for ref in refs if ref is not None]
+    if not refs:
+        print(f"No reference images found for {args.refs}")
+        return
+    icons = load_images(args.icons, cv2.IMREAD_UNCHANGED)
+
+    written = generate_corpus(args.output, refs, icons, args.resolutions, args.nodes, args.scales,
+                              args.occlusion, args.backgrounds, args.frames, args.seed)
+    print(f"Wrote {len(written)} frames to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 import tkinter as tk
 import customtkinter as ctk
 from settings.settings_manager import SettingsManager
+from settings.map_catalog import MapCatalog
 from .maps_table import MapsTable
 from .color_picker import ColorPicker
 from utils.logger import logger
+from utils.scan_history import scan_history
 
 
 
@@ -148,19 +150,23 @@ class AppWindow:
         maps_frame = ctk.CTkFrame(self.tabview.tab("Maps"))
         maps_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-        # Get maps and favorite maps
-        maps = self.settings_manager.get_maps()
-        favorite_maps = self.settings_manager.get_favorite_maps()
-        
-        # Create the Maps Table
+        # Create the Maps Table from the shared map catalog
         self.maps_table = MapsTable(
             maps_frame,
-            maps, 
-            favorite_maps,
-            self.on_favourite_changed
+            self.settings_manager.get_catalog(),
+            self.on_favourite_changed,
+            scan_history.get_last_seen()
         )
         self.maps_table.pack(fill=tk.BOTH, expand=True)
 
+    # Show the catalog of the current settings in the Maps tab (favorites changed outside the table)
+    def set_catalog(self, catalog: MapCatalog) -> None:
+        self.maps_table.set_catalog(catalog)
+
+    # Show the latest scan results in the Maps tab
+    def refresh_last_seen(self) -> None:
+        self.maps_table.update_last_seen(scan_history.get_last_seen())
+
     def on_favourite_changed(self, map_name: str, is_favorite: bool) -> None:
         try:
             current_settings = self.settings_manager.settings.copy()
@@ -173,14 +179,14 @@ class AppWindow:
 
             current_settings['favorite_maps'] = favorite_maps
             if self.settings_manager.save_settings(current_settings):
-                logger.info(f"Updated favorite status for {map_name}")
+                logger.info("Updated favorite status for %s", map_name)
             else:
-                logger.error(f"Failed to save favorite status for {map_name}")
+                logger.error("Failed to save favorite status for %s", map_name)
                 # Refresh table to revert changes
                 self.maps_table.refresh_favorites(self.settings_manager.get_favorite_maps())
 
         except Exception as e:            
-            logger.error(f'Error updating favourites: {e}')
+            logger.error('Error updating favourites: %s', e)
             self.maps_table.refresh_favorites(self.settings_manager.get_favorite_maps())
 
 
@@ -326,7 +332,7 @@ class AppWindow:
             else:                
                 logger.error("Failed to save strategy settings")
         except Exception as e:            
-            logger.error(f'Error saving strategy settigns: {e}')
+            logger.error('Error saving strategy settigns: %s', e)
 
 
     # Setup Tabs -- Colors
@@ -365,7 +371,7 @@ class AppWindow:
             else:
                 logger.error("Failed to save colors settings")
         except Exception as e:
-            logger.error(f"Error saving colors: {e}")
+            logger.error("Error saving colors: %s", e)
 
     # Handle Window Dragging
     def start_move(self, event) -> None:
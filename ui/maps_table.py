@@ -1,96 +1,132 @@
+import time
+import tkinter as tk
 from tkinter import ttk
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from settings.map_catalog import MapCatalog, MapInfo
+
+COLUMNS = ('Name', 'Biomes', 'Layout', 'Favorite', 'Last Seen')
 
 class MapsTable(ttk.Frame):
-    def __init__(self, parent, maps: List, favorite_maps: List, on_favorite_changed) -> None:
+    def __init__(self, parent, catalog: MapCatalog, on_favorite_changed, last_seen: Optional[Dict] = None) -> None:
         super().__init__(parent, style='Dark.TFrame')
-        
+
         # Store callback and data
         self.on_favorite_changed = on_favorite_changed
-        self.maps = maps
-        self.favorite_maps = favorite_maps
-        
+        self.catalog = catalog
+        self.favorite_maps = set(catalog.favorites)
+        # Time each map was last identified by a scan (scan history)
+        self.last_seen = dict(last_seen or {})
+
+        # Rows keyed by map name (also used as the Treeview item id)
+        self.rows = {}
+
         # Sorting state
         self.sort_column = 'Name'  # Default sort column
         self.sort_reverse = False   # Default ascending
-        
+
+        # Filter entry, rows are filtered while typing
+        self.filter_var = tk.StringVar()
+        self.filter_entry = ttk.Entry(self, textvariable=self.filter_var)
+        self.filter_var.trace_add('write', lambda *args: self.apply_view())
+
         # Create treeview
-        self.tree = ttk.Treeview(self, columns=('Name', 'Biomes', 'Layout', 'Favorite'), show='headings', style='Dark.Treeview')
-        
+        self.tree = ttk.Treeview(self, columns=COLUMNS, show='headings', style='Dark.Treeview')
+
         # Configure scrollbar
         scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
         self.tree.configure(yscrollcommand=scrollbar.set)
-        
+
         # Configure columns with sorting
-        for col in ('Name', 'Biomes', 'Layout', 'Favorite'):
+        for col in COLUMNS:
             self.tree.heading(col, text=col, command=lambda c=col: self.sort_by_column(c))
-        
+
         # Set column widths
         self.tree.column('Name', width=100)
         self.tree.column('Biomes', width=100)  # Increased width for list display
         self.tree.column('Layout', width=100)
         self.tree.column('Favorite', width=70)
-        
+        self.tree.column('Last Seen', width=90)
+
         # Initial population and sort
         self.populate_table()
-        
+
         # Bind click event for favorite toggle
         self.tree.bind('<ButtonRelease-1>', self.on_click)
-        
+
         # Pack widgets
+        self.filter_entry.pack(side='top', fill='x', pady=(0, 2))
         self.tree.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
 
-    # Format biomes list into a readable string.
-    def format_biomes(self, biomes: List) -> str:
-        return ', '.join(sorted(biomes))
-
-    # Get the appropriate sort key based on the column.
-    def get_sort_key(self, item: Dict, column: str) -> Any:        
-        if column == 'Biomes':
-            # Sort by the first biome, or empty string if no biomes
-            biomes = item[column]
-            return sorted(biomes)[0] if biomes else ''
-        elif column == 'Favorite':
-            return item['_is_favorite']
-        else:
-            return item[column]
+    # Build the display values and precomputed sort keys of one map
+    def build_row(self, info: MapInfo) -> Dict:
+        is_favorite = info.is_favorite
+        last_seen = self.last_seen.get(info.name, 0)
+        values = (
+            info.name,
+            info.biomes_text,
+            info.layout,
+            '★' if is_favorite else '☆',
+            self.format_last_seen(last_seen)
+        )
+        return {
+            'values': values,
+            'sort_keys': {
+                'Name': info.name,
+                # Sort by the first biome (precomputed by the catalog), or empty string if no biomes
+                'Biomes': info.first_biome,
+                'Layout': info.layout,
+                'Favorite': is_favorite,
+                'Last Seen': last_seen
+            },
+            'search': ' '.join(values[:3]).lower()
+        }
+
+    @staticmethod
+    def format_last_seen(timestamp: float) -> str:
+        if not timestamp:
+            return '-'
+        # Time only for today, date and time otherwise
+        if time.strftime('%Y-%m-%d', time.localtime(timestamp)) == time.strftime('%Y-%m-%d'):
+            return time.strftime('%H:%M', time.localtime(timestamp))
+        return time.strftime('%m-%d %H:%M', time.localtime(timestamp))
+
+    # Get the precomputed sort key of a row for the column.
+    def get_sort_key(self, name: str, column: str) -> Any:
+        return self.rows[name]['sort_keys'][column]
 
     # Clear and repopulate the table with current data
-    def populate_table(self) -> None:        
+    def populate_table(self) -> None:
         # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Prepare data for sorting
-        table_data = []
-        for loc in self.maps:
-            is_favorite = loc['name'] in self.favorite_maps
-            table_data.append({
-                'Name': loc['name'],
-                'Biomes': loc['biomes'], 
-                'Layout': loc['layout'],
-                'Favorite': '★' if is_favorite else '☆',
-                '_is_favorite': is_favorite  # Hidden field for sorting
-            })
-        
-        # Sort data
-        table_data.sort(
-            key=lambda x: self.get_sort_key(x, self.sort_column),
-            reverse=self.sort_reverse
-        )
-        
-        # Insert sorted data
-        for item in table_data:
-            self.tree.insert('', 'end', values=(
-                item['Name'],
-                self.format_biomes(item['Biomes']),  # Format list for display
-                item['Layout'],
-                item['Favorite']
-            ))
+        self.tree.delete(*self.tree.get_children())
+        self.rows = {}
+
+        # Insert every map once (the catalog has no duplicates), ordering and filtering only move items afterwards
+        for info in self.catalog.maps:
+            name = info.name
+            self.rows[name] = self.build_row(info)
+            self.tree.insert('', 'end', iid=name, values=self.rows[name]['values'])
+
+        self.apply_view()
+
+    # Reorder and filter the existing items without recreating them
+    def apply_view(self) -> None:
+        query = self.filter_var.get().strip().lower()
+        visible = [name for name, row in self.rows.items() if not query or query in row['search']]
+        visible.sort(key=lambda name: self.get_sort_key(name, self.sort_column), reverse=self.sort_reverse)
+
+        # Detach hidden rows, then move (and re-attach) the visible ones into sorted order
+        visible_set = set(visible)
+        hidden = [name for name in self.tree.get_children() if name not in visible_set]
+        if hidden:
+            self.tree.detach(*hidden)
+        if list(self.tree.get_children()) == visible:
+            return
+        for index, name in enumerate(visible):
+            self.tree.move(name, '', index)
 
     # Sort table by specified column
-    def sort_by_column(self, column: str) -> None:        
+    def sort_by_column(self, column: str) -> None:
         if self.sort_column == column:
             # If already sorting by this column, reverse the order
             self.sort_reverse = not self.sort_reverse
@@ -98,18 +134,31 @@ class MapsTable(ttk.Frame):
             # New column, set as sort column and default to ascending
             self.sort_column = column
             self.sort_reverse = False
-        
+
         # Update sort indicators in headers
-        for col in ('Name', 'Biomes', 'Layout', 'Favorite'):
+        for col in COLUMNS:
             if col == self.sort_column:
                 indicator = "▼" if self.sort_reverse else "▲"
                 self.tree.heading(col, text=f"{col} {indicator}")
             else:
                 self.tree.heading(col, text=col)
-        
-        # Repopulate with new sort
-        self.populate_table()
-    
+
+        # Reorder with the new sort
+        self.apply_view()
+
+    # Update the favorite cell and sort key of a single row
+    def set_favorite(self, name: str, is_favorite: bool) -> None:
+        row = self.rows.get(name)
+        if row is None:
+            return
+        if is_favorite:
+            self.favorite_maps.add(name)
+        else:
+            self.favorite_maps.discard(name)
+        row['values'] = row['values'][:3] + ('★' if is_favorite else '☆',) + row['values'][4:]
+        row['sort_keys']['Favorite'] = is_favorite
+        self.tree.set(name, 'Favorite', row['values'][3])
+
     # Handle click event
     def on_click(self, event) -> None:
         region = self.tree.identify_region(event.x, event.y)
@@ -117,18 +166,59 @@ class MapsTable(ttk.Frame):
             column = self.tree.identify_column(event.x)
             if column == '#4':  # Favorite column
                 item = self.tree.identify_row(event.y)
-                if item:
-                    values = self.tree.item(item)['values']
-                    if values:
-                        map_name = values[0]
-                        is_favorite = values[3] == '★'
-                        # Toggle favorite
-                        new_favorite = not is_favorite
-                        self.tree.set(item, 'Favorite', '★' if new_favorite else '☆')
-                        # Notify callback
-                        self.on_favorite_changed(map_name, new_favorite)
-    
-    # Refresh the favorite status of all maps
+                if item and item in self.rows:
+                    # Toggle favorite
+                    new_favorite = item not in self.favorite_maps
+                    self.set_favorite(item, new_favorite)
+                    # Notify callback
+                    self.on_favorite_changed(item, new_favorite)
+
+    # Refresh the favorite status of all maps, only changed rows are touched
     def refresh_favorites(self, favorite_maps: List) -> None:
-        self.favorite_maps = favorite_maps
-        self.populate_table()  # Repopulate to maintain sort order
\ No newline at end of file
+        new_favorites = set(favorite_maps)
+        changed = self.favorite_maps ^ new_favorites
+        for name in changed:
+            self.set_favorite(name, name in new_favorites)
+        self.favorite_maps = new_favorites
+
+        if changed and self.sort_column == 'Favorite':
+            self.apply_view()
+
+    # Update the Last Seen cells of maps seen since the last refresh
+    def update_last_seen(self, last_seen: Dict) -> None:
+        changed = [name for name, timestamp in last_seen.items() if self.last_seen.get(name) != timestamp]
+        self.last_seen = dict(last_seen)
+        for name in changed:
+            row = self.rows.get(name)
+            if row is None:
+                continue
+            row['values'] = row['values'][:4] + (self.format_last_seen(last_seen[name]),)
+            row['sort_keys']['Last Seen'] = last_seen[name]
+            self.tree.set(name, 'Last Seen', row['values'][4])
+
+        if changed and self.sort_column == 'Last Seen':
+            self.apply_view()
+
+    # Switch to a new catalog, inserting, deleting or updating only the rows that differ
+    def set_catalog(self, catalog: MapCatalog) -> None:
+        if catalog is self.catalog:
+            return
+        self.catalog = catalog
+        self.favorite_maps = set(catalog.favorites)
+        new_rows = {info.name: self.build_row(info) for info in catalog.maps}
+
+        removed = [name for name in self.rows if name not in new_rows]
+        if removed:
+            self.tree.delete(*removed)
+
+        for name, row in new_rows.items():
+            old_row = self.rows.get(name)
+            if old_row is None:
+                self.tree.insert('', 'end', iid=name, values=row['values'])
+            elif old_row['values'] != row['values']:
+                for col, old_value, new_value in zip(COLUMNS, old_row['values'], row['values']):
+                    if old_value != new_value:
+                        self.tree.set(name, col, new_value)
+
+        self.rows = new_rows
+        self.apply_view()
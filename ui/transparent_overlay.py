@@ -2,14 +2,23 @@ import tkinter as tk
 import win32gui
 
 from settings.settings_manager import SettingsManager
+from settings.map_catalog import MapCatalog
 from utils.logger import logger
-from typing import Optional, Tuple
+from utils.tracing import traced
+from utils.metrics import metrics
+from vision.match import MapMatch
+from typing import Dict, List, Optional, Tuple
+
+# Matches of the same map within this many pixels reuse the same canvas group
+GROUP_TOLERANCE = 12
+LABEL_CACHE_SIZE = 1024
 
 
 class TransparentOverlay:
     def __init__(self) -> None:
         # Load settings
         self.settings_manager = SettingsManager()
+        self.catalog = self.settings_manager.get_catalog()
 
         # Main window
         self.root = tk.Tk()
@@ -35,10 +44,14 @@ class TransparentOverlay:
         )
         self.canvas.pack(fill='both', expand=True)
 
-        # Store elements grouped by their group IDs
-        self.current_elements = {}
+        # Canvas groups kept alive between scans, keyed by their group IDs.
+        # Each group stores its item ids and the state last drawn, so redraws only touch what changed.
+        self.groups = {}
         self.next_group_id = 0
 
+        # Formatted labels keyed by everything the text depends on
+        self.label_cache = {}
+
         self.canvas.bind('<Button-1>', self.on_click)
 
     # Remove group on click. group is (Rectangle, text and the close button)
@@ -55,12 +68,12 @@ class TransparentOverlay:
                     self.remove_group(group_id)
                     break
 
-    # Remove group
+    # Remove group (hidden, so a later scan can reuse its items)
     def remove_group(self, group_id) -> None:
-        if group_id in self.current_elements:
-            for element in self.current_elements[group_id]:
-                self.canvas.delete(element)
-            del self.current_elements[group_id]
+        group = self.groups.get(group_id)
+        if group and group['visible']:
+            self.canvas.itemconfigure(f'group_{group_id}', state='hidden')
+            group['visible'] = False
 
     # Position and size the overlay to match the game window
     def position_window(self, game_window_name: str = "Path of Exile 2") -> Optional[Tuple]:        
@@ -68,7 +81,7 @@ class TransparentOverlay:
             # Find the game window
             hwnd = win32gui.FindWindow(None, game_window_name)
             if not hwnd:
-                print(f"Window '{game_window_name}' not found")
+                logger.warning("Window '%s' not found", game_window_name)
                 return None
             
             # Get window position and size
@@ -90,127 +103,189 @@ class TransparentOverlay:
             return rect
             
         except Exception as e:
-            logger.error(f"Error positioning overlay: {e}")
+            logger.error("Error positioning overlay: %s", e)
             return None 
 
-    # Draw a map rectangle and label on the overlay
-    def draw_map_info(self, x: int, y: int, width: int, height: int, text: str = "", color: str = "#ffffff") -> None:
+    # Create the canvas items of a group once, they are only reconfigured afterwards
+    def create_group(self) -> str:
         group_id = str(self.next_group_id)
         self.next_group_id += 1
-        group_elements = []
-        
-        # Create rectangle
-        rect = self.canvas.create_rectangle(
-            x, y, x + width, y + height,
-            outline=color,
-            width=2,
-            stipple='gray50',
-            tags=f'group_{group_id}'
-        )
-        group_elements.append(rect)
-        
-        # Create close button
-        button_size = 16
-        button_x = x + width - button_size
-        button_y = y
-        
-        # Close button background
-        close_bg = self.canvas.create_oval(
-            button_x, button_y,
-            button_x + button_size, button_y + button_size,
-            fill='white',
-            outline=color,
-            tags=(f'close_{group_id}', f'group_{group_id}')
-        )
-        
-        # Close button X
-        close_x = self.canvas.create_text(
-            button_x + button_size/2,
-            button_y + button_size/2,
-            text='×',
-            fill=color,
-            font=('Segoe UI', 10, 'bold'),
-            tags=(f'close_{group_id}', f'group_{group_id}')
-        )
-        
-        group_elements.extend([close_bg, close_x])
-        
-        # Add text if provided
-        if text:
-            # Create background for text
-            text_item = self.canvas.create_text(
-                x, y - 5,
-                text=text,
-                fill=color,
-                anchor='sw',
-                font=('Segoe UI', 10, 'bold'),
-                tags=f'group_{group_id}'
-            )
-            
-            # Get text bounds
-            bbox = self.canvas.bbox(text_item)
+        group_tag = f'group_{group_id}'
+        close_tags = (f'close_{group_id}', group_tag)
+
+        items = {
+            'rect': self.canvas.create_rectangle(0, 0, 0, 0, width=2, stipple='gray50', tags=group_tag),
+            'close_bg': self.canvas.create_oval(0, 0, 0, 0, fill='white', tags=close_tags),
+            'close_x': self.canvas.create_text(0, 0, text='×', font=('Segoe UI', 10, 'bold'), tags=close_tags),
+            'text_bg': self.canvas.create_rectangle(0, 0, 0, 0, fill='white', tags=group_tag),
+            'text': self.canvas.create_text(0, 0, anchor='sw', font=('Segoe UI', 10, 'bold'), tags=group_tag)
+        }
+        self.canvas.tag_lower(items['text_bg'], items['text'])
+
+        self.groups[group_id] = {
+            'key': None,
+            'items': items,
+            'geometry': None,
+            'text': None,
+            'color': None,
+            'visible': True,
+            'text_bg_hidden': True
+        }
+        return group_id
+
+    # Apply geometry, text and color to a group, touching only what changed
+    def apply_group(self, group_id: str, x: int, y: int, width: int, height: int, text: str, color: str) -> None:
+        group = self.groups[group_id]
+        items = group['items']
+        canvas = self.canvas
+
+        geometry = (x, y, width, height)
+        geometry_changed = group['geometry'] != geometry
+        text_changed = group['text'] != text
+
+        if geometry_changed:
+            button_size = 16
+            button_x = x + width - button_size
+            canvas.coords(items['rect'], x, y, x + width, y + height)
+            canvas.coords(items['close_bg'], button_x, y, button_x + button_size, y + button_size)
+            canvas.coords(items['close_x'], button_x + button_size/2, y + button_size/2)
+            canvas.coords(items['text'], x, y - 5)
+
+        if text_changed:
+            canvas.itemconfigure(items['text'], text=text)
+
+        if group['color'] != color:
+            canvas.itemconfigure(items['rect'], outline=color)
+            canvas.itemconfigure(items['close_bg'], outline=color)
+            canvas.itemconfigure(items['close_x'], fill=color)
+            canvas.itemconfigure(items['text'], fill=color)
+            canvas.itemconfigure(items['text_bg'], outline=color)
+
+        was_hidden = not group['visible']
+        if was_hidden:
+            canvas.itemconfigure(f'group_{group_id}', state='normal')
+            group['visible'] = True
+
+        # Text background follows the text bounds
+        if geometry_changed or text_changed:
+            bbox = canvas.bbox(items['text']) if text else None
             if bbox:
-                bg_rect = self.canvas.create_rectangle(
-                    bbox[0] - 5,
-                    bbox[1] - 5,
-                    bbox[2] + 5,
-                    bbox[3] + 5,
-                    fill='white',
-                    outline=color,
-                    tags=f'group_{group_id}'
-                )
-                self.canvas.tag_lower(bg_rect, text_item)
-                group_elements.extend([bg_rect, text_item])
-            else:
-                group_elements.append(text_item)
-                
-        self.current_elements[group_id] = group_elements
-
-    # Clear/Remove elements from the overlay 
+                canvas.coords(items['text_bg'], bbox[0] - 5, bbox[1] - 5, bbox[2] + 5, bbox[3] + 5)
+            canvas.itemconfigure(items['text_bg'], state='normal' if bbox else 'hidden')
+            group['text_bg_hidden'] = not bbox
+        elif was_hidden and group['text_bg_hidden']:
+            canvas.itemconfigure(items['text_bg'], state='hidden')
+
+        group['geometry'] = geometry
+        group['text'] = text
+        group['color'] = color
+
+    # Find the group that last showed this map at (about) the same position
+    def find_group(self, key: Tuple, claimed: set) -> Optional[str]:
+        name, x, y = key
+        for group_id, group in self.groups.items():
+            group_key = group['key']
+            if group_id in claimed or group_key is None or group_key[0] != name:
+                continue
+            if abs(group_key[1] - x) <= GROUP_TOLERANCE and abs(group_key[2] - y) <= GROUP_TOLERANCE:
+                return group_id
+        return None
+
+    # Find a hidden group that can be recycled for another map
+    def find_free_group(self, claimed: set) -> Optional[str]:
+        for group_id, group in self.groups.items():
+            if group_id not in claimed and not group['visible']:
+                return group_id
+        return None
+
+    # Draw a map rectangle and label on the overlay
+    @traced('overlay.draw')
+    def draw_map_info(self, x: int, y: int, width: int, height: int, text: str = "", color: str = "#ffffff", group_id: Optional[str] = None) -> str:
+        if group_id is None:
+            group_id = self.find_free_group(set()) or self.create_group()
+            self.groups[group_id]['key'] = None
+        self.apply_group(group_id, x, y, width, height, text, color)
+        return group_id
+
+    # Clear/Remove elements from the overlay (items are hidden, not destroyed)
+    @traced('overlay.clear')
     def clear_overlay(self) -> None:
-        for group_elements in self.current_elements.values():
-            for element in group_elements:
-                self.canvas.delete(element)
-        self.current_elements.clear()
+        for group_id, group in self.groups.items():
+            if group['visible']:
+                self.canvas.itemconfigure(f'group_{group_id}', state='hidden')
+                group['visible'] = False
+
+    # Use the catalog shared with the scanner, labels of the previous one are dropped
+    def set_catalog(self, catalog: MapCatalog) -> None:
+        if catalog is not self.catalog:
+            self.catalog = catalog
+            self.label_cache.clear()
+
+    # Build the label of a match, cached by everything the text depends on
+    def get_display_text(self, match: MapMatch) -> str:
+        if not match.is_identified:
+            return ""
 
-    # Update overlay with elements
-    def update_overlay(self, matches) -> None:
+        cache_key = (match.map_name, match.is_favorite, match.is_citadel, match.activities)
+        display_text = self.label_cache.get(cache_key)
+        metrics.record_cache('overlay_labels', display_text is not None)
+        if display_text is not None:
+            return display_text
+
+        display_text = ""
+        if match.is_favorite:
+            display_text += "⭐\n"
+        # Name, biomes, layout and notes lines are precomputed per map
+        info = self.catalog.get(match.map_name)
+        if info is not None:
+            display_text += info.label
+        else:
+            display_text += MapCatalog.format_label(match.map_name, match.biomes, match.layout, match.notes)
+
+        # Add activities if present
+        if match.activities:
+            organized_features, contains_boss = self.catalog.get_features_display_text(match.activities)                    
+            # Add each category of features
+            for display_name, features in organized_features.items():
+                display_text += f"\n{display_name}: {', '.join(features)}" 
+
+            # Check if the map contains boss
+            if contains_boss:
+                display_text += "\nMap contains Boss!"                          
+
+        if match.is_citadel:
+            display_text = "⭐⭐⭐ CITADEL ⭐⭐⭐\n" + display_text
+
+        if len(self.label_cache) >= LABEL_CACHE_SIZE:
+            self.label_cache.clear()
+        self.label_cache[cache_key] = display_text
+        return display_text
+
+    # Update overlay with elements, reusing the groups of maps already on screen
+    @traced('overlay.update')
+    def update_overlay(self, matches: List) -> None:
+        claimed = set()
+        pending = []
+
+        # First pass: matches already drawn at (about) the same position keep their group
         for match in matches:
-            x, y = match['position']
-            w, h = match['size']            
-            
-            # Prepare display text
-            display_text = ""
-            if all(key in match for key in ['map_name', 'biomes', 'layout', 'notes']):
-                if match.get("is_favorite", False):
-                    display_text += "⭐\n"
-                display_text += f"Name: {match['map_name']}\n"
-                if match['biomes'] != []: display_text += f"Biomes: {','.join(match['biomes'])}\n"                 
-                display_text += f"Layout: {match['layout']}\n"
-                if match['notes'] != None: display_text += f"Notes: {match['notes']}"
-                
-                # Check if hideout
-                if match['layout'].lower() == 'hideout':
-                    display_text += "This map is a hideout"
-
-                # Add activities if present
-                if 'activities' in match and match['activities']:
-                    organized_features, contains_boss = self.settings_manager.get_features_display_text(match['activities'])                    
-                    # Add each category of features
-                    for display_name, features in organized_features.items():
-                        display_text += f"\n{display_name}: {', '.join(features)}" 
-
-                    # Check if the map contains boss
-                    if contains_boss:
-                        display_text += "\nMap contains Boss!"                          
-
-            # Get color from match
-            color = match.get('color', '#ffffff')
-            
-            if match.get('is_citadel', False):
-                display_text = "⭐⭐⭐ CITADEL ⭐⭐⭐\n" + display_text
+            x, y = match.position
+            key = (match.map_name or '', x, y)
+            group_id = self.find_group(key, claimed)
+            if group_id is not None:
+                claimed.add(group_id)
+            pending.append((match, key, group_id))
+
+        # Second pass: new maps recycle hidden groups before creating canvas items
+        for match, key, group_id in pending:
+            if group_id is None:
+                group_id = self.find_free_group(claimed) or self.create_group()
+                claimed.add(group_id)
 
-            self.draw_map_info(x, y, w, h, display_text, color)
+            x, y = match.position
+            w, h = match.size
+            self.groups[group_id]['key'] = key
+            self.draw_map_info(x, y, w, h, self.get_display_text(match), match.color, group_id)
 
     # Update the window
     def update(self) -> None:
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+import cv2
+import numpy as np
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.tracing import tracer
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+FLIGHT_RECORDER = settings.get('flight_recorder', False)
+FLIGHT_RECORDER_SCANS = settings.get('flight_recorder_scans', 20)
+FLIGHT_RECORDER_MAX_MB = settings.get('flight_recorder_max_mb', 128)
+RECORDINGS_FOLDER = settings.get('recordings_folder', 'data/recordings')
+
+# Bumped whenever the archive layout changes
+RECORDING_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+# Fast PNG level: frames are lossless but encoding stays a few milliseconds per tooltip
+PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+
+def encode_image(image: np.ndarray) -> bytes:
+    ok, encoded = cv2.imencode('.png', image, PNG_PARAMS)
+    if not ok:
+        raise ValueError("PNG encoding failed")
+    return encoded.tobytes()
+
+def decode_image(data: bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+# Everything one scan saw and decided. Images are kept PNG encoded.
+class ScanRecord:
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.started_at = time.time()
+        self.elapsed = 0.0
+        self.frame: Optional[bytes] = None
+        self.window_rect = None
+        self.candidates: List[Dict] = []
+        # Tooltip crops with the match they were taken for and the identification result
+        self.tooltips: List[Dict] = []
+        self.decisions: List[Dict] = []
+        # (span name, milliseconds) of every stage that ran during the scan
+        self.timings: List = []
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.frame or b'') + sum(len(tooltip['image']) for tooltip in self.tooltips)
+
+
+# Ring buffer of the last scans, kept in memory and written to a replayable archive on demand.
+# Bounded by both scan count and encoded size, the oldest scans are dropped first.
+class FlightRecorder:
+    def __init__(self, enabled: bool = False, max_scans: int = 20, max_bytes: int = 128 * 1024 * 1024, recordings_folder: str = RECORDINGS_FOLDER) -> None:
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.recordings_folder = recordings_folder
+        self.scans = deque(maxlen=max_scans)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.current: Optional[ScanRecord] = None
+        if enabled:
+            tracer.add_listener(self.on_span)
+
+    def on_span(self, name: str, duration: float, args: Dict) -> None:
+        current = self.current
+        if current is not None:
+            current.timings.append((name, round(duration * 1000, 3)))
+
+    # Record everything inside the block as one scan
+    @contextmanager
+    def record_scan(self, kind: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        self.current = ScanRecord(kind)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record, self.current = self.current, None
+            record.elapsed = round((time.perf_counter() - start) * 1000, 3)
+            self.add(record)
+
+    def add(self, record: ScanRecord) -> None:
+        with self.lock:
+            if len(self.scans) == self.scans.maxlen:
+                self.total_bytes -= self.scans[0].nbytes
+            self.scans.append(record)
+            self.total_bytes += record.nbytes
+            while len(self.scans) > 1 and self.total_bytes > self.max_bytes:
+                self.total_bytes -= self.scans.popleft().nbytes
+
+    # The atlas frame detection ran on, with the game window rectangle
+    def add_frame(self, screenshot: np.ndarray, window_rect) -> None:
+        current = self.current
+        if current is None:
+            return
+        try:
+            current.frame = encode_image(screenshot)
+            current.window_rect = list(window_rect) if window_rect is not None else None
+        except Exception as e:
+            logger.error("Error recording frame: %s", e)
+
+    def add_candidates(self, matches: List) -> None:
+        current = self.current
+        if current is not None:
+            current.candidates = [match.to_dict() for match in matches]
+
+    # A tooltip crop, the match it belongs to and what it was identified as (None = unidentified)
+    def add_tooltip(self, region_img: np.ndarray, match, result) -> None:
+        current = self.current
+        if current is None:
+            return
+        try:
+            current.tooltips.append({
+                'image': encode_image(region_img),
+                'match': match.to_dict(),
+                'result': result.to_dict() if result is not None else None
+            })
+        except Exception as e:
+            logger.error("Error recording tooltip: %s", e)
+
+    def add_decision(self, match, included: bool) -> None:
+        current = self.current
+        if current is not None:
+            current.decisions.append({'map_name': match.map_name, 'position': list(match.position), 'included': included})
+
+    # Write the buffered scans to a zip archive (manifest plus PNG images), returns its path
+    def dump(self) -> Optional[str]:
+        if not self.enabled:
+            logger.warning("Flight recorder is off, enable flight_recorder in settings.json to record scans")
+            return None
+        with self.lock:
+            scans = list(self.scans)
+        if not scans:
+            logger.warning("Flight recorder is empty, nothing to dump")
+            return None
+
+        try:
+            os.makedirs(self.recordings_folder, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            archive_path = os.path.join(self.recordings_folder, f"recording_{timestamp}.zip")
+            manifest = {'version': RECORDING_VERSION, 'created_at': time.time(), 'scans': []}
+            # PNG data is already compressed, the archive only stores it
+            with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_STORED) as archive:
+                for i, record in enumerate(scans):
+                    entry = {
+                        'kind': record.kind,
+                        'started_at': record.started_at,
+                        'elapsed_ms': record.elapsed,
+                        'window_rect': record.window_rect,
+                        'frame': None,
+                        'candidates': record.candidates,
+                        'tooltips': [],
+                        'decisions': record.decisions,
+                        'timings': record.timings
+                    }
+                    if record.frame is not None:
+                        entry['frame'] = f"scans/{i:03d}/frame.png"
+                        archive.writestr(entry['frame'], record.frame)
+                    for j, tooltip in enumerate(record.tooltips):
+                        image_name = f"scans/{i:03d}/tooltip_{j:03d}.png"
+                        archive.writestr(image_name, tooltip['image'])
+                        entry['tooltips'].append({'image': image_name, 'match': tooltip['match'], 'result': tooltip['result']})
+                    manifest['scans'].append(entry)
+                archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+
+            logger.info("Flight recorder dumped %d scans to %s", len(scans), archive_path)
+            return archive_path
+        except Exception as e:
+            logger.error("Error dumping flight recorder: %s", e)
+            return None
+
+
+# A dumped recording, read back for offline replay (tools.batch_scan)
+class Recording:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with zipfile.ZipFile(path) as archive:
+            self.manifest = json.loads(archive.read(MANIFEST_NAME))
+        if self.manifest.get('version') != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version {self.manifest.get('version')}")
+
+    @property
+    def scans(self) -> List[Dict]:
+        return self.manifest['scans']
+
+    def read_image(self, name: str) -> Optional[np.ndarray]:
+        with zipfile.ZipFile(self.path) as archive:
+            return decode_image(archive.read(name))
+
+    @staticmethod
+    def is_recording(path: str) -> bool:
+        return path.lower().endswith('.zip') and zipfile.is_zipfile(path)
+
+
+# Global recorder used by the scanner
+flight_recorder = FlightRecorder(FLIGHT_RECORDER, FLIGHT_RECORDER_SCANS, FLIGHT_RECORDER_MAX_MB * 1024 * 1024)
@@ -1,29 +1,61 @@
+import atexit
+import json
 import logging
+import multiprocessing
 import os
-from datetime import datetime
+import queue
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def setup_logger() -> Logger:   
-    LOG_NAME = 'AtlasScout'
-    LOG_DIRECTORY = 'data/logs'
+LOG_NAME = 'AtlasScout'
+LOG_DIRECTORY = 'data/logs'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+SETTINGS_FILE_PATH = 'data/settings.json'
+
+# Background writer draining the log queue
+_listener = None
+# Writer draining the records of worker processes into the same handlers, and their queue
+_process_listener = None
+_process_queue = None
+# Records a worker process logged before it was told where to forward them
+_pending = None
+
+# Read the log level straight from settings.json (SettingsManager itself logs, so it can't be used here)
+def get_configured_level() -> int:
+    try:
+        with open(SETTINGS_FILE_PATH, 'r') as f:
+            level_name = json.load(f).get('settings', {}).get('log_level', 'INFO')
+        level = logging.getLevelName(str(level_name).upper())
+        return level if isinstance(level, int) else logging.INFO
+    except Exception:
+        return logging.INFO
+
+def setup_logger() -> Logger:
+    global _listener, _pending
 
     # Ensure log directory exists
     os.makedirs(LOG_DIRECTORY, exist_ok=True)
-
-    # Generate log filename with timestamp
-    date_str = datetime.now().strftime('%Y%m%d')
-    log_filename = os.path.join(LOG_DIRECTORY, f"{LOG_NAME}_{date_str}.log")
+    log_filename = os.path.join(LOG_DIRECTORY, f"{LOG_NAME}.log")
 
     # Configure logging
     logger = logging.getLogger(LOG_NAME)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(get_configured_level())
 
     # Avoid duplicate handlers (important for repeated calls)
     if logger.hasHandlers():
         return logger
 
-     # File Handler (captures all logs)
-    file_handler = logging.FileHandler(log_filename, mode='a')
+    # Worker processes never open the log file (rotation fails while another process holds it on Windows).
+    # Records are held until forward_logs hands them to the scanner process.
+    if multiprocessing.current_process().name != 'MainProcess':
+        _pending = queue.SimpleQueue()
+        logger.addHandler(QueueHandler(_pending))
+        logger.propagate = False
+        return logger
+
+    # File Handler (captures all logs, rotated by size)
+    file_handler = RotatingFileHandler(log_filename, mode='a', maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
 
@@ -32,12 +64,50 @@ def setup_logger() -> Logger:
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
 
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # The calling thread only enqueues records, file and console I/O happens on the listener thread
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
 
-    logger.info(f"Logger initialized - log file: {log_filename}")
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logger)
+
+    logger.info("Logger initialized - log file: %s", log_filename)
     return logger
 
+# Queue worker processes log into (pass it to forward_logs in the worker), written by this process's handlers
+def get_process_log_queue() -> multiprocessing.Queue:
+    global _process_listener, _process_queue
+    if _process_queue is None:
+        _process_queue = multiprocessing.Queue()
+        handlers = _listener.handlers if _listener is not None else ()
+        _process_listener = QueueListener(_process_queue, *handlers, respect_handler_level=True)
+        _process_listener.start()
+    return _process_queue
+
+# In a worker process: send every record to the scanner process's log queue
+def forward_logs(log_queue: multiprocessing.Queue) -> None:
+    global _pending
+    logger = logging.getLogger(LOG_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+    # Records logged while the worker started up
+    while _pending is not None and not _pending.empty():
+        log_queue.put_nowait(_pending.get_nowait())
+    _pending = None
+
+# Flush pending records and stop the background writers
+def stop_logger() -> None:
+    global _listener, _process_listener
+    if _process_listener is not None:
+        _process_listener.stop()
+        _process_listener = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 # Create and configure the logger
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
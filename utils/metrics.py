@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.tracing import tracer
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+METRICS_ENABLED = settings.get('metrics_enabled', False)
+METRICS_FILE = settings.get('metrics_file', 'data/metrics/atlas_scout.prom')
+METRICS_PORT = settings.get('metrics_port', 0)
+
+METRIC_PREFIX = 'atlas_scout'
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+# Samples of the last `window_seconds`, capped at `max_samples`
+class RollingHistogram:
+    def __init__(self, window_seconds: float = 3600, max_samples: int = 10000) -> None:
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=max_samples)
+        self.total_count = 0
+        self.total_sum = 0.0
+
+    def observe(self, value: float, now: float) -> None:
+        self.samples.append((now, value))
+        self.total_count += 1
+        self.total_sum += value
+
+    def values(self, now: float) -> List:
+        cutoff = now - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return sorted(value for _, value in self.samples)
+
+    # Nearest-rank quantiles over the rolling window
+    def quantiles(self, now: float, quantiles: Tuple = QUANTILES) -> Dict:
+        values = self.values(now)
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in quantiles}
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False, window_seconds: float = 3600) -> None:
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.scan_times = deque()
+        self.server = None
+
+    # Labels are stored as a sorted tuple so they can key dicts
+    def key(self, name: str, labels: Dict) -> Tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = RollingHistogram(self.window_seconds)
+            histogram.observe(value, time.time())
+
+    # Counters since the last call, cleared (worker processes send them to the scanner process)
+    def take_counters(self) -> Dict:
+        with self.lock:
+            counters, self.counters = self.counters, {}
+        return counters
+
+    # Add counters taken from a worker process
+    def merge_counters(self, counters: Dict) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    # One finished full-atlas scan
+    # Identified maps count before the strategy filter, included ones after it
+    def record_scan(self, maps_detected: int, maps_identified: int, maps_included: int) -> None:
+        if not self.enabled:
+            return
+        self.inc('scans_total')
+        self.observe('maps_detected_per_scan', maps_detected)
+        self.observe('maps_identified_per_scan', maps_identified)
+        self.observe('maps_included_per_scan', maps_included)
+        with self.lock:
+            self.scan_times.append(time.time())
+
+    # One OCR attempt, failed when validate_map found no known map
+    def record_ocr(self, success: bool) -> None:
+        self.inc('ocr_results_total', result='success' if success else 'failure')
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        self.inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+    # Tracing listener turning every finished span into a stage latency sample
+    def on_span(self, name: str, duration: float, args: Dict) -> None:
+        self.observe('stage_seconds', duration, stage=name)
+
+    def format_labels(self, labels: Tuple, extra: Optional[Dict] = None) -> str:
+        items = list(labels) + list((extra or {}).items())
+        if not items:
+            return ''
+        return '{' + ','.join(f'{k}="{str(v)}"' for k, v in items) + '}'
+
+    # Render all metrics in the Prometheus text exposition format
+    def render_prometheus(self) -> str:
+        now = time.time()
+        lines = []
+        with self.lock:
+            cutoff = now - 3600
+            while self.scan_times and self.scan_times[0] < cutoff:
+                self.scan_times.popleft()
+            gauges = dict(self.gauges)
+            gauges[('scans_last_hour', ())] = len(self.scan_times)
+            counters = dict(self.counters)
+            histograms = {key: (h.quantiles(now), h.total_sum, h.total_count) for key, h in self.histograms.items()}
+
+        ratios = self.derived_ratios(counters)
+        gauges.update(ratios)
+
+        for kind, metrics in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({name for name, _ in metrics}):
+                lines.append(f'# TYPE {METRIC_PREFIX}_{name} {kind}')
+                for (metric_name, labels), value in metrics.items():
+                    if metric_name == name:
+                        lines.append(f'{METRIC_PREFIX}_{name}{self.format_labels(labels)} {value}')
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} summary')
+            for (metric_name, labels), (quantiles, total_sum, total_count) in histograms.items():
+                if metric_name != name:
+                    continue
+                for q, value in quantiles.items():
+                    lines.append(f'{METRIC_PREFIX}_{name}{self.format_labels(labels, {"quantile": q})} {value}')
+                lines.append(f'{METRIC_PREFIX}_{name}_sum{self.format_labels(labels)} {total_sum}')
+                lines.append(f'{METRIC_PREFIX}_{name}_count{self.format_labels(labels)} {total_count}')
+
+        return '\n'.join(lines) + '\n'
+
+    # OCR failure rate and per-cache hit rate derived from the counters
+    def derived_ratios(self, counters: Dict) -> Dict:
+        ratios = {}
+        ocr = {dict(labels).get('result'): value for (name, labels), value in counters.items() if name == 'ocr_results_total'}
+        ocr_total = sum(ocr.values())
+        if ocr_total:
+            ratios[('ocr_failure_ratio', ())] = ocr.get('failure', 0) / ocr_total
+
+        caches = {}
+        for (name, labels), value in counters.items():
+            if name == 'cache_requests_total':
+                labels = dict(labels)
+                hits, total = caches.get(labels['cache'], (0, 0))
+                caches[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+        for cache, (hits, total) in caches.items():
+            ratios[('cache_hit_ratio', (('cache', cache),))] = hits / total if total else 0
+        return ratios
+
+    # Write the text file atomically so a scraper never reads half of it
+    def write_prometheus(self, file_path: str) -> bool:
+        if not self.enabled or not file_path:
+            return False
+        try:
+            os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+            tmp_path = f'{file_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, file_path)
+            return True
+        except Exception as e:
+            logger.error("Error writing metrics file: %s", e)
+            return False
+
+    # Serve /metrics on localhost only
+    def start_http_server(self, port: int) -> bool:
+        if not self.enabled or not port or self.server is not None:
+            return False
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+            threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True).start()
+            logger.info("Metrics available at http://127.0.0.1:%s/metrics", port)
+            return True
+        except Exception as e:
+            logger.error("Error starting metrics server: %s", e)
+            self.server = None
+            return False
+
+
+# Global registry used by all modules
+metrics = MetricsRegistry(METRICS_ENABLED)
+if metrics.enabled:
+    tracer.add_listener(metrics.on_span)
+
+# Export after a scan, to the text file configured in settings
+def export_metrics() -> None:
+    if metrics.enabled:
+        metrics.write_prometheus(METRICS_FILE)
@@ -0,0 +1,189 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+HISTORY_ENABLED = settings.get('history_enabled', True)
+HISTORY_FILE = settings.get('history_file', 'data/history.sqlite3')
+HISTORY_OCR_SKIP = settings.get('history_ocr_skip', False)
+HISTORY_SKIP_MAX_AGE = settings.get('history_skip_max_age', 300)
+
+# The writer commits when this many scans are queued, or after the interval
+WRITE_BATCH_SIZE = 64
+WRITE_INTERVAL = 1.0
+# A node is the same as a remembered one when its position is within this many pixels
+SKIP_RADIUS = 6
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    scanned_at REAL NOT NULL,
+    map_name TEXT NOT NULL,
+    layout TEXT,
+    confidence REAL,
+    atlas_x INTEGER,
+    atlas_y INTEGER,
+    screen_x INTEGER,
+    screen_y INTEGER,
+    width INTEGER,
+    height INTEGER,
+    window_width INTEGER,
+    window_height INTEGER
+);
+CREATE TABLE IF NOT EXISTS scan_activities (
+    scan_id INTEGER NOT NULL REFERENCES scans(id),
+    activity TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_name ON scans(map_name, scanned_at);
+CREATE INDEX IF NOT EXISTS idx_scans_time ON scans(scanned_at);
+CREATE INDEX IF NOT EXISTS idx_activities ON scan_activities(activity, scan_id);
+'''
+
+
+# Every identified map, persisted to SQLite by a background writer.
+# Positions are stored relative to the game window (atlas_x/y) and on screen (screen_x/y).
+class ScanHistory:
+    def __init__(self, enabled: bool = True, history_file: str = HISTORY_FILE) -> None:
+        self.enabled = enabled
+        self.history_file = history_file
+        self.queue = queue.Queue()
+        self.writer = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Latest sighting per map name, kept in memory so the UI never waits on the database
+        self.last_seen: Optional[Dict[str, float]] = None
+
+    # Connection of the calling thread (SQLite connections are not shared between threads)
+    def get_connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.history_file) or '.', exist_ok=True)
+            connection = self.local.connection = sqlite3.connect(self.history_file, timeout=5)
+            # WAL lets the UI read while the writer commits
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+        return connection
+
+    def start_writer(self) -> None:
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_loop, name='ScanHistoryWriter', daemon=True)
+                self.writer.start()
+                atexit.register(self.stop)
+
+    # Queue one identified match. `window_offset` is the game window's screen position.
+    def record(self, match, window_offset: Tuple[int, int], window_size: Tuple[int, int]) -> None:
+        if not self.enabled or not match.map_name:
+            return
+        now = time.time()
+        self.get_last_seen()[match.map_name] = now
+        self.queue.put((now, match, window_offset, window_size))
+        if self.writer is None:
+            self.start_writer()
+
+    def write_loop(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + WRITE_INTERVAL
+            while len(batch) < WRITE_BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is None
+            entries = [entry for entry in batch if entry is not None]
+            if entries:
+                try:
+                    self.write_batch(entries)
+                except Exception as e:
+                    logger.error("Error writing scan history: %s", e)
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def write_batch(self, entries: List) -> None:
+        connection = self.get_connection()
+        with connection:
+            for scanned_at, match, (offset_x, offset_y), (window_width, window_height) in entries:
+                cursor = connection.execute(
+                    'INSERT INTO scans (scanned_at, map_name, layout, confidence, atlas_x, atlas_y, screen_x, screen_y, width, height, window_width, window_height) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (scanned_at, match.map_name, match.layout, match.confidence, match.position[0], match.position[1],
+                     match.position[0] + offset_x, match.position[1] + offset_y, match.size[0], match.size[1], window_width, window_height)
+                )
+                if match.activities:
+                    connection.executemany('INSERT INTO scan_activities (scan_id, activity) VALUES (?, ?)',
+                                           [(cursor.lastrowid, activity) for activity in match.activities])
+
+    # Wait until everything queued so far is written
+    def flush(self) -> None:
+        if self.writer is not None:
+            self.queue.join()
+
+    def stop(self) -> None:
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(timeout=5)
+
+    def get_last_seen(self) -> Dict[str, float]:
+        if self.last_seen is None:
+            self.last_seen = {}
+            if self.enabled:
+                try:
+                    rows = self.get_connection().execute('SELECT map_name, MAX(scanned_at) FROM scans GROUP BY map_name')
+                    self.last_seen = {name: scanned_at for name, scanned_at in rows}
+                except Exception as e:
+                    logger.error("Error loading scan history: %s", e)
+        return self.last_seen
+
+    # Recent sightings, optionally of one map and/or with one activity
+    def find(self, map_name: Optional[str] = None, activity: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        query = 'SELECT id, scanned_at, map_name, layout, confidence, atlas_x, atlas_y, screen_x, screen_y FROM scans'
+        conditions, params = [], []
+        if map_name:
+            conditions.append('map_name = ?')
+            params.append(map_name)
+        if activity:
+            conditions.append('id IN (SELECT scan_id FROM scan_activities WHERE activity = ?)')
+            params.append(activity)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY scanned_at DESC LIMIT ?'
+        params.append(limit)
+
+        self.flush()
+        connection = self.get_connection()
+        columns = ('id', 'scanned_at', 'map_name', 'layout', 'confidence', 'atlas_x', 'atlas_y', 'screen_x', 'screen_y')
+        results = [dict(zip(columns, row)) for row in connection.execute(query, params)]
+        for result in results:
+            result['activities'] = [activity for (activity,) in connection.execute('SELECT activity FROM scan_activities WHERE scan_id = ?', (result['id'],))]
+        return results
+
+    # Latest sighting at (about) this window position and window size, younger than max_age seconds
+    def lookup_position(self, position: Tuple[int, int], window_size: Tuple[int, int], max_age: float = HISTORY_SKIP_MAX_AGE) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        row = self.get_connection().execute(
+            'SELECT id, map_name, layout FROM scans WHERE scanned_at >= ? AND window_width = ? AND window_height = ? '
+            'AND atlas_x BETWEEN ? AND ? AND atlas_y BETWEEN ? AND ? ORDER BY scanned_at DESC LIMIT 1',
+            (time.time() - max_age, window_size[0], window_size[1],
+             position[0] - SKIP_RADIUS, position[0] + SKIP_RADIUS, position[1] - SKIP_RADIUS, position[1] + SKIP_RADIUS)
+        ).fetchone()
+        if row is None:
+            return None
+        activities = [activity for (activity,) in self.get_connection().execute('SELECT activity FROM scan_activities WHERE scan_id = ?', (row[0],))]
+        return {'map_name': row[1], 'layout': row[2], 'activities': activities}
+
+
+scan_history = ScanHistory(HISTORY_ENABLED)
@@ -0,0 +1,174 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+TRACING_ENABLED = settings.get('tracing_enabled', False)
+TRACES_FOLDER = settings.get('traces_folder', 'data/traces')
+
+
+# Shared no-op span returned when nothing is listening
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def set(self, **args) -> None:
+        pass
+
+NULL_SPAN = NullSpan()
+
+
+# A single timed stage
+class Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: Dict) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.tracer.finish_span(self, time.perf_counter_ns())
+
+    # Attach extra arguments once they are known (e.g. number of matches)
+    def set(self, **args) -> None:
+        self.args.update(args)
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False, traces_folder: str = 'data/traces') -> None:
+        self.enabled = enabled
+        self.traces_folder = traces_folder
+        self.lock = threading.Lock()
+        self.events = []
+        self.listeners = []
+        self.scan_name = None
+        self.origin_ns = time.perf_counter_ns()
+
+    def finish_span(self, span: Span, end_ns: int) -> None:
+        self.record(span.name, span.start, end_ns - span.start, span.args, os.getpid(), threading.get_ident())
+
+    # Spans a worker process recorded, as (name, start ns, duration ns, args).
+    # perf_counter is system wide, so they line up with this process's spans on their own track.
+    def add_spans(self, spans: List, pid: int) -> None:
+        for name, start_ns, duration_ns, args in spans:
+            self.record(name, start_ns, duration_ns, args, pid, pid)
+
+    def record(self, name: str, start_ns: int, duration_ns: int, args: Dict, pid: int, tid: int) -> None:
+        if self.enabled and self.scan_name is not None:
+            event = {
+                'name': name,
+                'cat': name.split('.')[0],
+                'ph': 'X',
+                'ts': (start_ns - self.origin_ns) / 1000,
+                'dur': duration_ns / 1000,
+                'pid': pid,
+                'tid': tid,
+                'args': args
+            }
+            with self.lock:
+                self.events.append(event)
+
+        for listener in self.listeners:
+            listener(name, duration_ns / 1e9, args)
+
+    # Listeners receive (span name, duration in seconds, span args) for every finished span
+    def add_listener(self, listener: Callable) -> None:
+        if listener not in self.listeners:
+            self.listeners = self.listeners + [listener]
+
+    def remove_listener(self, listener: Callable) -> None:
+        self.listeners = [l for l in self.listeners if l is not listener]
+
+    # Start collecting events for one scan
+    def begin_scan(self, scan_name: str) -> None:
+        with self.lock:
+            self.events = []
+            self.scan_name = scan_name
+
+    # Stop collecting and write the Chrome trace-event file
+    def end_scan(self) -> Optional[str]:
+        with self.lock:
+            events, self.events = self.events, []
+            scan_name, self.scan_name = self.scan_name, None
+
+        if not self.enabled or not events or scan_name is None:
+            return None
+        return self.write_trace(scan_name, events)
+
+    def write_trace(self, scan_name: str, events: List) -> Optional[str]:
+        try:
+            os.makedirs(self.traces_folder, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+            trace_path = os.path.join(self.traces_folder, f"{scan_name}_{timestamp}.json")
+
+            # Name the threads so Perfetto shows them as readable tracks
+            metadata = [
+                {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                for tid, name in {t.ident: t.name for t in threading.enumerate()}.items()
+            ]
+            with open(trace_path, 'w') as f:
+                json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+            logger.info("Scan trace written to %s (%d events)", trace_path, len(events))
+            return trace_path
+        except Exception as e:
+            logger.error("Error writing scan trace: %s", e)
+            return None
+
+
+# Global tracer used by all modules
+tracer = Tracer(TRACING_ENABLED, TRACES_FOLDER)
+
+# Context manager timing a stage: `with trace_span('ocr'): ...`
+# Spans are only timed when a trace is recorded or a listener wants durations
+def trace_span(name: str, **args) -> Any:
+    if not tracer.enabled and not tracer.listeners:
+        return NULL_SPAN
+    return Span(tracer, name, args)
+
+# Decorator timing every call of a function
+def traced(name: Optional[str] = None) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled and not tracer.listeners:
+                return func(*args, **kwargs)
+            with Span(tracer, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Record everything inside the block as one scan trace file
+@contextmanager
+def scan_trace(scan_name: str) -> Iterator[None]:
+    recording = tracer.enabled
+    if recording:
+        tracer.begin_scan(scan_name)
+    try:
+        with trace_span(scan_name):
+            yield
+    finally:
+        if recording:
+            tracer.end_scan()
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.tracing import traced
+from .detection import find_maps, DEFAULT_SCALES
+from .match import MapMatch
+from .viewport import ViewportMask
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+AUTO_CALIBRATE = settings.get('auto_calibrate', True)
+CALIBRATION_FILE = settings.get('calibration_file', 'data/calibration.json')
+CALIBRATION_SCALES = settings.get('calibration_scales', [0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3])
+
+# At most this many scales are kept per resolution
+MAX_CALIBRATED_SCALES = 2
+# A scale is kept when it produces at least this share of the best scale's matches
+MIN_SCALE_SHARE = 0.25
+# Re-sweep when a scan finds fewer maps than this share of the calibration baseline
+RECALL_DROP_RATIO = 0.5
+
+
+# Finds which template scales actually match for a window size, and persists them
+# `find` runs template matching (find_maps signature), e.g. spread over the worker pool
+class ScaleCalibrator:
+    def __init__(self, calibration_file: str = CALIBRATION_FILE, sweep_scales: Optional[List] = None, find: Callable = find_maps) -> None:
+        self.calibration_file = calibration_file
+        self.find = find
+        self.sweep_scales = sorted(set(sweep_scales or CALIBRATION_SCALES) | set(DEFAULT_SCALES))
+        self.profiles = self.load_profiles()
+
+    def load_profiles(self) -> Dict:
+        try:
+            if os.path.exists(self.calibration_file):
+                with open(self.calibration_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error("Error loading calibration profiles: %s", e)
+        return {}
+
+    def save_profiles(self) -> bool:
+        try:
+            with open(self.calibration_file, 'w') as f:
+                json.dump(self.profiles, f, indent=4)
+            return True
+        except Exception as e:
+            logger.error("Error saving calibration profiles: %s", e)
+            return False
+
+    @staticmethod
+    def profile_key(window_size: Tuple) -> str:
+        return f"{window_size[0]}x{window_size[1]}"
+
+    def get_scales(self, window_size: Tuple) -> Optional[List]:
+        profile = self.profiles.get(self.profile_key(window_size))
+        return profile['scales'] if profile else None
+
+    # Sweep all scales once on this frame and keep the ones that produce matches
+    @traced('calibration.sweep')
+    def calibrate(self, screenshot: np.ndarray, window_size: Tuple, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+        key = self.profile_key(window_size)
+        matches = self.find(screenshot, scales=self.sweep_scales, mask=mask)
+        if not matches:
+            logger.warning("Scale calibration found no maps, keeping the current scales")
+            # Nothing to compare against until maps are visible again
+            if key in self.profiles:
+                self.profiles[key]['baseline_matches'] = 0
+            return matches
+
+        counts = {}
+        for match in matches:
+            counts[match.scale] = counts.get(match.scale, 0) + 1
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        best_count = ranked[0][1]
+        scales = sorted(scale for scale, count in ranked[:MAX_CALIBRATED_SCALES] if count >= best_count * MIN_SCALE_SHARE)
+
+        self.profiles[key] = {
+            'scales': scales,
+            'baseline_matches': len(matches),
+            'calibrated_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self.save_profiles()
+        logger.info("Calibrated %s: scales %s (%d maps, per-scale counts %s)", key, scales, len(matches), dict(ranked))
+        return matches
+
+    # Find maps with the calibrated scales, calibrating first or again when recall drops
+    def detect(self, screenshot: np.ndarray, window_size: Tuple, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+        scales = self.get_scales(window_size)
+        if scales is None:
+            return self.calibrate(screenshot, window_size, mask)
+
+        matches = self.find(screenshot, scales=scales, mask=mask)
+        baseline = self.profiles[self.profile_key(window_size)].get('baseline_matches', 0)
+        if len(matches) < baseline * RECALL_DROP_RATIO:
+            logger.info("Found %d maps, calibration baseline is %d, re-sweeping scales", len(matches), baseline)
+            swept = self.calibrate(screenshot, window_size, mask)
+            return swept if len(swept) > len(matches) else matches
+        return matches
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from typing import List, Tuple
+
+
+# HSV ranges of the blue and white map node pixels
+LOWER_BLUE = np.array([85, 100, 200], dtype=np.uint8)
+UPPER_BLUE = np.array([130, 255, 255], dtype=np.uint8)
+LOWER_WHITE = np.array([0, 0, 200], dtype=np.uint8)
+UPPER_WHITE = np.array([180, 30, 255], dtype=np.uint8)
+
+# Half size of the patch checked around a candidate center, and the share of map-colored pixels it needs
+REGION_SIZE = 8
+MIN_COLOR_SHARE = 0.08
+
+# 0/1 mask of the blue or white "map-like" pixels of a BGR image
+def map_color_mask(image: np.ndarray) -> np.ndarray:
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, LOWER_BLUE, UPPER_BLUE) | cv2.inRange(hsv, LOWER_WHITE, UPPER_WHITE)
+    return mask // 255
+
+
+# Map color mask of a whole frame as an integral image, so any box count is an O(1) lookup
+class ColorGate:
+    def __init__(self, image: np.ndarray, downscale: int = 1) -> None:
+        self.downscale = max(1, int(downscale))
+        self.height, self.width = image.shape[:2]
+        if self.downscale > 1:
+            # Nearest neighbour keeps pixel colors intact, the HSV ranges stay valid
+            image = cv2.resize(image, (max(1, self.width // self.downscale), max(1, self.height // self.downscale)), interpolation=cv2.INTER_NEAREST)
+        self.mask = map_color_mask(image)
+        self.integral = cv2.integral(self.mask, sdepth=cv2.CV_32S)
+
+    # Map-colored pixel counts and areas of boxes [x0, x1) x [y0, y1) given in frame coordinates
+    def box_counts(self, x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        mask_h, mask_w = self.mask.shape
+        x0 = np.clip(np.asarray(x0) // self.downscale, 0, mask_w)
+        x1 = np.clip(-(-np.asarray(x1) // self.downscale), 0, mask_w)
+        y0 = np.clip(np.asarray(y0) // self.downscale, 0, mask_h)
+        y1 = np.clip(-(-np.asarray(y1) // self.downscale), 0, mask_h)
+        integral = self.integral
+        counts = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        areas = (x1 - x0) * (y1 - y0)
+        return counts, areas
+
+    # Which candidate centers have map-like colors around them (patch clipped at the frame edge)
+    def valid_centers(self, xs: np.ndarray, ys: np.ndarray, region_size: int = REGION_SIZE, min_share: float = MIN_COLOR_SHARE) -> np.ndarray:
+        counts, areas = self.box_counts(xs - region_size, ys - region_size, xs + region_size, ys + region_size)
+        return counts > np.maximum(areas, 1) * min_share
+
+    # Strips (x0, y0, x1, y1) of the frame worth template matching: rows of tiles that contain map colors,
+    # each limited to its colored columns and grown by `margin` (the largest template size)
+    def active_strips(self, tile_size: int, min_pixels: int, margin: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        tile = max(1, tile_size // self.downscale)
+        mask_h, mask_w = self.mask.shape
+        ys = np.arange(0, mask_h, tile)
+        xs = np.arange(0, mask_w, tile)
+        y_ends = np.minimum(ys + tile, mask_h)
+        x_ends = np.minimum(xs + tile, mask_w)
+
+        integral = self.integral
+        tiles = (integral[np.ix_(y_ends, x_ends)] - integral[np.ix_(ys, x_ends)]
+                 - integral[np.ix_(y_ends, xs)] + integral[np.ix_(ys, xs)])
+        active = tiles >= max(1, min_pixels // (self.downscale * self.downscale))
+
+        strips = []
+        row = 0
+        while row < len(ys):
+            if not active[row].any():
+                row += 1
+                continue
+            # Merge consecutive active tile rows into one strip
+            first_row = row
+            while row + 1 < len(ys) and active[row + 1].any():
+                row += 1
+            columns = np.nonzero(active[first_row:row + 1].any(axis=0))[0]
+            scale = self.downscale
+            strips.append((
+                max(0, int(xs[columns[0]]) * scale - margin[0]),
+                max(0, int(ys[first_row]) * scale - margin[1]),
+                min(self.width, int(x_ends[columns[-1]]) * scale + margin[0]),
+                min(self.height, int(y_ends[row]) * scale + margin[1])
+            ))
+            row += 1
+        return strips
@@ -1,9 +1,15 @@
 import cv2
-import glob
+import importlib
+from abc import ABC, abstractmethod
 import numpy as np
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Tuple
 from settings.settings_manager import SettingsManager
 from utils.logger import logger
+from utils.tracing import trace_span, traced
+from .match import MapMatch, MatchBatch
+from .templates import TemplateBank, TemplateVariant, get_template_bank, load_and_preprocess_template, to_domain
+from .color_gate import ColorGate
+from .viewport import ViewportMask
 
 
 settings_manager = SettingsManager()
@@ -11,124 +17,150 @@ settings = settings_manager.settings.get('settings', {})
 DEFAULT_SCALES = settings.get('scales', [1.0])
 DEFAULT_ROTATIONS = settings.get('rotations', [0])
 REFS_FOLDER_PATH = settings.get('refs_folder', '')
+MATCH_DOMAIN = settings.get('match_domain', 'bgr')
+DETECTOR = settings.get('detector', 'template')
+COLOR_GATE_DOWNSCALE = settings.get('color_gate_downscale', 1)
+COLOR_PREFILTER = settings.get('color_prefilter', True)
+MIN_CONFIDENCE = 0.70
+MAX_OVERLAP = 0.3
+
+# Prefilter tiles need this many map-colored pixels to be template matched
+PREFILTER_TILE_SIZE = 64
+PREFILTER_MIN_PIXELS = 8
+# Above this share of the frame, matching the whole frame at once is cheaper than strips
+PREFILTER_MAX_AREA_SHARE = 0.7
 
 # Find maps in the screenshot.
-def find_maps(screenshot: np.ndarray, threshold: float = 0.6) -> List:
-    all_matches = []    
-
-    template_files = glob.glob(REFS_FOLDER_PATH)
-    if not template_files:        
-        logger.warning(f"Warning: No template files found!")
-        return all_matches
-
-    for template_file in template_files:
-        for scale in DEFAULT_SCALES:
-            for angle in DEFAULT_ROTATIONS:
-                template, size = load_and_preprocess_template(template_file, scale, angle)
-                if template is None:
-                    continue
-                
-                # Template Matching
-                result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
-                maps = np.where(result >= threshold)
-
-                for y,x in zip(*maps):
-                    confidence = result[y,x]                    
-                    if confidence >= 0.70:
-                        center_x = x + size[0] // 2
-                        center_y = y + size[1] // 2                        
-                        
-                        # Verify the match point has map-like characteristics
-                        if is_valid_map_region(screenshot, (center_x, center_y)):
-                            match_info = {
-                                'position': (x, y),
-                                'size': size,
-                                'confidence': float(confidence),
-                                'template': template_file
-                            }
-                            all_matches.append(match_info)
-
-    # Sort by Confidence
-    all_matches.sort(key=lambda x: x['confidence'], reverse=True)
-
-    # Filter overlapping matches
-    filtered_matches = []
-    for match in all_matches:
-        should_add = True
-        for existing_match in filtered_matches:
-            if get_overlap_area(match, existing_match) > 0.3:
-                should_add = False
-                break
-        
-        if should_add:
-            filtered_matches.append(match)
-
-    return filtered_matches
-
-# Load and preprocess template
-def load_and_preprocess_template(template_file: str, scale: float, angle: float) -> Optional[Tuple]:
-    template = cv2.imread(template_file)
-    if template is None:
-        return None, (0, 0)
-    
-    # Resize
-    width = int(template.shape[1] * scale)
-    height = int(template.shape[0] * scale)
-
-    if width == 0 or height == 0:
-        return None, (0, 0)
-        
-    resized = cv2.resize(template, (width, height))
-
-    # Rotate
-    if angle != 0:
-        matrix = cv2.getRotationMatrix2D((width/2, height/2), angle, 1.0)
-        rotated = cv2.warpAffine(resized, matrix, (width, height))
-        return rotated, (width, height)
-        
-    return resized, (width, height)
-
-# Check if a point in the image has map-like characteristics.
-def is_valid_map_region(image: np.ndarray, center_point: Tuple) -> bool:
-    x, y = center_point
-    region_size = 8
-    
-    # Get region around point
-    y_start = max(0, y - region_size)
-    y_end = min(image.shape[0], y + region_size)
-    x_start = max(0, x - region_size)
-    x_end = min(image.shape[1], x + region_size)
-    
-    region = image[y_start:y_end, x_start:x_end]
-    
-    # Convert to HSV for better color detection
-    hsv_region = cv2.cvtColor(region, cv2.COLOR_BGR2HSV)
-    
-    # Define color ranges for white and blue
-    lower_blue = np.array([85, 100, 200])
-    upper_blue = np.array([130, 255, 255])
-    lower_white = np.array([0, 0, 200])
-    upper_white = np.array([180, 30, 255])
-    
-    # Create masks
-    blue_mask = np.all((hsv_region >= lower_blue) & (hsv_region <= upper_blue), axis=2)
-    white_mask = np.all((hsv_region >= lower_white) & (hsv_region <= upper_white), axis=2)
-    
-    # Calculate percentage of matching pixels
-    total_pixels = region_size * region_size * 4
-    matching_pixels = np.sum(blue_mask | white_mask)
-    
-    return matching_pixels > (total_pixels * 0.08)
-
-# Check for any overlap between matches
-def get_overlap_area(rect1: Dict, rect2: Dict) -> float:
-    x1, y1 = rect1['position']
-    x2, y2 = rect2['position']
-    w1, h1 = rect1['size']
-    w2, h2 = rect2['size']
-
-    # Calculate intersection
-    intersection = max(0, min(x1 + w1, x2 + w2) - max(x1, x2)) * max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
-
-    # Return ratio relative to smaller rectangle
-    return intersection / min(w1 * h1, w2 * h2)
\ No newline at end of file
+# The screenshot (BGR) is converted once into the matching domain, HSV validation still runs on the color frame.
+# With a viewport mask only its bounds are matched and hits centered outside the mask are rejected.
+@traced('detection.find_maps')
+def find_maps(screenshot: np.ndarray, threshold: float = 0.6, domain: Optional[str] = None, scales: Optional[List] = None, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+    survivors, template_files = find_map_candidates(screenshot, threshold, domain, scales, mask)
+    return survivors.to_matches(template_files)
+
+# Candidates left after overlap filtering, with the ref files their template indexes refer to.
+# `part` (index, count) only matches every count-th template variant, so worker processes can share a scan.
+def find_map_candidates(screenshot: np.ndarray, threshold: float = 0.6, domain: Optional[str] = None, scales: Optional[List] = None,
+                        mask: Optional[ViewportMask] = None, part: Optional[Tuple[int, int]] = None) -> Tuple[MatchBatch, List[str]]:
+    bank = get_template_bank(REFS_FOLDER_PATH, scales or DEFAULT_SCALES, DEFAULT_ROTATIONS, domain or MATCH_DOMAIN)
+    if not bank.template_files:        
+        logger.warning("Warning: No template files found!")
+        return MatchBatch(), []
+
+    with trace_span('detection.prepare_frame', domain=bank.domain):
+        if mask is not None and not mask.is_full_frame:
+            view, offset = mask.crop(screenshot)
+        else:
+            view, offset, mask = screenshot, (0, 0), None
+        frame = to_domain(view, bank.domain)
+
+        # Map color mask of the whole frame, shared by the tile prefilter and candidate validation
+        gate = ColorGate(screenshot, COLOR_GATE_DOWNSCALE)
+        regions = get_match_regions(gate, bank, frame.shape, offset)
+
+    variants = bank.variants if part is None else bank.variants[part[0]::part[1]]
+    batches = []
+    for variant in variants:
+        batches.extend(match_variant(frame, variant, regions, max(threshold, MIN_CONFIDENCE), offset, gate, mask))
+
+    # Filter overlapping matches, only the survivors become MapMatch records
+    all_matches = MatchBatch.concatenate(batches)
+    with trace_span('detection.nms', candidates=len(all_matches)) as span:
+        survivors = all_matches.non_max_suppression(MAX_OVERLAP)
+        span.set(survivors=len(survivors))
+
+    return survivors, bank.template_files
+
+# Match one template variant in the frame regions, keeping candidates with map colors inside the mask
+def match_variant(frame: np.ndarray, variant: TemplateVariant, regions: List[Tuple], threshold: float, offset: Tuple, gate: ColorGate, mask: Optional[ViewportMask] = None) -> List[MatchBatch]:
+    batches = []
+    for x0, y0, x1, y1 in regions:
+        if variant.size[0] > x1 - x0 or variant.size[1] > y1 - y0:
+            continue
+
+        # Template Matching
+        with trace_span('detection.match_template', template=variant.template_file, scale=variant.scale, angle=variant.angle):
+            if variant.mask is None:
+                result = cv2.matchTemplate(frame[y0:y1, x0:x1], variant.image, cv2.TM_CCOEFF_NORMED)
+            else:
+                # Only the unmasked pixels count, so one masked ref covers maps hidden in different places.
+                # Flat frame areas give non-finite scores under a mask.
+                result = cv2.matchTemplate(frame[y0:y1, x0:x1], variant.image, cv2.TM_CCOEFF_NORMED, mask=variant.mask)
+                result[~np.isfinite(result)] = 0
+            candidates = MatchBatch.from_result(result, threshold, variant.size, variant.template_index, variant.scale, (offset[0] + x0, offset[1] + y0))
+
+        # Verify the match points have map-like characteristics
+        with trace_span('detection.validate', candidates=len(candidates)):
+            center_xs, center_ys = candidates.centers()
+            valid = gate.valid_centers(center_xs, center_ys)
+            if mask is not None:
+                valid &= mask.contains(center_xs, center_ys)
+            batches.append(candidates.filter(valid))
+    return batches
+
+# Common interface of the map detector backends. Every backend returns MapMatch records like find_maps.
+class MapDetector(ABC):
+    name = 'base'
+
+    @abstractmethod
+    def detect(self, screenshot: np.ndarray, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+        ...
+
+
+# Template matching backend (find_maps)
+class TemplateMatchDetector(MapDetector):
+    name = 'template'
+
+    def __init__(self, threshold: float = 0.6, domain: Optional[str] = None, scales: Optional[List] = None) -> None:
+        self.threshold = threshold
+        self.domain = domain
+        self.scales = scales
+
+    def detect(self, screenshot: np.ndarray, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+        return find_maps(screenshot, self.threshold, self.domain, self.scales, mask)
+
+
+# Backends by name, imported on first use so optional dependencies are only needed when selected
+DETECTOR_BACKENDS = {
+    'template': ('vision.detection', 'TemplateMatchDetector'),
+    'onnx': ('vision.onnx_detector', 'OnnxMapDetector'),
+    'keypoint': ('vision.keypoint_detector', 'KeypointMapDetector')
+}
+
+def create_detector(name: Optional[str] = None, **options) -> MapDetector:
+    name = name or DETECTOR
+    if name not in DETECTOR_BACKENDS:
+        logger.error("Unknown detector '%s', using template matching", name)
+        name = 'template'
+
+    module_name, class_name = DETECTOR_BACKENDS[name]
+    try:
+        detector_class = getattr(importlib.import_module(module_name), class_name)
+        return detector_class(**options)
+    except Exception as e:
+        if name == 'template':
+            raise
+        logger.error("Error creating %s detector, using template matching: %s", name, e)
+        return TemplateMatchDetector()
+
+# Regions (x0, y0, x1, y1 in frame coordinates) that need template matching.
+# Tiles without map colors are skipped, unless most of the frame would be matched anyway.
+def get_match_regions(gate: ColorGate, bank: TemplateBank, frame_shape: Tuple, offset: Tuple) -> List[Tuple]:
+    height, width = frame_shape[:2]
+    full_frame = [(0, 0, width, height)]
+    if not COLOR_PREFILTER or not bank.variants:
+        return full_frame
+
+    margin = (max(v.size[0] for v in bank.variants), max(v.size[1] for v in bank.variants))
+    regions = []
+    for x0, y0, x1, y1 in gate.active_strips(PREFILTER_TILE_SIZE, PREFILTER_MIN_PIXELS, margin):
+        # Strips are in screenshot coordinates, the frame may be a viewport crop
+        x0, x1 = max(0, x0 - offset[0]), min(width, x1 - offset[0])
+        y0, y1 = max(0, y0 - offset[1]), min(height, y1 - offset[1])
+        if x1 > x0 and y1 > y0:
+            regions.append((x0, y0, x1, y1))
+
+    matched_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+    if matched_area > width * height * PREFILTER_MAX_AREA_SHARE:
+        return full_frame
+    return regions
@@ -3,29 +3,49 @@ import os
 import cv2
 import numpy as np
 from utils.logger import logger
+from utils.tracing import traced
+from .image_cache import get_image_cache, icon_entry_name
 from typing import List
 
 class IconDetector:
     def __init__(self, icons_dir: str = 'data/icons') -> None:
         self.icons_dir = icons_dir
         self.icons = {}
+        self.icons_bgra = {}
         self.load_icons()
 
     # Load all icon templates from the icons directory
     def load_icons(self) -> None:
+        # Icons are mapped from the image cache when it was built from this directory
+        cache = get_image_cache()
+        if cache is not None and cache.icons_dir != self.icons_dir:
+            cache = None
+
         icon_files = glob.glob(os.path.join(self.icons_dir, '*.png'))
         for icon_file in icon_files:
             icon_name = os.path.splitext(os.path.basename(icon_file))[0]
+            cached_bgr = cache.get(icon_entry_name(icon_name)) if cache else None
+            cached_bgra = cache.get(icon_entry_name(icon_name, 'bgra')) if cache else None
+            if cached_bgr is not None and cached_bgra is not None:
+                self.icons[icon_name] = cached_bgr
+                self.icons_bgra[icon_name] = cached_bgra
+                continue
+
             icon_template = cv2.imread(icon_file, cv2.IMREAD_COLOR)
             if icon_template is not None:
                 self.icons[icon_name] = icon_template
+                # Alpha is constant in both icon and capture, so it doesn't change TM_CCOEFF_NORMED scores
+                self.icons_bgra[icon_name] = cv2.cvtColor(icon_template, cv2.COLOR_BGR2BGRA)
             else:
-                logger.error(f'Failed to load icon: {icon_file}')
+                logger.error('Failed to load icon: %s', icon_file)
 
     # Using Template Matching to detect icons
+    @traced('icons.detect')
     def detect_icons(self, region_img: np.ndarray, threshold: float = 0.85) -> List:
         detected_icons = []        
-        for icon_name, template in self.icons.items(): 
+        # BGRA capture views are matched directly instead of being converted to BGR
+        icons = self.icons_bgra if region_img.shape[2] == 4 else self.icons
+        for icon_name, template in icons.items(): 
             result = cv2.matchTemplate(region_img, template, cv2.TM_CCOEFF_NORMED)
             locations = np.where(result >= threshold)               
             if len(locations[0]) > 0:
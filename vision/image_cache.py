@@ -0,0 +1,186 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import cv2
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.metrics import metrics
+from .templates import MATCH_DOMAINS, get_template_mask, load_and_preprocess_template, to_domain
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+IMAGE_CACHE = settings.get('image_cache', True)
+IMAGE_CACHE_FILE = settings.get('image_cache_file', 'data/cache/images.npy')
+REFS_FOLDER_PATH = settings.get('refs_folder', '')
+ICONS_DIR = 'data/icons'
+
+# Bumped whenever the file layout or the preprocessing changes
+CACHE_VERSION = 2
+# Size of the header length prefix, and the alignment of every stored image
+LENGTH_BYTES = 8
+ALIGNMENT = 64
+
+
+# Variant configuration stored in the cache: configured and calibration scales, rotations and every domain
+def get_cache_config() -> Dict:
+    scales = sorted(set(settings.get('scales', [1.0])) | set(settings.get('calibration_scales', [])))
+    return {
+        'scales': scales,
+        'rotations': sorted(set(settings.get('rotations', [0]))),
+        'domains': list(MATCH_DOMAINS)
+    }
+
+def get_source_files(refs_pattern: str = REFS_FOLDER_PATH, icons_dir: str = ICONS_DIR) -> Tuple[List[str], List[str]]:
+    return sorted(glob.glob(refs_pattern)), sorted(glob.glob(os.path.join(icons_dir, '*.png')))
+
+# Identity of a cache: format version, variant configuration and a hash of every source image
+def get_cache_key(ref_files: List[str], icon_files: List[str], config: Dict) -> str:
+    digest = hashlib.sha1(json.dumps({'version': CACHE_VERSION, 'config': config}, sort_keys=True).encode())
+    for source_file in ref_files + icon_files:
+        digest.update(os.path.basename(source_file).encode())
+        with open(source_file, 'rb') as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+def ref_entry_name(template_file: str, domain: str, scale: float, angle: float) -> str:
+    return f"refs/{os.path.basename(template_file)}/{domain}/{scale:g}/{angle:g}"
+
+# Matching mask of a ref with transparency, shared by all domains
+def ref_mask_entry_name(template_file: str, scale: float, angle: float) -> str:
+    return f"refs/{os.path.basename(template_file)}/mask/{scale:g}/{angle:g}"
+
+def icon_entry_name(icon_name: str, mode: str = 'bgr') -> str:
+    return f"icons/{icon_name}/{mode}"
+
+
+# Preprocessed template variants and icons in one memory-mapped file.
+# Layout: a uint8 .npy array holding the header length, a JSON header (key and entry offsets) and the aligned images.
+class ImageCache:
+    def __init__(self, path: str, buffer: np.ndarray, header: Dict, data_start: int) -> None:
+        self.path = path
+        self.buffer = buffer
+        self.key = header['key']
+        self.refs_pattern = header.get('refs_pattern')
+        self.icons_dir = header.get('icons_dir')
+        self.entries = header['entries']
+        # Entry offsets are relative to the data block, which starts at the first aligned byte after the header
+        self.data_start = data_start
+
+    @staticmethod
+    def get_data_start(header_length: int) -> int:
+        return -(-(LENGTH_BYTES + header_length) // ALIGNMENT) * ALIGNMENT
+
+    @classmethod
+    def open(cls, path: str) -> Optional['ImageCache']:
+        if not os.path.exists(path):
+            return None
+        try:
+            buffer = np.load(path, mmap_mode='r')
+            length = int(np.frombuffer(buffer[:LENGTH_BYTES].tobytes(), dtype='<u8')[0])
+            header = json.loads(buffer[LENGTH_BYTES:LENGTH_BYTES + length].tobytes())
+            if header.get('version') != CACHE_VERSION:
+                return None
+            return cls(path, buffer, header, cls.get_data_start(length))
+        except Exception as e:
+            logger.error("Error opening image cache %s: %s", path, e)
+            return None
+
+    @staticmethod
+    def write(path: str, key: str, images: Dict[str, np.ndarray], refs_pattern: str, icons_dir: str) -> None:
+        entries = {}
+        offset = 0
+        for name, image in images.items():
+            entries[name] = {'offset': offset, 'shape': list(image.shape), 'dtype': image.dtype.str}
+            offset += -(-image.nbytes // ALIGNMENT) * ALIGNMENT
+
+        header = json.dumps({'version': CACHE_VERSION, 'key': key, 'refs_pattern': refs_pattern, 'icons_dir': icons_dir, 'entries': entries}).encode()
+        data_start = ImageCache.get_data_start(len(header))
+        buffer = np.zeros(data_start + offset, dtype=np.uint8)
+        buffer[:LENGTH_BYTES] = np.frombuffer(np.array([len(header)], dtype='<u8').tobytes(), dtype=np.uint8)
+        buffer[LENGTH_BYTES:LENGTH_BYTES + len(header)] = np.frombuffer(header, dtype=np.uint8)
+        for name, image in images.items():
+            start = data_start + entries[name]['offset']
+            buffer[start:start + image.nbytes] = np.ascontiguousarray(image).reshape(-1).view(np.uint8)
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # A temp file of its own: batch scan and pool workers may rebuild a stale cache at the same time
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, buffer)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    # Read-only view of a stored image, backed by the mapped file
+    def get(self, name: str) -> Optional[np.ndarray]:
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape']))
+        start = self.data_start + entry['offset']
+        return self.buffer[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+
+
+# Every preprocessed image the cache holds, computed from the sources
+def iter_cache_images(ref_files: List[str], icon_files: List[str], config: Dict) -> Iterator[Tuple[str, np.ndarray]]:
+    for template_file in ref_files:
+        for scale in config['scales']:
+            for angle in config['rotations']:
+                template, _ = load_and_preprocess_template(template_file, scale, angle)
+                if template is None:
+                    continue
+                for domain in config['domains']:
+                    yield ref_entry_name(template_file, domain, scale, angle), to_domain(template, domain)
+                mask = get_template_mask(template)
+                if mask is not None:
+                    yield ref_mask_entry_name(template_file, scale, angle), mask
+
+    for icon_file in icon_files:
+        icon = cv2.imread(icon_file, cv2.IMREAD_COLOR)
+        if icon is not None:
+            icon_name = os.path.splitext(os.path.basename(icon_file))[0]
+            yield icon_entry_name(icon_name), icon
+            yield icon_entry_name(icon_name, 'bgra'), cv2.cvtColor(icon, cv2.COLOR_BGR2BGRA)
+
+def build_image_cache(path: str = IMAGE_CACHE_FILE, refs_pattern: str = REFS_FOLDER_PATH, icons_dir: str = ICONS_DIR) -> ImageCache:
+    ref_files, icon_files = get_source_files(refs_pattern, icons_dir)
+    config = get_cache_config()
+    key = get_cache_key(ref_files, icon_files, config)
+    images = dict(iter_cache_images(ref_files, icon_files, config))
+    ImageCache.write(path, key, images, refs_pattern, icons_dir)
+    logger.info("Image cache written to %s: %d images from %d refs and %d icons", path, len(images), len(ref_files), len(icon_files))
+    return ImageCache.open(path)
+
+
+# Cache shared by the template banks and the icon detector, checked once per process
+_cache: Dict = {}
+
+def get_image_cache() -> Optional[ImageCache]:
+    if not IMAGE_CACHE:
+        return None
+    if 'cache' in _cache:
+        return _cache['cache']
+
+    ref_files, icon_files = get_source_files()
+    key = get_cache_key(ref_files, icon_files, get_cache_config())
+    cache = ImageCache.open(IMAGE_CACHE_FILE)
+    metrics.record_cache('image_cache', cache is not None and cache.key == key)
+    if cache is None or cache.key != key:
+        # Refs, icons or settings changed since the last build
+        logger.info("Image cache is missing or stale, rebuilding %s", IMAGE_CACHE_FILE)
+        try:
+            cache = build_image_cache()
+        except Exception as e:
+            logger.error("Error building image cache: %s", e)
+            cache = None
+    _cache['cache'] = cache
+    return cache
@@ -0,0 +1,204 @@
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.tracing import trace_span, traced
+from .detection import MapDetector, REFS_FOLDER_PATH, COLOR_GATE_DOWNSCALE, MAX_OVERLAP
+from .match import MatchBatch, MapMatch, MATCH_DTYPE
+from .color_gate import ColorGate
+from .templates import get_template_mask, list_templates, read_template, to_domain
+from .viewport import ViewportMask
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+KEYPOINT_FEATURES = settings.get('keypoint_features', 20000)
+KEYPOINT_MIN_VOTES = settings.get('keypoint_min_votes', 4)
+
+# Refs are tiny (about 30px), so they are upscaled and described with small ORB patches
+REF_UPSCALE = 2
+PATCH_SIZE = 11
+FAST_THRESHOLD = 5
+REF_FEATURES = 300
+# Lowe ratio test between the best and second best descriptor match
+MATCH_RATIO = 0.8
+# Size (frame pixels) of the cells map centers are voted into
+VOTE_CELL = 8
+# Votes at the best cell that give full confidence
+FULL_CONFIDENCE_VOTES = 20
+# Scale range a vote may imply, relative to the ref size
+MIN_VOTE_SCALE = 0.5
+MAX_VOTE_SCALE = 2.0
+
+# FLANN locality sensitive hashing parameters for binary descriptors
+FLANN_INDEX_LSH = 6
+LSH_PARAMS = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+SEARCH_PARAMS = dict(checks=32)
+
+
+def create_orb(features: int) -> cv2.ORB:
+    return cv2.ORB_create(nfeatures=features, scaleFactor=1.2, nlevels=4, edgeThreshold=PATCH_SIZE, patchSize=PATCH_SIZE, fastThreshold=FAST_THRESHOLD)
+
+
+# ORB features of every ref in one LSH index. Each indexed keypoint remembers its ref,
+# and its offset to the ref center so a match can vote for where the map center is.
+class KeypointIndex:
+    def __init__(self, refs_pattern: str) -> None:
+        self.template_files = list_templates(refs_pattern)
+        self.ref_sizes = []
+        self.matcher = cv2.FlannBasedMatcher(LSH_PARAMS, SEARCH_PARAMS)
+        self.ref_index = np.empty(0, dtype=np.int32)
+        # Per indexed keypoint: center offset x, y, size and angle, in ref pixels
+        self.geometry = np.empty((0, 4), dtype=np.float32)
+        self.load()
+
+    def load(self) -> None:
+        orb = create_orb(REF_FEATURES)
+        ref_index, geometry = [], []
+        for template_index, template_file in enumerate(self.template_files):
+            template = read_template(template_file)
+            if template is None:
+                self.ref_sizes.append((0, 0))
+                continue
+            height, width = template.shape[:2]
+            self.ref_sizes.append((width, height))
+
+            # Upscale and pad so keypoints near the ref border still get a full descriptor patch
+            size = (width * REF_UPSCALE, height * REF_UPSCALE)
+            upscaled = cv2.resize(to_domain(template, 'gray'), size, interpolation=cv2.INTER_CUBIC)
+            padded = cv2.copyMakeBorder(upscaled, PATCH_SIZE, PATCH_SIZE, PATCH_SIZE, PATCH_SIZE, cv2.BORDER_REPLICATE)
+            # Transparent parts of a ref (occluders) get no keypoints
+            mask = get_template_mask(template)
+            if mask is not None:
+                mask = cv2.copyMakeBorder(cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST), PATCH_SIZE, PATCH_SIZE, PATCH_SIZE, PATCH_SIZE, cv2.BORDER_REPLICATE)
+            keypoints, descriptors = orb.detectAndCompute(padded, mask)
+            if descriptors is None:
+                logger.warning("No keypoints found in %s", template_file)
+                continue
+
+            self.matcher.add([descriptors])
+            center_x, center_y = width / 2, height / 2
+            for keypoint in keypoints:
+                x = (keypoint.pt[0] - PATCH_SIZE) / REF_UPSCALE
+                y = (keypoint.pt[1] - PATCH_SIZE) / REF_UPSCALE
+                geometry.append((center_x - x, center_y - y, keypoint.size / REF_UPSCALE, keypoint.angle))
+                ref_index.append(template_index)
+
+        if geometry:
+            self.ref_index = np.array(ref_index, dtype=np.int32)
+            self.geometry = np.array(geometry, dtype=np.float32)
+            self.matcher.train()
+        logger.info("Indexed %d keypoints from %d refs", len(self.geometry), len(self.template_files))
+
+    # Offset of each image's first keypoint in the flat geometry arrays
+    def image_offsets(self) -> np.ndarray:
+        return np.concatenate(([0], np.cumsum(np.bincount(self.ref_index, minlength=len(self.template_files)))))
+
+
+# Map detector voting for map centers with ORB keypoints matched against the refs index.
+# Cost per scan is one feature extraction plus index lookups, independent of scales and rotations.
+class KeypointMapDetector(MapDetector):
+    name = 'keypoint'
+
+    def __init__(self, refs_pattern: str = REFS_FOLDER_PATH, features: int = KEYPOINT_FEATURES, min_votes: int = KEYPOINT_MIN_VOTES) -> None:
+        self.index = KeypointIndex(refs_pattern)
+        self.orb = create_orb(features)
+        self.min_votes = min_votes
+        # Refs whose descriptors were added to the matcher, in matcher image order
+        self.indexed_refs = np.unique(self.index.ref_index)
+        self.first_keypoint = self.index.image_offsets()[self.indexed_refs]
+
+    @traced('detection.keypoints')
+    def detect(self, screenshot: np.ndarray, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+        if not len(self.index.geometry):
+            logger.warning("Warning: No template keypoints indexed!")
+            return []
+
+        with trace_span('detection.prepare_frame'):
+            if mask is not None and not mask.is_full_frame:
+                view, offset = mask.crop(screenshot)
+            else:
+                view, offset, mask = screenshot, (0, 0), None
+            gray = cv2.cvtColor(view, cv2.COLOR_BGRA2GRAY if view.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+            keypoints, descriptors = self.orb.detectAndCompute(gray, None)
+        if descriptors is None or len(descriptors) == 0:
+            return []
+
+        with trace_span('detection.keypoint_match', keypoints=len(keypoints)):
+            pairs = self.index.matcher.knnMatch(descriptors, k=2)
+            votes = self.cast_votes(keypoints, pairs, offset)
+
+        with trace_span('detection.vote', votes=len(votes[0])):
+            candidates = self.find_peaks(votes, screenshot.shape)
+
+        with trace_span('detection.validate', candidates=len(candidates)):
+            center_xs, center_ys = candidates.centers()
+            valid = ColorGate(screenshot, COLOR_GATE_DOWNSCALE).valid_centers(center_xs, center_ys)
+            if mask is not None:
+                valid &= mask.contains(center_xs, center_ys)
+            candidates = candidates.filter(valid)
+
+        with trace_span('detection.nms', candidates=len(candidates)) as span:
+            survivors = candidates.non_max_suppression(MAX_OVERLAP)
+            span.set(survivors=len(survivors))
+        return survivors.to_matches(self.index.template_files)
+
+    # Turn every ratio-test match into a vote: (center x, center y, ref, scale) in frame coordinates
+    def cast_votes(self, keypoints: List, pairs: List, offset: Tuple) -> Tuple[np.ndarray, ...]:
+        query, image, train = [], [], []
+        for pair in pairs:
+            if len(pair) == 2 and pair[0].distance < MATCH_RATIO * pair[1].distance:
+                query.append(pair[0].queryIdx)
+                image.append(pair[0].imgIdx)
+                train.append(pair[0].trainIdx)
+        if not query:
+            empty = np.empty(0, dtype=np.float32)
+            return empty, empty, np.empty(0, dtype=np.int32), empty
+
+        indexed = self.first_keypoint[image] + np.array(train)
+        geometry = self.index.geometry[indexed]
+        frame_points = np.array([keypoints[i].pt for i in query], dtype=np.float32)
+        frame_sizes = np.array([keypoints[i].size for i in query], dtype=np.float32)
+        frame_angles = np.array([keypoints[i].angle for i in query], dtype=np.float32)
+
+        # Keypoint scale and orientation relate the ref to the frame, so the center offset can be carried over
+        scales = frame_sizes / np.maximum(geometry[:, 2], 1e-3)
+        angles = np.deg2rad(frame_angles - geometry[:, 3])
+        cos, sin = np.cos(angles), np.sin(angles)
+        center_xs = frame_points[:, 0] + scales * (cos * geometry[:, 0] - sin * geometry[:, 1]) + offset[0]
+        center_ys = frame_points[:, 1] + scales * (sin * geometry[:, 0] + cos * geometry[:, 1]) + offset[1]
+
+        plausible = (scales >= MIN_VOTE_SCALE) & (scales <= MAX_VOTE_SCALE)
+        refs = self.index.ref_index[indexed]
+        return center_xs[plausible], center_ys[plausible], refs[plausible], scales[plausible]
+
+    # Cells with enough votes (and the most votes of their neighbourhood) become candidates
+    def find_peaks(self, votes: Tuple, frame_shape: Tuple) -> MatchBatch:
+        center_xs, center_ys, refs, scales = votes
+        height, width = frame_shape[:2]
+        inside = (center_xs >= 0) & (center_xs < width) & (center_ys >= 0) & (center_ys < height)
+        center_xs, center_ys, refs, scales = center_xs[inside], center_ys[inside], refs[inside], scales[inside]
+        if not len(center_xs):
+            return MatchBatch()
+
+        cells_x = (center_xs // VOTE_CELL).astype(np.int32)
+        cells_y = (center_ys // VOTE_CELL).astype(np.int32)
+        grid = np.zeros(((height + VOTE_CELL - 1) // VOTE_CELL, (width + VOTE_CELL - 1) // VOTE_CELL), dtype=np.float32)
+        np.add.at(grid, (cells_y, cells_x), 1)
+
+        # Votes of a map center often straddle two cells, so peaks are judged on 3x3 sums
+        summed = cv2.boxFilter(grid, -1, (3, 3), normalize=False, borderType=cv2.BORDER_CONSTANT)
+        peaks = (summed >= self.min_votes) & (summed >= cv2.dilate(summed, np.ones((3, 3), np.uint8)))
+        peak_ys, peak_xs = np.nonzero(peaks)
+
+        records = np.empty(len(peak_xs), dtype=MATCH_DTYPE)
+        for i, (peak_x, peak_y) in enumerate(zip(peak_xs, peak_ys)):
+            voters = (np.abs(cells_x - peak_x) <= 1) & (np.abs(cells_y - peak_y) <= 1)
+            ref = np.bincount(refs[voters]).argmax()
+            scale = float(np.median(scales[voters]))
+            ref_w, ref_h = self.index.ref_sizes[ref]
+            w, h = max(1, round(ref_w * scale)), max(1, round(ref_h * scale))
+            records[i] = (round(np.median(center_xs[voters])) - w // 2, round(np.median(center_ys[voters])) - h // 2, w, h,
+                          min(1.0, summed[peak_y, peak_x] / FULL_CONFIDENCE_VOTES), ref, scale)
+        return MatchBatch(records)
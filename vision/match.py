@@ -0,0 +1,142 @@
+import numpy as np
+from dataclasses import dataclass, replace, asdict
+from typing import Dict, List, Optional, Tuple
+
+
+# Fields of one detection candidate in the bulk (structured array) form
+MATCH_DTYPE = np.dtype([
+    ('x', np.int32),
+    ('y', np.int32),
+    ('w', np.int32),
+    ('h', np.int32),
+    ('confidence', np.float32),
+    ('template', np.int32),
+    ('scale', np.float32)
+])
+
+
+# A single detected (and optionally identified) map
+@dataclass(frozen=True, slots=True)
+class MapMatch:
+    position: Tuple[int, int]
+    size: Tuple[int, int]
+    confidence: float = 0.0
+    template: str = ''
+    scale: float = 1.0
+    map_name: Optional[str] = None
+    biomes: Tuple[str, ...] = ()
+    layout: Optional[str] = None
+    notes: Optional[str] = None
+    is_favorite: bool = False
+    is_citadel: bool = False
+    color: str = '#ffffff'
+    activities: Tuple[str, ...] = ()
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return self.position[0] + self.size[0] // 2, self.position[1] + self.size[1] // 2
+
+    @property
+    def is_identified(self) -> bool:
+        return self.map_name is not None
+
+    # Copy of this match with some fields replaced (matches are immutable)
+    def with_info(self, **fields) -> 'MapMatch':
+        return replace(self, **fields)
+
+    # Plain dict (JSON friendly) view of the match
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['position'] = list(self.position)
+        data['size'] = list(self.size)
+        data['biomes'] = list(self.biomes)
+        data['activities'] = list(self.activities)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MapMatch':
+        fields = dict(data)
+        fields['position'] = tuple(fields['position'])
+        fields['size'] = tuple(fields['size'])
+        fields['biomes'] = tuple(fields.get('biomes') or ())
+        fields['activities'] = tuple(fields.get('activities') or ())
+        return cls(**{key: value for key, value in fields.items() if key in cls.__dataclass_fields__})
+
+
+# Bulk candidate set stored as one NumPy structured array
+class MatchBatch:
+    def __init__(self, records: Optional[np.ndarray] = None) -> None:
+        self.records = records if records is not None else np.empty(0, dtype=MATCH_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    # Candidates of one matchTemplate result above the threshold
+    @classmethod
+    def from_result(cls, result: np.ndarray, threshold: float, size: Tuple, template_index: int, scale: float = 1.0, offset: Tuple = (0, 0)) -> 'MatchBatch':
+        ys, xs = np.nonzero(result >= threshold)
+        records = np.empty(len(xs), dtype=MATCH_DTYPE)
+        records['x'] = xs + offset[0]
+        records['y'] = ys + offset[1]
+        records['w'] = size[0]
+        records['h'] = size[1]
+        records['confidence'] = result[ys, xs]
+        records['template'] = template_index
+        records['scale'] = scale
+        return cls(records)
+
+    @classmethod
+    def concatenate(cls, batches: List) -> 'MatchBatch':
+        batches = [batch.records for batch in batches if len(batch)]
+        if not batches:
+            return cls()
+        return cls(np.concatenate(batches))
+
+    def filter(self, mask: np.ndarray) -> 'MatchBatch':
+        return MatchBatch(self.records[mask])
+
+    def centers(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.records['x'] + self.records['w'] // 2, self.records['y'] + self.records['h'] // 2
+
+    def sorted_by_confidence(self) -> 'MatchBatch':
+        order = np.argsort(-self.records['confidence'], kind='stable')
+        return MatchBatch(self.records[order])
+
+    # Greedy suppression: keep the most confident box, drop every box overlapping it, repeat.
+    # Overlap is the intersection relative to the smaller box.
+    def non_max_suppression(self, max_overlap: float = 0.3) -> 'MatchBatch':
+        if len(self.records) == 0:
+            return MatchBatch(self.records)
+
+        records = self.sorted_by_confidence().records
+        x1 = records['x'].astype(np.int64)
+        y1 = records['y'].astype(np.int64)
+        x2 = x1 + records['w']
+        y2 = y1 + records['h']
+        areas = (x2 - x1) * (y2 - y1)
+
+        keep = []
+        remaining = np.arange(len(records))
+        while len(remaining):
+            best = remaining[0]
+            keep.append(best)
+            rest = remaining[1:]
+            inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+            inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+            overlap = (inter_w * inter_h) / np.maximum(np.minimum(areas[best], areas[rest]), 1)
+            remaining = rest[overlap <= max_overlap]
+
+        return MatchBatch(records[keep])
+
+    # Turn the (surviving) candidates into MapMatch records
+    def to_matches(self, templates: List) -> List:
+        return [
+            MapMatch(
+                position=(int(record['x']), int(record['y'])),
+                size=(int(record['w']), int(record['h'])),
+                confidence=float(record['confidence']),
+                template=templates[record['template']] if 0 <= record['template'] < len(templates) else '',
+                scale=round(float(record['scale']), 4)
+            )
+            for record in self.records
+        ]
@@ -1,52 +1,215 @@
 import cv2
+import os
 import pytesseract
+from difflib import SequenceMatcher
 from utils.logger import logger
+from utils.tracing import traced
+from utils.metrics import metrics
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from settings.settings_manager import SettingsManager
+from settings.map_catalog import MapCatalog, normalize_name
+from .title_recognizer import binarize, find_title_lines, get_title_recognizer
 
 
 settings_manager = SettingsManager()
 settings = settings_manager.settings.get('settings', {})
 tesseract_cmd_location = settings.get('tesseract_cmd_location', '')
+# Constrained OCR: single line mode on the located title lines with a vocabulary generated from the map list
+OCR_CONSTRAINED = settings.get('ocr_constrained', True)
 
 # Set Tesserac path
 pytesseract.pytesseract.tesseract_cmd = tesseract_cmd_location
 
-def get_text_from_region(region_img: np.ndarray, maps_data: List) -> Tuple:
+OCR_VOCABULARY_FOLDER = 'data/ocr'
+# Lines are upscaled to at least this height, Tesseract reads small text poorly
+MIN_OCR_LINE_HEIGHT = 32
+OCR_LINE_PADDING = 10
+# Words below this confidence may be misreads and are compared fuzzily
+LOW_WORD_CONFIDENCE = 60
+FUZZY_WORD_RATIO = 0.75
+# A title recognized by shape is accepted when its line OCR is at least this close to the name
+TITLE_VERIFY_RATIO = 0.8
+
+# Vocabulary files and whitelist, regenerated when the map list changes
+_vocabulary: Dict = {}
+
+@traced('ocr.recognize')
+def get_text_from_region(region_img: np.ndarray, catalog: MapCatalog) -> Tuple:
+    result, title_box = read_region(region_img, catalog)
+    learn_title(region_img, result[0], title_box)
+    return result
+
+# (map info, Tesseract box of the title line) of a tooltip region, without learning the title.
+# The box is None when the title was recognized by shape or not read at all.
+def read_region(region_img: np.ndarray, catalog: MapCatalog) -> Tuple[Tuple, Optional[Tuple]]:
     try:
-        # Convert to grayscale
-        gray = cv2.cvtColor(region_img, cv2.COLOR_BGR2GRAY)
-        
-        # Thresholding to improve text detection
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        
-        # OCR with improved configuration
-        text = pytesseract.image_to_string(
-            thresh,
-            config='--psm 11 --oem 3'
-        ).strip()      
-        
-        # Validate against known locations
-        return validate_map(text, maps_data)
+        # Titles seen before are recognized by shape, Tesseract only runs for unknown or unclear ones
+        recognizer = get_title_recognizer()
+        if recognizer is not None:
+            candidate = recognizer.recognize(region_img)
+            # A confident shape match may still be an unlearned title of similar length, one line OCR confirms it
+            if candidate and verify_title(region_img, candidate[0], candidate[1], catalog):
+                metrics.record_cache('title_index', True)
+                metrics.record_ocr(True)
+                return get_map_info(candidate[0], catalog), None
+            metrics.record_cache('title_index', False)
+
+        result, title_box = (None, None, None, None), None
+        if OCR_CONSTRAINED:
+            result, title_box = read_title_lines(region_img, catalog)
+
+        if result[0] is None:
+            # Convert to grayscale (regions may be BGR or a BGRA capture view)
+            gray = cv2.cvtColor(region_img, cv2.COLOR_BGRA2GRAY if region_img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+            
+            # Thresholding to improve text detection
+            _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            
+            # Sparse text OCR of the whole region, keeping the word boxes of every line
+            data = pytesseract.image_to_data(
+                thresh,
+                config='--psm 11 --oem 3',
+                output_type=pytesseract.Output.DICT
+            )
+            lines = get_text_lines(data)
+            
+            # Validate against known locations
+            result = validate_map("\n".join(text for text, _, _ in lines), catalog, [confidences for _, _, confidences in lines])
+            title_box = next((box for text, box, _ in lines if result[0] and normalize_name(text) == normalize_name(result[0])), None)
+        metrics.record_ocr(result[0] is not None)
+        return result, title_box
         
     except Exception as e:
-        logger.error(f'Error in text recognition: {e}')
-        return None, None, None, None
+        logger.error('Error in text recognition: %s', e)
+        return (None, None, None, None), None
+
+# Teach the recognizer the shape of a title line Tesseract read.
+# Worker processes only read regions, the title index is learned and saved by one process.
+def learn_title(region_img: np.ndarray, map_name: Optional[str], title_box: Optional[Tuple]) -> None:
+    recognizer = get_title_recognizer()
+    if map_name is None or recognizer is None or title_box is None:
+        return
+    try:
+        recognizer.learn(region_img, map_name, title_box)
+    except Exception as e:
+        logger.error('Error learning title: %s', e)
+
+# Read the likely title lines one at a time in single line mode, tallest (title font) first
+@traced('ocr.title_lines')
+def read_title_lines(region_img: np.ndarray, catalog: MapCatalog) -> Tuple[Tuple, Optional[Tuple]]:
+    binary = binarize(region_img)
+    # Title lines tried (tallest first) before falling back to sparse text OCR of the whole region
+    boxes = find_title_lines(binary)
+    config = get_constrained_config(catalog)
+    for box in boxes:
+        lines = read_line(binary, box, config)
+        result = validate_map("\n".join(text for text, _, _ in lines), catalog, [confidences for _, _, confidences in lines])
+        if result[0] is not None:
+            return result, box
+    return (None, None, None, None), None
+
+# Whether the title line the recognizer matched reads as `map_name`.
+# The line is read in single line mode and must be close to the name and not closer to another known map.
+@traced('ocr.title_verify')
+def verify_title(region_img: np.ndarray, map_name: str, box: Tuple, catalog: MapCatalog) -> bool:
+    lines = read_line(binarize(region_img), box, get_constrained_config(catalog))
+    text = normalize_name(" ".join(text for text, _, _ in lines))
+    if not text:
+        return False
+    result = validate_map(text, catalog, [confidences for _, _, confidences in lines] if len(lines) == 1 else None)
+    if result[0] is not None:
+        return normalize_name(result[0]) == normalize_name(map_name)
+    return SequenceMatcher(None, text, normalize_name(map_name)).ratio() >= TITLE_VERIFY_RATIO
+
+# Tesseract lines of one binarized (text = 255) line box
+def read_line(binary: np.ndarray, box: Tuple, config: str) -> List[Tuple[str, Tuple, List[float]]]:
+    x, y, w, h = box
+    # Dark text on a white margin, the way Tesseract expects it
+    line = cv2.bitwise_not(binary[y:y + h, x:x + w])
+    if h < MIN_OCR_LINE_HEIGHT:
+        factor = MIN_OCR_LINE_HEIGHT / h
+        line = cv2.resize(line, (round(w * factor), MIN_OCR_LINE_HEIGHT), interpolation=cv2.INTER_CUBIC)
+    line = cv2.copyMakeBorder(line, OCR_LINE_PADDING, OCR_LINE_PADDING, OCR_LINE_PADDING, OCR_LINE_PADDING, cv2.BORDER_CONSTANT, value=255)
+
+    data = pytesseract.image_to_data(line, config=config, output_type=pytesseract.Output.DICT)
+    return get_text_lines(data)
+
+# Tesseract options for title lines: one line, map name words as user words, only characters of known names
+def get_constrained_config(catalog: MapCatalog) -> str:
+    names = catalog.names
+    if _vocabulary.get('names') != names:
+        words = set()
+        for name in names:
+            words.update(name.split())
+        for _, _, text in catalog.features.values():
+            words.update(text.split())
+
+        os.makedirs(OCR_VOCABULARY_FOLDER, exist_ok=True)
+        words_file = os.path.join(OCR_VOCABULARY_FOLDER, 'maps.user-words').replace('\\', '/')
+        patterns_file = os.path.join(OCR_VOCABULARY_FOLDER, 'maps.user-patterns').replace('\\', '/')
+        with open(words_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(sorted(words)) + "\n")
+        with open(patterns_file, 'w', encoding='utf-8') as f:
+            # Capitalized words, like every map name word
+            f.write("\\A\\a\\*\n")
+
+        # Only plain characters go into the whitelist, quotes would break the config string
+        whitelist = ''.join(sorted({char for word in words for char in word if char.isalnum() or char == '-'}))
+        _vocabulary.update(names=names, config=(
+            f"--psm 7 --oem 3 --user-words {words_file} --user-patterns {patterns_file} "
+            f"-c tessedit_char_whitelist={whitelist}"
+        ))
+    return _vocabulary['config']
     
+# Group Tesseract words into lines: [(text, (x, y, w, h), word confidences)]
+def get_text_lines(data: Dict) -> List[Tuple[str, Tuple, List[float]]]:
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        box = (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+        confidence = float(data['conf'][i])
+        if key not in lines:
+            lines[key] = ([word], box, [confidence])
+            continue
+        words, (x, y, w, h), confidences = lines[key]
+        words.append(word)
+        confidences.append(confidence)
+        x1, y1 = max(x + w, box[0] + box[2]), max(y + h, box[1] + box[3])
+        x, y = min(x, box[0]), min(y, box[1])
+        lines[key] = (words, (x, y, x1 - x, y1 - y), confidences)
+    return [(" ".join(words), box, confidences) for words, box, confidences in lines.values()]
 
-def validate_map(text: str, maps_data: List) -> Tuple:
+def get_map_info(map_name: str, catalog: MapCatalog) -> Tuple:
+    info = catalog.get(map_name)
+    return info.info if info else (None, None, None, None)
+
+# `confidences` holds Tesseract's per-word confidences of every text line
+def validate_map(text: str, catalog: MapCatalog, confidences: Optional[List[List[float]]] = None) -> Tuple:
     if not text:
         return None, None, None, None
-    
-    # Clean the input text
-    cleaned_text = text.strip().lower()   
 
-    # Split text and compare
-    words = cleaned_text.split("\n")
+    # Every line is looked up as a whole map name
+    for line in text.split("\n"):
+        info = catalog.get(line)
+        if info:
+            return info.info
 
-    for map in maps_data:
-        if map['name'].lower() in words:
-            return map['name'], map['biomes'], map['layout'], map['notes'] 
+    # Words Tesseract was unsure about may be misread, they only need to be close to the map name's word
+    if confidences:
+        for line, line_confidences in zip(text.lower().split("\n"), confidences):
+            line_words = line.split()
+            if len(line_words) != len(line_confidences):
+                continue
+            # Only names with as many words as the line can match
+            for info, name_words in catalog.by_word_count.get(len(line_words), ()):
+                if all(
+                    word == expected or (confidence < LOW_WORD_CONFIDENCE and SequenceMatcher(None, word, expected).ratio() >= FUZZY_WORD_RATIO)
+                    for word, expected, confidence in zip(line_words, name_words, line_confidences)
+                ):
+                    return info.info
     
-    return None, None, None, None
\ No newline at end of file
+    return None, None, None, None
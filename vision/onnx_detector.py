@@ -0,0 +1,140 @@
+import cv2
+import os
+import numpy as np
+from typing import List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.tracing import trace_span, traced
+from .detection import MapDetector, MAX_OVERLAP
+from .match import MapMatch, MatchBatch, MATCH_DTYPE
+from .viewport import ViewportMask
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+ONNX_MODEL_PATH = settings.get('onnx_model_path', 'data/models/map_detector.onnx')
+ONNX_THREADS = settings.get('onnx_threads', 4)
+ONNX_INPUT_SIZE = settings.get('onnx_input_size', 640)
+ONNX_CONFIDENCE = settings.get('onnx_confidence', 0.5)
+
+# Gray padding value used by YOLO style letterboxing
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+# Resize a frame into a square input keeping its aspect ratio, padding the rest.
+# Returns the padded image, the scale and the (x, y) padding to undo the transform.
+def letterbox(image: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    height, width = image.shape[:2]
+    ratio = min(size / width, size / height)
+    new_w, new_h = max(1, round(width * ratio)), max(1, round(height * ratio))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR)
+
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    padded = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    padded[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return padded, ratio, (pad_x, pad_y)
+
+
+# Map node detector running an exported object detection model (YOLOv8 style) on the CPU
+class OnnxMapDetector(MapDetector):
+    name = 'onnx'
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, threads: int = ONNX_THREADS, input_size: int = ONNX_INPUT_SIZE, confidence: float = ONNX_CONFIDENCE) -> None:
+        if onnxruntime is None:
+            raise RuntimeError("onnxruntime is not installed (pip install onnxruntime)")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX model not found: {model_path}")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, int(threads))
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Models exported with a fixed input size override the setting, a fixed batch of 1 disables batching
+        batch, _, height, _ = model_input.shape
+        self.input_size = height if isinstance(height, int) else int(input_size)
+        self.max_batch = batch if isinstance(batch, int) else None
+        self.confidence = confidence
+        self.template = os.path.basename(model_path)
+        logger.info("Loaded ONNX detector %s (input %d, %d threads)", model_path, self.input_size, options.intra_op_num_threads)
+
+    def detect(self, screenshot: np.ndarray, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+        return self.detect_batch([screenshot], mask)[0]
+
+    # Run several frames through the model, in batches when the model allows it
+    @traced('detection.onnx')
+    def detect_batch(self, frames: List[np.ndarray], mask: Optional[ViewportMask] = None) -> List[List[MapMatch]]:
+        with trace_span('detection.prepare_frame', frames=len(frames)):
+            prepared = [self.prepare(frame, mask) for frame in frames]
+
+        batch_size = self.max_batch or len(prepared)
+        outputs = []
+        for start in range(0, len(prepared), batch_size):
+            chunk = prepared[start:start + batch_size]
+            blob = np.stack([tensor for tensor, _, _, _ in chunk])
+            with trace_span('detection.inference', batch=len(chunk)):
+                outputs.extend(self.session.run(None, {self.input_name: blob})[0])
+
+        results = []
+        for output, (_, ratio, pad, offset) in zip(outputs, prepared):
+            candidates = self.decode(output, ratio, pad, offset)
+            if mask is not None and not mask.is_full_frame:
+                candidates = candidates.filter(mask.contains(*candidates.centers()))
+            with trace_span('detection.nms', candidates=len(candidates)):
+                survivors = candidates.non_max_suppression(MAX_OVERLAP)
+            results.append(survivors.to_matches([self.template]))
+        return results
+
+    # Letterboxed, normalized NCHW RGB tensor of a frame (cropped to the viewport bounds)
+    def prepare(self, frame: np.ndarray, mask: Optional[ViewportMask]) -> Tuple:
+        if mask is not None and not mask.is_full_frame:
+            frame, offset = mask.crop(frame)
+        else:
+            offset = (0, 0)
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+        padded, ratio, pad = letterbox(frame, self.input_size)
+        tensor = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0
+        return tensor, ratio, pad, offset
+
+    # Decode one image's raw output into frame coordinate candidates.
+    # Supports raw YOLOv8 heads (4 + classes, N) and end-to-end exports (N, 6: x1, y1, x2, y2, score, class).
+    def decode(self, output: np.ndarray, ratio: float, pad: Tuple, offset: Tuple) -> MatchBatch:
+        if output.ndim == 2 and output.shape[1] == 6 and output.shape[0] != 6:
+            scores = output[:, 4]
+            keep = scores >= self.confidence
+            x1, y1, x2, y2 = output[keep, :4].T
+            scores = scores[keep]
+        else:
+            predictions = output.T if output.shape[0] < output.shape[1] else output
+            scores = predictions[:, 4:].max(axis=1)
+            keep = scores >= self.confidence
+            cx, cy, w, h = predictions[keep, :4].T
+            x1, y1, x2, y2 = cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+            scores = scores[keep]
+
+        # Undo the letterbox padding and scaling, then the viewport crop
+        x1 = (x1 - pad[0]) / ratio + offset[0]
+        y1 = (y1 - pad[1]) / ratio + offset[1]
+        x2 = (x2 - pad[0]) / ratio + offset[0]
+        y2 = (y2 - pad[1]) / ratio + offset[1]
+
+        records = np.empty(len(scores), dtype=MATCH_DTYPE)
+        records['x'] = np.round(x1)
+        records['y'] = np.round(y1)
+        records['w'] = np.maximum(np.round(x2 - x1), 1)
+        records['h'] = np.maximum(np.round(y2 - y1), 1)
+        records['confidence'] = scores
+        records['template'] = 0
+        records['scale'] = 1.0
+        return MatchBatch(records)
@@ -0,0 +1,183 @@
+from .ocr import get_text_from_region, read_region, learn_title
+from .icon_detection import IconDetector
+from .detection import create_detector
+from .calibration import ScaleCalibrator, AUTO_CALIBRATE
+from .viewport import ViewportMasker
+from .match import MapMatch
+from .worker_pool import get_worker_pool, WORKER_POOL
+from settings.map_catalog import MapCatalog
+import numpy as np
+import logging
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from utils.logger import logger
+from utils.tracing import trace_span, traced
+from utils.flight_recorder import flight_recorder
+
+# Detection, identification and strategy filtering of maps in captured frames.
+# Needs no window, mouse or UI, so it also runs offline (tools.batch_scan).
+class MapPipeline:
+    def __init__(self, catalog: MapCatalog, settings_manager: Any, auto_calibrate: bool = AUTO_CALIBRATE, viewport: Optional[ViewportMasker] = None, worker_pool: bool = WORKER_POOL,
+                 learn_titles: bool = True) -> None:
+        self.catalog = catalog
+        # Identified titles are added to the title index (data/titles), off for read-only offline runs
+        self.learn_titles = learn_titles
+        self.settings_manager = settings_manager    
+        self.icon_detector = IconDetector()
+        self.detector = create_detector()
+        # Optional worker processes for template matching and tooltip identification (None = in process)
+        self.pool = get_worker_pool(catalog) if worker_pool else None
+        # Scale calibration only applies to template matching
+        self.calibrator = None
+        if auto_calibrate and self.detector.name == 'template':
+            self.calibrator = ScaleCalibrator(find=self.pool.find_maps) if self.pool else ScaleCalibrator()
+        self.viewport = viewport if viewport is not None else ViewportMasker()
+
+    # Pick up a new catalog (changed favorites or colors) without reloading templates and icons
+    def refresh(self, catalog: MapCatalog) -> None:
+        self.catalog = catalog
+        if self.pool:
+            self.pool.set_catalog(catalog)
+
+    # Map locations in an atlas frame
+    def detect(self, screenshot: np.ndarray) -> List[MapMatch]:
+        # Skip static HUD regions (configured per resolution or learned across scans)
+        mask = self.viewport.get_mask(screenshot)
+        if self.calibrator:
+            window_size = (screenshot.shape[1], screenshot.shape[0])
+            matches = self.calibrator.detect(screenshot, window_size, mask)
+        elif self.pool and self.detector.name == 'template':
+            matches = self.pool.find_maps(screenshot, self.detector.threshold, self.detector.domain, self.detector.scales, mask)
+        else:
+            matches = self.detector.detect(screenshot, mask)
+        self.viewport.report(mask, len(matches))
+        return matches
+
+    # Process Map
+    @traced('scanner.process_map')
+    def process_map(self, screenshot: np.ndarray, match: MapMatch) -> Optional[MapMatch]:
+        x_start, y_start, x_end, y_end = self.get_tooltip_bounds(match, screenshot.shape[1], screenshot.shape[0])
+        region_img = screenshot[y_start:y_end, x_start:x_end]  
+        return self.identify(region_img, match)
+
+    # process_map without waiting for the result: returns a callable giving the processed match.
+    # With the worker pool the tooltip is identified in a worker while the caller moves on, otherwise right away.
+    # When the pool fails the tooltip is identified in this process instead.
+    def process_map_async(self, screenshot: np.ndarray, match: MapMatch) -> Callable[[], Optional[MapMatch]]:
+        if self.pool is None or not self.pool.available:
+            processed_match = self.process_map(screenshot, match)
+            return lambda: processed_match
+
+        x_start, y_start, x_end, y_end = self.get_tooltip_bounds(match, screenshot.shape[1], screenshot.shape[0])
+        region_img = screenshot[y_start:y_end, x_start:x_end]
+        try:
+            pending = self.pool.submit_identify(region_img)
+        except Exception as e:
+            logger.error("Error handing tooltip to the worker pool, identifying in process: %s", e)
+            processed_match = self.identify(region_img, match)
+            return lambda: processed_match
+        # The capture buffer is reused by the next grab, the fallback and the flight recorder need their own copy
+        region_img = region_img.copy()
+
+        def resolve() -> Optional[MapMatch]:
+            try:
+                with trace_span('scanner.identify_wait'):
+                    result = pending()
+            except Exception as e:
+                logger.error("Error identifying map in worker, identifying in process: %s", e)
+                return self.identify(region_img, match)
+            processed_match = None
+            if result:
+                map_name, biomes, layout, notes, activities, title_box = result
+                if self.learn_titles:
+                    learn_title(region_img, map_name, title_box)
+                processed_match = self.build_match(match, map_name, biomes, layout, notes, activities)
+            flight_recorder.add_tooltip(region_img, match, processed_match)
+            return processed_match
+        return resolve
+
+    # Region (x_start, y_start, x_end, y_end) where the tooltip of a hovered match is shown, within the frame
+    @staticmethod
+    def get_tooltip_bounds(match: MapMatch, frame_width: int, frame_height: int) -> Tuple[int, int, int, int]:
+        x, y = match.position
+        w, h = match.size
+
+        expand = 200
+        y_start = y
+        y_end = min(frame_height, y + h + expand + 100)
+        x_start = max(0, x - 400)
+        x_end = min(frame_width, x + w + expand + 400)
+        return x_start, y_start, x_end, y_end
+
+    # Identify the map of a tooltip region (name, layout, activities)
+    def identify(self, region_img: np.ndarray, match: MapMatch) -> Optional[MapMatch]:
+        # Get text and process region
+        if self.learn_titles:
+            map_name, biomes, layout, notes = get_text_from_region(region_img, self.catalog)
+        else:
+            (map_name, biomes, layout, notes), _ = read_region(region_img, self.catalog)
+        if map_name:            
+            activities = self.detect_activities(region_img)
+
+            processed_match = self.build_match(match, map_name, biomes, layout, notes, activities)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Processed map %s at %s: layout=%s activities=%s", map_name, match.position, layout, activities)
+            flight_recorder.add_tooltip(region_img, match, processed_match)
+            return processed_match
+            
+        flight_recorder.add_tooltip(region_img, match, None)
+        return None
+
+    # Activity names of the icons in a tooltip region
+    def detect_activities(self, region_img: np.ndarray) -> List[str]:
+        return [IconDetector.get_activity_name(icon) for icon in self.icon_detector.detect_icons(region_img)]
+
+    # Fill in the map info of an identified match
+    def build_match(self, match: MapMatch, map_name: str, biomes: List, layout: str, notes: Optional[str], activities: List) -> MapMatch:
+        # Favorite flag and layout color are precomputed by the catalog
+        info = self.catalog.get(map_name)
+        return match.with_info(
+            map_name=map_name,
+            is_citadel="citadel" in map_name.lower(),
+            biomes=tuple(biomes),
+            layout=layout,
+            notes=notes,
+            is_favorite=info.is_favorite if info else False,
+            color=info.color if info else self.catalog.get_color(layout),
+            activities=tuple(activities)
+        )
+    
+    # Check if the Map should be included in matches. (STRATEGY)
+    @traced('scanner.filter')
+    def should_include_match(self, match: MapMatch) -> bool:
+        strategy_settings = self.settings_manager.get_strategy_settings()
+        endgame_activities = strategy_settings.get('endgame_activities', {})
+        map_layouts = strategy_settings.get('map_layouts', {})
+        misc_settings = strategy_settings.get('misc', {})
+
+        must_contain_boss = misc_settings.get('contains_boss', False)
+        if must_contain_boss:
+            if 'Boss' not in match.activities:
+                return False
+        
+        # Check if only favorites is enabled
+        only_favorites = misc_settings.get('only_favorites', False)
+        if only_favorites and not match.is_favorite:
+            return False
+        
+        # Check map layout preferences
+        any_layout_enabled = any(map_layouts.values())
+        if any_layout_enabled:
+            layout = match.layout
+            if not layout or not map_layouts.get(layout, False):
+                return False
+
+        # Check if any endgame activity strategy is enabled
+        any_strategy_enabled = any(endgame_activities.values())
+        
+        # If no endgame activity strategy is enabled, include the match
+        if not any_strategy_enabled:
+            return True
+            
+        # If we have endgame strategies enabled, the match needs at least one of them (feature bitsets)
+        enabled_activities = self.catalog.feature_mask(activity for activity, is_enabled in endgame_activities.items() if is_enabled)
+        return bool(enabled_activities & self.catalog.feature_mask(match.activities))
\ No newline at end of file
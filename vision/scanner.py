@@ -1,163 +1,131 @@
 from .screenshot import get_window_screenshot
 from controls.mouse_controller import MouseController
-from .ocr import get_text_from_region
-from .icon_detection import IconDetector
-from .detection import find_maps
+from .pipeline import MapPipeline
+from .match import MapMatch
+from .ocr import get_map_info
+from settings.map_catalog import MapCatalog
 import time
-import numpy as np
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
 from utils.logger import logger
-
-class MapScanner:
-    def __init__(self, transparent_overlay: Any, maps_data: List, favorite_maps: List, layout_colors: Dict, settings_manager: Any) -> None:
+from utils.tracing import trace_span, traced
+from utils.metrics import metrics
+from utils.scan_history import scan_history, HISTORY_OCR_SKIP
+from utils.flight_recorder import flight_recorder
+
+# Live scanner: captures the game window and hovers every map, the pipeline does detection and identification
+class MapScanner(MapPipeline):
+    def __init__(self, transparent_overlay: Any, catalog: MapCatalog, settings_manager: Any) -> None:
+        super().__init__(catalog, settings_manager)
         self.transparent_overlay = transparent_overlay
-        self.maps_data = maps_data
-        self.favorite_maps = favorite_maps
-        self.layout_colors = layout_colors    
-        self.settings_manager = settings_manager    
         self.mouse_controller = MouseController()
-        self.icon_detector = IconDetector()
-        
 
     # Scan the currently hovered map
+    @traced('scanner.scan_hovered_map')
     def scan_hovered_map(self) -> List:
-        screenshot, window_rect = get_window_screenshot()
+        # OCR and icon matching work on the BGRA capture view, no BGR copy needed
+        screenshot, window_rect = get_window_screenshot(mode='bgra')
         if screenshot is None or window_rect is None:
-            logger.error(f"Failed to capture screenshot")
+            logger.error("Failed to capture screenshot")
             return []
         
         curr_x, curr_y = self.mouse_controller.get_position()
-        local_x = curr_x - window_rect[0]
-        local_y = curr_y - window_rect[1]
-        
-        region_size = 30
-        x = max(0, local_x - region_size)
-        y = max(0, local_y - region_size)
-        w = min(screenshot.shape[1] - x, region_size * 2)
-        h = min(screenshot.shape[0] - y, region_size * 2)
-
-        match = {
-            'position': (int(x), int(y)),
-            'size': (w, h)
-        }
+        match = self.get_hovered_match(curr_x - window_rect[0], curr_y - window_rect[1], screenshot.shape[1], screenshot.shape[0])
 
         processed_match = self.process_map(screenshot, match)                
         if processed_match:
+            scan_history.record(processed_match, window_rect[:2], (screenshot.shape[1], screenshot.shape[0]))
             misc_settings = self.settings_manager.get_strategy_settings()           
             if misc_settings['misc']['apply_strategy_to_single']:
-                return [processed_match] if self.should_include_match(processed_match) else []
+                return [processed_match] if self.include_match(processed_match) else []
             return [processed_match]
         return []
 
+    # Match around the cursor (window coordinates), the map under it is assumed to be there
+    @staticmethod
+    def get_hovered_match(local_x: int, local_y: int, frame_width: int, frame_height: int) -> MapMatch:
+        region_size = 30
+        x = max(0, local_x - region_size)
+        y = max(0, local_y - region_size)
+        w = min(frame_width - x, region_size * 2)
+        h = min(frame_height - y, region_size * 2)
+        return MapMatch(position=(int(x), int(y)), size=(int(w), int(h)))
+
     # Scan Entier Screen
+    @traced('scanner.scan_screen')
     def scan_screen(self) -> List:
         screenshot, window_rect = get_window_screenshot()
         if screenshot is None or window_rect is None:
-            logger.error(f"Failed to capture screenshot")
+            logger.error("Failed to capture screenshot")
             return []
         
-        matches = find_maps(screenshot)
+        flight_recorder.add_frame(screenshot, window_rect)
+        matches = self.detect(screenshot)
+        flight_recorder.add_candidates(matches)
         if not matches:
-            logger.warning(f"No map locations found")
+            logger.warning("No map locations found")
+            metrics.record_scan(0, 0, 0)
             return []
+        logger.debug("Found %d map locations", len(matches))
 
+        window_size = (screenshot.shape[1], screenshot.shape[0])
         processed_matches = []
+        # Identified maps, including the ones the strategy filter drops
+        identified = 0
+        # Identifications still running (worker pool), resolved once every map was hovered
+        pending = []
         for match in matches:           
 
-            # Convert match position to screen coordinates
-            screen_x = match['position'][0] + window_rect[0]
-            screen_y = match['position'][1] + window_rect[1]
+            # Nodes identified at the same spot a moment ago are reused without hovering them again
+            if HISTORY_OCR_SKIP:
+                processed_match = self.from_history(match, window_size)
+                if processed_match:
+                    identified += 1
+                    if self.include_match(processed_match):
+                        processed_matches.append(processed_match)
+                    continue
 
+            # Convert match position to screen coordinates
             # Move mouse to location center
-            center_x = screen_x + match['size'][0] // 2
-            center_y = screen_y + match['size'][1] // 2
+            center_x = match.center[0] + window_rect[0]
+            center_y = match.center[1] + window_rect[1]
             self.mouse_controller.move_to(center_x, center_y)
 
             # Wait for UI to appear
-            time.sleep(0.2)
+            with trace_span('scanner.tooltip_wait'):
+                time.sleep(0.2)
 
             # Take new screenshot for OCR and icon detection
-            new_screenshot, _ = get_window_screenshot()
+            new_screenshot, _ = get_window_screenshot(mode='bgra')
             if new_screenshot is not None:
-                processed_match = self.process_map(new_screenshot, match)
-                if processed_match:
-                    if self.should_include_match(processed_match):
-                        processed_matches.append(processed_match)
-
-        return processed_matches
-
-    # Process Map
-    def process_map(self, screenshot: np.ndarray, match: Dict) -> Optional[Dict]:
-       # Region to capture        
-        x = match['position'][0]
-        y = match['position'][1]
-        w = match['size'][0]
-        h =  match['size'][1]
-
-        expand = 200
-        y_start = y
-        y_end = min(screenshot.shape[0], y + h + expand + 100)
-        x_start = max(0, x - 400)
-        x_end = min(screenshot.shape[1], x + w + expand + 400)
-        
-        region_img = screenshot[y_start:y_end, x_start:x_end]  
-        
+                pending.append(self.process_map_async(new_screenshot, match))
 
-        # Get text and process region
-        map_name, biomes, layout, notes = get_text_from_region(region_img, self.maps_data)        
-        if map_name:            
-            detected_icons = self.icon_detector.detect_icons(region_img)
-            activities = [IconDetector.get_activity_name(icon) for icon in detected_icons]
+        for resolve in pending:
+            processed_match = resolve()
+            if processed_match:
+                identified += 1
+                scan_history.record(processed_match, window_rect[:2], window_size)
+                if self.include_match(processed_match):
+                    processed_matches.append(processed_match)
 
-            match['map_name'] = map_name
-            match['is_citadel'] = "citadel" in map_name.lower()
-            match['biomes'] = biomes
-            match['layout'] = layout
-            match['notes'] = notes
-            match['is_favorite'] = map_name in self.favorite_maps
-            match['color'] = self.layout_colors.get(layout, '#ffffff')
-            match['activities'] = activities    
-            return match
-            
-        return None
-    
-    # Check if the Map should be included in matches. (STRATEGY)
-    def should_include_match(self, match: Dict) -> bool:
-        strategy_settings = self.settings_manager.get_strategy_settings()
-        endgame_activities = strategy_settings.get('endgame_activities', {})
-        map_layouts = strategy_settings.get('map_layouts', {})
-        misc_settings = strategy_settings.get('misc', {})
-
-        must_contain_boss = misc_settings.get('contains_boss', False)
-        if must_contain_boss:
-            match_activities = match.get('activities', [])
-            if 'Boss' not in match_activities:
-                return False
-        
-        # Check if only favorites is enabled
-        only_favorites = misc_settings.get('only_favorites', False)
-        if only_favorites and not match.get('is_favorite', False):
-            return False
-        
-        # Check map layout preferences
-        any_layout_enabled = any(map_layouts.values())
-        if any_layout_enabled:
-            layout = match.get('layout')
-            if not layout or not map_layouts.get(layout, False):
-                return False
+        metrics.record_scan(len(matches), identified, len(processed_matches))
+        return processed_matches
 
-        # Check if any endgame activity strategy is enabled
-        any_strategy_enabled = any(endgame_activities.values())
-        
-        # If no endgame activity strategy is enabled, include the match
-        if not any_strategy_enabled:
-            return True
-            
-        # If we have endgame strategies enabled, check if the match has any of them
-        match_activities = match.get('activities', [])
-        for activity, is_enabled in endgame_activities.items():
-            if is_enabled and activity in match_activities:
-                return True
-                
-        # If we have endgame strategies enabled but none match, exclude this match
-        return False if any_strategy_enabled else True
\ No newline at end of file
+    # Strategy filter, with the decision kept by the flight recorder
+    def include_match(self, match: MapMatch) -> bool:
+        included = self.should_include_match(match)
+        flight_recorder.add_decision(match, included)
+        return included
+
+    # Reuse the remembered identification of a node at this position (same window size, recent enough)
+    def from_history(self, match: MapMatch, window_size: Tuple[int, int]) -> Optional[MapMatch]:
+        known = scan_history.lookup_position(match.position, window_size)
+        if known is None:
+            return None
+        return self.from_known(match, known['map_name'], known['activities'])
+
+    # Match filled in from a map identified earlier, None if the map is no longer in the maps list
+    def from_known(self, match: MapMatch, map_name: str, activities: List) -> Optional[MapMatch]:
+        map_name, biomes, layout, notes = get_map_info(map_name, self.catalog)
+        if map_name is None:
+            return None
+        return self.build_match(match, map_name, biomes, layout, notes, activities)
@@ -1,36 +1,89 @@
+import threading
 import win32gui
 import mss
 import numpy as np
 import cv2
 from utils.logger import logger
-from typing import Tuple
+from utils.tracing import traced
+from typing import Any, Dict, Optional, Tuple
 
-def get_window_screenshot(window_name: str = "Path of Exile 2") -> Tuple:    
+# Output buffers kept per conversion mode. Two buffers alternate so the previous
+# frame stays valid while the next one is captured (e.g. atlas frame + tooltip frame).
+BUFFERS_PER_MODE = 2
+CONVERSIONS = {
+    'bgr': (cv2.COLOR_BGRA2BGR, 3),
+    'gray': (cv2.COLOR_BGRA2GRAY, 1)
+}
+
+# mss instances and buffers are not shared between threads
+_local = threading.local()
+
+def get_mss() -> Any:
+    sct = getattr(_local, 'sct', None)
+    if sct is None:
+        sct = _local.sct = mss.mss()
+    return sct
+
+# Reusable output buffer for a mode and frame shape
+def get_frame_buffer(mode: str, shape: Tuple) -> np.ndarray:
+    buffers: Dict = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+
+    slot = buffers.get(mode)
+    if slot is None or slot['shape'] != shape:
+        slot = buffers[mode] = {'shape': shape, 'frames': [np.empty(shape, dtype=np.uint8) for _ in range(BUFFERS_PER_MODE)], 'next': 0}
+
+    frame = slot['frames'][slot['next']]
+    slot['next'] = (slot['next'] + 1) % BUFFERS_PER_MODE
+    return frame
+
+# Capture a screen rectangle.
+# mode 'bgra' returns a zero-copy view of the mss buffer, 'bgr' and 'gray' convert into a reused buffer.
+# With reuse_buffer the returned frame is overwritten two captures later, copy it to keep it.
+def capture_region(left: int, top: int, width: int, height: int, mode: str = 'bgr', reuse_buffer: bool = True) -> np.ndarray:
+    monitor = {"top": top, "left": left, "width": width, "height": height}
+    screenshot = get_mss().grab(monitor)
+
+    # Wrap the BGRA buffer without copying it
+    bgra = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+    if mode == 'bgra':
+        return bgra
+
+    code, channels = CONVERSIONS[mode]
+    shape = (screenshot.height, screenshot.width, channels) if channels > 1 else (screenshot.height, screenshot.width)
+    if not reuse_buffer:
+        return cv2.cvtColor(bgra, code)
+    return cv2.cvtColor(bgra, code, dst=get_frame_buffer(mode, shape))
+
+@traced('capture')
+def get_window_screenshot(window_name: str = "Path of Exile 2", mode: str = 'bgr', reuse_buffer: bool = True) -> Tuple:
     try:
         hwnd = win32gui.FindWindow(None, window_name)
-        if not hwnd:            
-            logger.error(f"Window '{window_name}' not found")
+        if not hwnd:
+            logger.error("Window '%s' not found", window_name)
             return None, None
-            
+
         # Get window position and size
         rect = win32gui.GetWindowRect(hwnd)
         x1, y1, x2, y2 = rect
         width = x2 - x1
         height = y2 - y1
-        
-        # Capture screenshot using mss
-        with mss.mss() as sct:
-            monitor = {"top": y1, "left": x1, "width": width, "height": height}
-            screenshot = sct.grab(monitor)
 
-            # Convert screenshot to a numpy array
-            screenshot_np = np.array(screenshot)
+        # Capture screenshot using mss
+        return capture_region(x1, y1, width, height, mode, reuse_buffer), rect
 
-            # Convert from BGRA to BGR (OpenCV format)
-            screenshot_bgr = cv2.cvtColor(screenshot_np, cv2.COLOR_BGRA2BGR)            
+    except Exception as e:
+        logger.error("Error capturing screenshot: %s", e)
+        return None, None
 
-            return screenshot_bgr, rect
-        
+# Rectangle of the game window while it has the keyboard focus, None otherwise
+def get_focused_window_rect(window_name: str = "Path of Exile 2") -> Optional[Tuple]:
+    try:
+        hwnd = win32gui.FindWindow(None, window_name)
+        if not hwnd or win32gui.GetForegroundWindow() != hwnd:
+            return None
+        return win32gui.GetWindowRect(hwnd)
     except Exception as e:
-        logger.error(f"Error capturing screenshot: {e}")
-        return None, None
\ No newline at end of file
+        logger.error("Error checking window focus: %s", e)
+        return None
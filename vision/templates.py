@@ -0,0 +1,175 @@
+import cv2
+import glob
+import json
+import os
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+# Image domains template matching can run in
+MATCH_DOMAINS = ('bgr', 'gray', 'edge')
+
+# Convert a BGR (or BGRA) image into a matching domain
+def to_domain(image: np.ndarray, domain: str) -> np.ndarray:
+    channels = image.shape[2] if image.ndim == 3 else 1
+    if domain == 'bgr':
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR) if channels == 4 else image
+
+    if channels == 1:
+        gray = image
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if channels == 4 else cv2.COLOR_BGR2GRAY)
+    if domain == 'gray':
+        return gray
+
+    if domain == 'edge':
+        # Gradient magnitude, keeps node outlines and ignores flat color shifts
+        grad_x = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3))
+        grad_y = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3))
+        return cv2.addWeighted(grad_x, 0.5, grad_y, 0.5, 0)
+
+    raise ValueError(f"Unknown match domain: {domain}")
+
+# Written next to the refs by `python -m tools.refs`, lists refs that are redundant and skipped
+MANIFEST_NAME = 'manifest.json'
+
+def get_manifest_path(refs_pattern: str) -> str:
+    return os.path.join(os.path.dirname(refs_pattern), MANIFEST_NAME)
+
+# Ref files of a refs pattern, without the ones the manifest excludes.
+# Refs added after the manifest was generated are kept until the tool runs again.
+def list_templates(refs_pattern: str, use_manifest: bool = True) -> List[str]:
+    template_files = sorted(glob.glob(refs_pattern))
+    manifest_path = get_manifest_path(refs_pattern)
+    if not use_manifest or not os.path.exists(manifest_path):
+        return template_files
+
+    try:
+        with open(manifest_path, 'r') as f:
+            excluded = set(json.load(f).get('excluded', []))
+    except Exception as e:
+        logger.error("Error loading refs manifest %s: %s", manifest_path, e)
+        return template_files
+
+    kept = [template_file for template_file in template_files if os.path.basename(template_file) not in excluded]
+    if len(kept) < len(template_files):
+        logger.info("Refs manifest skips %d of %d refs", len(template_files) - len(kept), len(template_files))
+    return kept
+
+# Read a ref as BGR, or BGRA when its alpha channel masks out some pixels (occluded or unstable parts)
+def read_template(template_file: str) -> Optional[np.ndarray]:
+    template = cv2.imread(template_file, cv2.IMREAD_UNCHANGED)
+    if template is None:
+        return None
+    if template.ndim == 2:
+        return cv2.cvtColor(template, cv2.COLOR_GRAY2BGR)
+    if template.shape[2] == 4 and template[:, :, 3].min() == 255:
+        # Fully opaque, plain matching is faster
+        return template[:, :, :3]
+    return template
+
+# Matching mask of a preprocessed template (its alpha channel), None for plain templates
+def get_template_mask(template: np.ndarray) -> Optional[np.ndarray]:
+    if template.ndim != 3 or template.shape[2] != 4:
+        return None
+    # Masked matching weights pixels by the mask, semi transparent pixels become fully used or ignored
+    _, mask = cv2.threshold(template[:, :, 3], 127, 255, cv2.THRESH_BINARY)
+    return mask
+
+# Load and preprocess template
+def load_and_preprocess_template(template_file: str, scale: float, angle: float) -> Optional[Tuple]:
+    template = read_template(template_file)
+    if template is None:
+        return None, (0, 0)
+
+    # Resize
+    width = int(template.shape[1] * scale)
+    height = int(template.shape[0] * scale)
+
+    if width == 0 or height == 0:
+        return None, (0, 0)
+
+    resized = cv2.resize(template, (width, height))
+
+    # Rotate
+    if angle != 0:
+        matrix = cv2.getRotationMatrix2D((width/2, height/2), angle, 1.0)
+        rotated = cv2.warpAffine(resized, matrix, (width, height))
+        return rotated, (width, height)
+
+    return resized, (width, height)
+
+
+# One preprocessed (scaled, rotated, domain-converted) template.
+# `mask` is set for refs with transparency, only its nonzero pixels are compared.
+class TemplateVariant:
+    __slots__ = ('template_index', 'template_file', 'scale', 'angle', 'image', 'size', 'mask')
+
+    def __init__(self, template_index: int, template_file: str, scale: float, angle: float, image: np.ndarray, size: Tuple, mask: Optional[np.ndarray] = None) -> None:
+        self.template_index = template_index
+        self.template_file = template_file
+        self.scale = scale
+        self.angle = angle
+        self.image = image
+        self.size = size
+        self.mask = mask
+
+
+# All template variants of a refs folder, built once instead of on every scan
+class TemplateBank:
+    def __init__(self, refs_pattern: str, scales: List, rotations: List, domain: str = 'bgr', use_manifest: bool = True) -> None:
+        if domain not in MATCH_DOMAINS:
+            logger.warning("Unknown match domain '%s', using bgr", domain)
+            domain = 'bgr'
+        self.refs_pattern = refs_pattern
+        self.scales = list(scales)
+        self.rotations = list(rotations)
+        self.domain = domain
+        self.use_manifest = use_manifest
+        self.template_files = []
+        self.variants = []
+        self.load()
+
+    def load(self) -> None:
+        from .image_cache import get_image_cache, ref_entry_name, ref_mask_entry_name
+
+        # Preprocessed variants are mapped from the image cache, only missing ones are decoded
+        cache = get_image_cache()
+        if cache is not None and cache.refs_pattern != self.refs_pattern:
+            cache = None
+
+        self.template_files = list_templates(self.refs_pattern, self.use_manifest)
+        self.variants = []
+        cached = 0
+        for template_index, template_file in enumerate(self.template_files):
+            for scale in self.scales:
+                for angle in self.rotations:
+                    image = cache.get(ref_entry_name(template_file, self.domain, scale, angle)) if cache else None
+                    if image is not None:
+                        cached += 1
+                        size = (image.shape[1], image.shape[0])
+                        mask = cache.get(ref_mask_entry_name(template_file, scale, angle))
+                    else:
+                        template, size = load_and_preprocess_template(template_file, scale, angle)
+                        if template is None:
+                            continue
+                        image = to_domain(template, self.domain)
+                        mask = get_template_mask(template)
+                    self.variants.append(TemplateVariant(template_index, template_file, scale, angle, image, size, mask))
+
+        masked = sum(variant.mask is not None for variant in self.variants)
+        logger.info("Loaded %d template variants from %d refs (%s domain, %d from cache, %d masked)", len(self.variants), len(self.template_files), self.domain, cached, masked)
+
+
+# Banks shared by all scans, keyed by their configuration
+_banks: Dict = {}
+
+def get_template_bank(refs_pattern: str, scales: List, rotations: List, domain: str = 'bgr') -> TemplateBank:
+    key = (refs_pattern, tuple(scales), tuple(rotations), domain)
+    bank = _banks.get(key)
+    metrics.record_cache('template_bank', bank is not None)
+    if bank is None:
+        bank = _banks[key] = TemplateBank(refs_pattern, scales, rotations, domain)
+    return bank
@@ -0,0 +1,182 @@
+import os
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.tracing import traced
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+TITLE_RECOGNIZER = settings.get('title_recognizer', True)
+TITLES_FOLDER = settings.get('titles_folder', 'data/titles')
+TITLE_MIN_SIMILARITY = settings.get('title_min_similarity', 0.9)
+
+# Gray level above which pixels count as title text
+TEXT_THRESHOLD = 150
+# Binarized lines are described at this size (width x height)
+DESCRIPTOR_SIZE = (64, 12)
+# Text lines: glyphs are joined horizontally, then boxes of plausible title height are kept
+LINE_JOIN_KERNEL = (21, 1)
+MIN_LINE_HEIGHT = 8
+MAX_LINE_HEIGHT = 48
+MIN_LINE_ASPECT = 1.5
+# The best label must beat the best other label by this much
+MIN_MARGIN = 0.02
+# Lines whose aspect ratios differ by more than this factor never match
+MAX_ASPECT_RATIO = 1.3
+# Samples kept per map name, new samples replace the oldest
+MAX_SAMPLES_PER_NAME = 8
+# Titles use the largest font: only the tallest lines are title candidates (feature lines never are)
+MAX_TITLE_LINES = 3
+# With fewer distinct maps learned there is no margin to check, Tesseract keeps running
+MIN_KNOWN_TITLES = 2
+
+
+# Boxes (x, y, w, h) of the text lines in a binarized (text = 255) image
+def find_text_lines(binary: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    joined = cv2.dilate(binary, cv2.getStructuringElement(cv2.MORPH_RECT, LINE_JOIN_KERNEL))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+    lines = []
+    for x, y, w, h, _ in stats[1:count]:
+        if MIN_LINE_HEIGHT <= h <= MAX_LINE_HEIGHT and w >= h * MIN_LINE_ASPECT:
+            lines.append((int(x), int(y), int(w), int(h)))
+    return lines
+
+# The tallest text lines, tallest first
+def find_title_lines(binary: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    return sorted(find_text_lines(binary), key=lambda box: box[3], reverse=True)[:MAX_TITLE_LINES]
+
+# Light text on the dark tooltip becomes 255, everything else 0.
+# A fixed threshold (unlike Otsu) keeps a title's shape independent of what else is in the region.
+def binarize(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(image, TEXT_THRESHOLD, 255, cv2.THRESH_BINARY)
+    return binary
+
+# Compact shape descriptor of one line: the line resized to a fixed grid, zero mean and unit length
+def describe_line(binary: np.ndarray, box: Tuple) -> np.ndarray:
+    x, y, w, h = box
+    small = cv2.resize(binary[y:y + h, x:x + w], DESCRIPTOR_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    small -= small.mean()
+    norm = np.linalg.norm(small)
+    return small / norm if norm > 0 else small
+
+
+# Nearest neighbour index of title line shapes, learned from titles Tesseract identified.
+# Map names are a closed set, so once every map was read once they are recognized without OCR.
+class TitleRecognizer:
+    def __init__(self, titles_folder: str = TITLES_FOLDER, min_similarity: float = TITLE_MIN_SIMILARITY) -> None:
+        self.index_file = os.path.join(titles_folder, 'index.npz')
+        self.min_similarity = min_similarity
+        self.descriptors = np.empty((0, DESCRIPTOR_SIZE[0] * DESCRIPTOR_SIZE[1]), dtype=np.float32)
+        self.aspects = np.empty(0, dtype=np.float32)
+        self.labels: List[str] = []
+        # Modification time of the index file the samples were loaded from or saved to
+        self.index_mtime = None
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            self.index_mtime = os.path.getmtime(self.index_file)
+            with np.load(self.index_file) as data:
+                self.descriptors = data['descriptors']
+                self.aspects = data['aspects']
+                self.labels = [str(label) for label in data['labels']]
+            logger.info("Loaded %d title samples for %d maps", len(self.labels), len(set(self.labels)))
+        except Exception as e:
+            logger.error("Error loading title index: %s", e)
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            # Unique per process, batch scan workers may learn at the same time
+            temp_file = f"{self.index_file}.{os.getpid()}.tmp.npz"
+            np.savez(temp_file, descriptors=self.descriptors, aspects=self.aspects, labels=np.array(self.labels))
+            os.replace(temp_file, self.index_file)
+            self.index_mtime = os.path.getmtime(self.index_file)
+        except Exception as e:
+            logger.error("Error saving title index: %s", e)
+
+    # Load the index again when another process saved it (pool workers only read the index)
+    def reload(self) -> None:
+        if os.path.exists(self.index_file) and os.path.getmtime(self.index_file) != self.index_mtime:
+            self.load()
+
+    @property
+    def known_names(self) -> set:
+        return set(self.labels)
+
+    # (best known map name, box of the line it was seen in) among the text lines of the region,
+    # or None when no line is close enough. The name is a candidate, ocr.read_region confirms it.
+    @traced('ocr.title_lookup')
+    def recognize(self, region_img: np.ndarray) -> Optional[Tuple[str, Tuple]]:
+        if len(set(self.labels)) < MIN_KNOWN_TITLES:
+            return None
+        binary = binarize(region_img)
+        lines = find_title_lines(binary)
+        if not lines:
+            return None
+
+        queries = np.stack([describe_line(binary, box) for box in lines])
+        aspects = np.array([w / h for _, _, w, h in lines], dtype=np.float32)
+        similarities = queries @ self.descriptors.T
+        # A title rendered in the same font has the same proportions
+        aspect_ratio = np.maximum(aspects[:, None], self.aspects[None, :]) / np.minimum(aspects[:, None], self.aspects[None, :])
+        similarities[aspect_ratio > MAX_ASPECT_RATIO] = -1.0
+
+        line, sample = np.unravel_index(np.argmax(similarities), similarities.shape)
+        best = similarities[line, sample]
+        if best < self.min_similarity:
+            return None
+
+        label = self.labels[sample]
+        others = [score for score, other in zip(similarities[line], self.labels) if other != label]
+        if best - max(others) < MIN_MARGIN:
+            return None
+        return label, lines[line]
+
+    # Remember the shape of a title line Tesseract read as `map_name`. `line_box` is Tesseract's line box,
+    # the stored sample is the detected line overlapping it most, so learning and lookup segment alike.
+    def learn(self, region_img: np.ndarray, map_name: str, line_box: Tuple) -> bool:
+        binary = binarize(region_img)
+        best_box, best_overlap = None, 0.0
+        lx, ly, lw, lh = line_box
+        for box in find_text_lines(binary):
+            x, y, w, h = box
+            inter = max(0, min(x + w, lx + lw) - max(x, lx)) * max(0, min(y + h, ly + lh) - max(y, ly))
+            overlap = inter / float(w * h + lw * lh - inter)
+            if overlap > best_overlap:
+                best_box, best_overlap = box, overlap
+        if best_box is None or best_overlap < 0.5:
+            return False
+
+        # Keep a bounded number of samples per name, dropping the oldest
+        positions = [i for i, label in enumerate(self.labels) if label == map_name]
+        if len(positions) >= MAX_SAMPLES_PER_NAME:
+            keep = np.ones(len(self.labels), dtype=bool)
+            keep[positions[0]] = False
+            self.descriptors, self.aspects = self.descriptors[keep], self.aspects[keep]
+            self.labels = [label for label, kept in zip(self.labels, keep) if kept]
+
+        self.descriptors = np.vstack([self.descriptors, describe_line(binary, best_box)[None, :]])
+        self.aspects = np.append(self.aspects, np.float32(best_box[2] / best_box[3]))
+        self.labels.append(map_name)
+        self.save()
+        logger.debug("Learned title shape of %s (%d samples)", map_name, len(self.labels))
+        return True
+
+
+# Shared instance, None when the recognizer is disabled
+_recognizer: Dict = {}
+
+def get_title_recognizer() -> Optional[TitleRecognizer]:
+    if not TITLE_RECOGNIZER:
+        return None
+    if 'recognizer' not in _recognizer:
+        _recognizer['recognizer'] = TitleRecognizer()
+    return _recognizer['recognizer']
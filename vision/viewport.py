@@ -0,0 +1,164 @@
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+# Per resolution masks: {"1920x1080": {"bounds": [x, y, w, h], "exclude": [[x, y, w, h], ...]}}
+VIEWPORT_MASKS = settings.get('viewport_masks', {})
+AUTO_VIEWPORT_MASK = settings.get('auto_viewport_mask', False)
+
+# Auto derivation works on frames downscaled by this factor
+DOWNSCALE = 8
+# Atlas pans needed before static regions are trusted
+MIN_PANS = 3
+# A downscaled pixel changed between two frames when its gray level moved by more than this
+CHANGE_DIFF = 6.0
+# Two frames are a pan when this share of the frame centre changed (a pulsing glow or hover highlight is not)
+PAN_SHARE = 0.5
+# A border row/column is HUD when this share of its pixels is static
+STATIC_LINE_SHARE = 0.95
+# Largest share of the frame each border band may take (top, bottom, left, right)
+MAX_BAND_SHARE = (0.15, 0.2, 0.25, 0.25)
+# The learned mask is dropped when a scan under it finds less than this share of the previous scan's matches
+MIN_KEPT_MATCHES = 0.5
+
+
+# Area of the frame where map nodes can appear
+class ViewportMask:
+    def __init__(self, frame_size: Tuple, bounds: Optional[Tuple] = None, exclude: Optional[List] = None) -> None:
+        width, height = frame_size
+        self.frame_size = (width, height)
+        x, y, w, h = bounds or (0, 0, width, height)
+        # Clip the bounds to the frame
+        self.x0, self.y0 = max(0, int(x)), max(0, int(y))
+        self.x1, self.y1 = min(width, int(x + w)), min(height, int(y + h))
+        self.exclude = [tuple(int(v) for v in rect) for rect in (exclude or [])]
+
+    @property
+    def is_full_frame(self) -> bool:
+        return not self.exclude and (self.x0, self.y0, self.x1, self.y1) == (0, 0) + self.frame_size
+
+    # View of the frame restricted to the bounds, and the offset of that view
+    def crop(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        return frame[self.y0:self.y1, self.x0:self.x1], (self.x0, self.y0)
+
+    # Which points (arrays of frame coordinates) lie in the viewport
+    def contains(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        inside = (xs >= self.x0) & (xs < self.x1) & (ys >= self.y0) & (ys < self.y1)
+        for x, y, w, h in self.exclude:
+            inside &= ~((xs >= x) & (xs < x + w) & (ys >= y) & (ys < y + h))
+        return inside
+
+    def to_dict(self) -> Dict:
+        return {'bounds': [self.x0, self.y0, self.x1 - self.x0, self.y1 - self.y0], 'exclude': [list(rect) for rect in self.exclude]}
+
+
+# Learns the static HUD bands (top bar, side panels, bottom HUD) across scans.
+# Only frames where the atlas was panned count: a pixel is static when it never changed while the map under it moved,
+# an atlas left in place is as still as the HUD and teaches nothing.
+class StaticRegionTracker:
+    def __init__(self) -> None:
+        self.frame_size = None
+        self.previous = None
+        self.changed = None
+        self.pans = 0
+
+    def reset(self, frame_size: Optional[Tuple] = None) -> None:
+        self.frame_size = frame_size
+        self.previous = None
+        self.changed = None
+        self.pans = 0
+
+    # Add one frame (compared with the previous one on a downscaled grayscale copy)
+    def observe(self, frame: np.ndarray) -> None:
+        frame_size = (frame.shape[1], frame.shape[0])
+        if frame_size != self.frame_size:
+            self.reset(frame_size)
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (max(1, frame_size[0] // DOWNSCALE), max(1, frame_size[1] // DOWNSCALE)), interpolation=cv2.INTER_AREA).astype(np.float32)
+        previous, self.previous = self.previous, small
+        if previous is None:
+            return
+
+        changed = np.abs(small - previous) > CHANGE_DIFF
+        rows, cols = changed.shape
+        centre = changed[rows // 4:rows - rows // 4, cols // 4:cols - cols // 4]
+        if centre.size == 0 or centre.mean() < PAN_SHARE:
+            return
+        self.pans += 1
+        self.changed = changed if self.changed is None else self.changed | changed
+
+    # Count the border rows (or columns) that are almost entirely static, up to a limit
+    @staticmethod
+    def band_size(static_share: np.ndarray, limit: int) -> int:
+        size = 0
+        while size < limit and static_share[size] >= STATIC_LINE_SHARE:
+            size += 1
+        return size
+
+    def get_mask(self) -> Optional[ViewportMask]:
+        if self.pans < MIN_PANS or self.changed is None:
+            return None
+
+        static = ~self.changed
+        rows, cols = static.shape
+
+        # If (almost) nothing moved between scans there is nothing to separate the HUD from
+        if static.mean() > STATIC_LINE_SHARE:
+            return None
+
+        row_share = static.mean(axis=1)
+        col_share = static.mean(axis=0)
+        top = self.band_size(row_share, int(rows * MAX_BAND_SHARE[0]))
+        bottom = self.band_size(row_share[::-1], int(rows * MAX_BAND_SHARE[1]))
+        left = self.band_size(col_share, int(cols * MAX_BAND_SHARE[2]))
+        right = self.band_size(col_share[::-1], int(cols * MAX_BAND_SHARE[3]))
+
+        # The downscaled grid drops the last partial cell, so the far edges are measured from the full frame
+        width, height = self.frame_size
+        x0, y0 = left * DOWNSCALE, top * DOWNSCALE
+        x1, y1 = width - right * DOWNSCALE, height - bottom * DOWNSCALE
+        return ViewportMask(self.frame_size, (x0, y0, x1 - x0, y1 - y0))
+
+
+# Picks the mask for a frame: configured per resolution first, then the auto-derived one
+class ViewportMasker:
+    def __init__(self, masks: Optional[Dict] = None, auto: bool = AUTO_VIEWPORT_MASK) -> None:
+        self.masks = masks if masks is not None else VIEWPORT_MASKS
+        self.tracker = StaticRegionTracker() if auto else None
+        self.logged_mask = None
+        # Last mask handed out by the tracker, and the match count of the previous scan
+        self.auto_mask = None
+        self.last_count = 0
+
+    def get_mask(self, frame: np.ndarray) -> Optional[ViewportMask]:
+        frame_size = (frame.shape[1], frame.shape[0])
+        configured = self.masks.get(f"{frame_size[0]}x{frame_size[1]}")
+        if configured:
+            return ViewportMask(frame_size, configured.get('bounds'), configured.get('exclude'))
+
+        if self.tracker is None:
+            return None
+        self.tracker.observe(frame)
+        mask = self.auto_mask = self.tracker.get_mask()
+        if mask and mask.to_dict() != self.logged_mask:
+            self.logged_mask = mask.to_dict()
+            logger.info("Viewport mask derived from static regions: %s", self.logged_mask['bounds'])
+        return mask
+
+    # Re-validate the learned mask with the matches found under it.
+    # When they disappear the bands may cover map area, so the mask is dropped and learned again.
+    def report(self, mask: Optional[ViewportMask], match_count: int) -> None:
+        last_count, self.last_count = self.last_count, match_count
+        if mask is None or mask is not self.auto_mask or last_count == 0:
+            return
+        if match_count < last_count * MIN_KEPT_MATCHES:
+            logger.info("Viewport mask dropped, matches went from %d to %d under it", last_count, match_count)
+            self.tracker.reset()
+            self.auto_mask = None
+            self.logged_mask = None
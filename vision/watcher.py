@@ -0,0 +1,170 @@
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from typing import Any, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from utils.logger import logger
+from utils.tracing import traced
+from utils.scan_history import scan_history
+from .screenshot import capture_region, get_focused_window_rect
+from .title_recognizer import binarize, find_text_lines, find_title_lines
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+WATCH_MODE = settings.get('watch_mode', False)
+WATCH_INTERVAL = settings.get('watch_interval', 0.25)
+WATCH_IDLE_INTERVAL = settings.get('watch_idle_interval', 2.0)
+WATCH_CPU_BUDGET = settings.get('watch_cpu_budget', 0.1)
+
+# The tooltip area is compared at 1/n resolution. It has new content when more than CHANGED_FRACTION
+# of its pixels changed by more than CHANGE_THRESHOLD gray levels.
+DIFF_DOWNSCALE = 8
+CHANGE_THRESHOLD = 24
+CHANGED_FRACTION = 0.01
+# A tooltip has a title and at least one more line of text
+MIN_TOOLTIP_LINES = 2
+# Tooltip fingerprints: the title line (tallest text line) as a difference hash and its aspect ratio.
+# Tooltips share their layout, only the title tells maps apart.
+HASH_SIZE = (33, 8)
+MAX_HASH_DISTANCE = 4
+# Titles of different length never match
+MAX_ASPECT_RATIO = 1.1
+MAX_CACHED_TOOLTIPS = 256
+
+
+# Fingerprint (packed hash, aspect ratio) of the tooltip title, independent of where the tooltip sits in the captured area
+def title_hash(binary: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
+    lines = find_title_lines(binary)
+    if not lines:
+        return None
+    x, y, w, h = lines[0]
+    small = cv2.resize(binary[y:y + h, x:x + w], HASH_SIZE, interpolation=cv2.INTER_AREA)
+    return np.packbits((small[:, 1:] > small[:, :-1]).ravel()), w / h
+
+
+# Passive identification of the hovered map: the tooltip area around the cursor is sampled at a low rate
+# and a map is only identified once the area changed and settled (a tooltip appeared).
+# Identified tooltips are remembered by title fingerprint, so hovering a map again costs no OCR.
+# Failed identifications are not remembered, the next sample of the tooltip tries again.
+# Only the map name is remembered: activity icons barely change the fingerprint, they are detected on every hit.
+class HoverWatcher:
+    def __init__(self, scanner: Any, enabled: bool = WATCH_MODE, interval: float = WATCH_INTERVAL,
+                 idle_interval: float = WATCH_IDLE_INTERVAL, cpu_budget: float = WATCH_CPU_BUDGET) -> None:
+        self.scanner = scanner
+        self.enabled = enabled
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.cpu_budget = cpu_budget
+        self.next_poll = 0.0
+        self.previous: Optional[np.ndarray] = None
+        self.changed = False
+        # Packed title hash -> (map name, title aspect ratio).
+        # Least recently used entries are dropped first.
+        self.cache: OrderedDict = OrderedDict()
+
+    def toggle(self) -> bool:
+        self.enabled = not self.enabled
+        self.reset()
+        logger.info("Watch mode %s", "enabled" if self.enabled else "disabled")
+        return self.enabled
+
+    def reset(self) -> None:
+        self.previous = None
+        self.changed = False
+
+    # Called from the main loop. Returns the matches to show when a new map tooltip was identified.
+    def poll(self) -> List:
+        now = time.perf_counter()
+        if not self.enabled or now < self.next_poll:
+            return []
+
+        window_rect = get_focused_window_rect()
+        if window_rect is None:
+            # Nothing to watch while the game is in the background
+            self.reset()
+            self.next_poll = now + self.idle_interval
+            return []
+
+        try:
+            matches = self.sample(window_rect)
+        except Exception as e:
+            logger.error("Error in watch mode: %s", e)
+            matches = []
+
+        # Stay within the CPU budget: a poll that took longer delays the next one proportionally
+        busy = time.perf_counter() - now
+        self.next_poll = now + max(self.interval, busy / self.cpu_budget)
+        return matches
+
+    @traced('watch.sample')
+    def sample(self, window_rect: Tuple) -> List:
+        left, top, right, bottom = window_rect
+        cursor_x, cursor_y = self.scanner.mouse_controller.get_position()
+        match = self.scanner.get_hovered_match(cursor_x - left, cursor_y - top, right - left, bottom - top)
+        x_start, y_start, x_end, y_end = self.scanner.get_tooltip_bounds(match, right - left, bottom - top)
+        if x_end <= x_start or y_end <= y_start:
+            return []
+
+        region = capture_region(left + x_start, top + y_start, x_end - x_start, y_end - y_start, mode='bgra')
+        gray = cv2.cvtColor(region, cv2.COLOR_BGRA2GRAY)
+        small = cv2.resize(gray, None, fx=1 / DIFF_DOWNSCALE, fy=1 / DIFF_DOWNSCALE, interpolation=cv2.INTER_AREA)
+
+        previous, self.previous = self.previous, small
+        if previous is None or previous.shape != small.shape:
+            self.changed = True
+            return []
+        if np.count_nonzero(cv2.absdiff(previous, small) > CHANGE_THRESHOLD) > CHANGED_FRACTION * small.size:
+            # Still changing (cursor moving, tooltip fading in), wait until it settles
+            self.changed = True
+            return []
+        if not self.changed:
+            return []
+        self.changed = False
+
+        binary = binarize(gray)
+        if len(find_text_lines(binary)) < MIN_TOOLTIP_LINES:
+            return []
+        fingerprint = title_hash(binary)
+        if fingerprint is None:
+            return []
+
+        packed, aspect = fingerprint
+        map_name = self.lookup(packed, aspect)
+        if map_name is not None:
+            # The same map shows up at many nodes with different activities
+            processed_match = self.scanner.from_known(match, map_name, self.scanner.detect_activities(region))
+        else:
+            # The bgra capture wraps this grab's own buffer (not the shared frame buffer), no copy needed
+            processed_match = self.scanner.identify(region, match)
+            if processed_match is not None:
+                self.remember(packed, aspect, processed_match.map_name)
+
+        if processed_match is None:
+            return []
+        scan_history.record(processed_match, (left, top), (right - left, bottom - top))
+
+        misc_settings = self.scanner.settings_manager.get_strategy_settings()
+        if misc_settings['misc']['apply_strategy_to_single'] and not self.scanner.include_match(processed_match):
+            return []
+        return [processed_match]
+
+    # Map name of the closest fingerprint with a title of the same proportions, None when nothing is close enough
+    def lookup(self, packed: np.ndarray, aspect: float) -> Optional[str]:
+        best_key, best_distance = None, MAX_HASH_DISTANCE + 1
+        for key, (_, known_aspect) in self.cache.items():
+            if max(aspect, known_aspect) / min(aspect, known_aspect) > MAX_ASPECT_RATIO:
+                continue
+            distance = int(np.unpackbits(np.bitwise_xor(np.frombuffer(key, dtype=np.uint8), packed)).sum())
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        if best_key is None:
+            return None
+        self.cache.move_to_end(best_key)
+        return self.cache[best_key][0]
+
+    def remember(self, packed: np.ndarray, aspect: float, map_name: str) -> None:
+        self.cache[packed.tobytes()] = (map_name, aspect)
+        if len(self.cache) > MAX_CACHED_TOOLTIPS:
+            self.cache.popitem(last=False)
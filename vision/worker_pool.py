@@ -0,0 +1,279 @@
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from settings.settings_manager import SettingsManager
+from settings.map_catalog import MapCatalog
+from utils.logger import logger, forward_logs, get_process_log_queue
+from utils.metrics import metrics
+from utils.tracing import tracer, traced
+from .detection import find_maps, find_map_candidates, get_template_bank, MAX_OVERLAP, REFS_FOLDER_PATH, DEFAULT_SCALES, DEFAULT_ROTATIONS, MATCH_DOMAIN
+from .icon_detection import IconDetector
+from .match import MapMatch, MatchBatch
+from .ocr import read_region
+from .title_recognizer import get_title_recognizer
+from .viewport import ViewportMask
+
+
+settings_manager = SettingsManager()
+settings = settings_manager.settings.get('settings', {})
+WORKER_POOL = settings.get('worker_pool', False)
+WORKER_COUNT = settings.get('worker_count', 2)
+WORKER_WARM_START = settings.get('worker_warm_start', True)
+
+# Shared blocks a worker keeps attached, older ones are closed first
+MAX_ATTACHED_BLOCKS = 8
+# Tooltip regions in flight per worker while the scanner hovers the next maps
+REGION_SLOTS_PER_WORKER = 2
+# A dead worker breaks the whole executor. It is replaced this many times per session, then everything runs in process.
+MAX_RESTARTS = 3
+
+
+# Reusable shared memory block written by the scanner process. Only its name, shape and dtype are sent to workers.
+class SharedFrame:
+    def __init__(self) -> None:
+        self.block: Optional[shared_memory.SharedMemory] = None
+
+    def write(self, frame: np.ndarray) -> Tuple[str, Tuple, str]:
+        if self.block is None or self.block.size < frame.nbytes:
+            # A bigger frame (window resized) gets a new block
+            self.release()
+            self.block = shared_memory.SharedMemory(create=True, size=max(frame.nbytes, 1))
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.block.buf)[...] = frame
+        return self.block.name, frame.shape, frame.dtype.str
+
+    def release(self) -> None:
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+
+# Worker process state: attached blocks, the preloaded detection and OCR resources and the catalog
+_attached: OrderedDict = OrderedDict()
+_worker: Dict = {}
+# Spans and counters recorded by the task running in this worker, sent back with its result
+_telemetry: Dict = {'report': False, 'spans': []}
+
+def attach_frame(frame_ref: Tuple[str, Tuple, str]) -> np.ndarray:
+    name, shape, dtype = frame_ref
+    block = _attached.get(name)
+    if block is None:
+        try:
+            # The scanner process owns the block, the worker must not unlink it on exit (Python 3.13+)
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            block = shared_memory.SharedMemory(name=name)
+        _attached[name] = block
+        while len(_attached) > MAX_ATTACHED_BLOCKS:
+            _attached.popitem(last=False)[1].close()
+    _attached.move_to_end(name)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+def init_worker(warm_start: bool, log_queue: Any, catalog: MapCatalog, report_telemetry: bool) -> None:
+    # Log records are written by the scanner process, only it holds the log file
+    forward_logs(log_queue)
+    # Workers already run in parallel, OpenCV's own threads would only compete with each other
+    cv2.setNumThreads(1)
+    # Sent once here, not with every tooltip region
+    _worker['catalog'] = catalog
+    # Stage times and counters are reported by the scanner process, this worker's registry is never exported
+    tracer.remove_listener(metrics.on_span)
+    if report_telemetry:
+        _telemetry['report'] = True
+        tracer.add_listener(collect_span)
+    if warm_start:
+        warm_up()
+        # Loading is not part of any scan
+        take_telemetry()
+
+def collect_span(name: str, duration: float, args: Dict) -> None:
+    duration_ns = int(duration * 1e9)
+    _telemetry['spans'].append((name, time.perf_counter_ns() - duration_ns, duration_ns, args))
+
+# (pid, spans, counters) recorded since the last call, None when the scanner process does not report them
+def take_telemetry() -> Optional[Tuple]:
+    if not _telemetry['report']:
+        return None
+    spans, _telemetry['spans'] = _telemetry['spans'], []
+    return os.getpid(), spans, metrics.take_counters()
+
+# Hand what a worker recorded to this process's tracer and metrics registry
+def report_telemetry(telemetry: Optional[Tuple]) -> None:
+    if telemetry is None:
+        return
+    pid, spans, counters = telemetry
+    tracer.add_spans(spans, pid)
+    metrics.merge_counters(counters)
+
+# Load templates, icons and the title index before the first scan needs them
+def warm_up() -> int:
+    get_template_bank(REFS_FOLDER_PATH, DEFAULT_SCALES, DEFAULT_ROTATIONS, MATCH_DOMAIN)
+    get_icon_detector()
+    get_title_recognizer()
+    return os.getpid()
+
+def get_icon_detector() -> IconDetector:
+    if 'icons' not in _worker:
+        _worker['icons'] = IconDetector()
+    return _worker['icons']
+
+# One share of a template matching scan, returned as bare match records
+def detect_part(frame_ref: Tuple, threshold: float, domain: Optional[str], scales: Optional[List], mask: Optional[ViewportMask], part: Tuple[int, int]) -> Tuple[np.ndarray, List[str], Optional[Tuple]]:
+    frame = attach_frame(frame_ref)
+    survivors, template_files = find_map_candidates(frame, threshold, domain, scales, mask, part)
+    return survivors.records, template_files, take_telemetry()
+
+# Map info, activities and the Tesseract title box of a tooltip region (or None), with the worker's telemetry.
+# Titles are learned by the scanner process (learn_title), each worker would overwrite the index with its own copy.
+def identify_region(region_ref: Tuple) -> Tuple[Optional[Tuple], Optional[Tuple]]:
+    recognizer = get_title_recognizer()
+    if recognizer is not None:
+        # Pick up titles the scanner process learned since
+        recognizer.reload()
+    region_img = attach_frame(region_ref)
+    (map_name, biomes, layout, notes), title_box = read_region(region_img, _worker['catalog'])
+    if not map_name:
+        return None, take_telemetry()
+    activities = [IconDetector.get_activity_name(icon) for icon in get_icon_detector().detect_icons(region_img)]
+    return (map_name, biomes, layout, notes, activities, title_box), take_telemetry()
+
+
+# Process pool for template matching and tooltip identification.
+# Frames go through shared memory, results come back as match records or plain map info.
+class WorkerPool:
+    def __init__(self, catalog: MapCatalog, workers: int = WORKER_COUNT, warm_start: bool = WORKER_WARM_START) -> None:
+        self.workers = max(1, workers)
+        self.warm_start = warm_start
+        self.catalog = catalog
+        self.restarts = 0
+        if os.name == 'posix':
+            # Workers share this process's resource tracker. One of their own would unlink the blocks when the worker exits.
+            resource_tracker.ensure_running()
+        self.frame = SharedFrame()
+        self.region_slots = [SharedFrame() for _ in range(self.workers * REGION_SLOTS_PER_WORKER)]
+        self.region_futures: List[Optional[Future]] = [None] * len(self.region_slots)
+        self.next_slot = 0
+        self.executor: Optional[ProcessPoolExecutor] = self.start_executor()
+
+    def start_executor(self) -> ProcessPoolExecutor:
+        # Worker spans and counters only travel back when something here records them
+        report = tracer.enabled or bool(tracer.listeners)
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                       initargs=(self.warm_start, get_process_log_queue(), self.catalog, report))
+        if self.warm_start:
+            # Start every worker now, so loading happens while the user is still in the menus
+            for _ in range(self.workers):
+                executor.submit(os.getpid)
+        return executor
+
+    # Workers only read map names, biomes, layouts and features. A catalog that differs in those
+    # (not just favorites or colors) restarts them with the new one.
+    def set_catalog(self, catalog: MapCatalog) -> None:
+        if catalog is self.catalog:
+            return
+        changed = [info.info for info in catalog.maps] != [info.info for info in self.catalog.maps] or catalog.features != self.catalog.features
+        self.catalog = catalog
+        if changed and self.executor is not None:
+            logger.info("Map list changed, restarting the worker pool")
+            self.executor.shutdown(wait=True)
+            self.region_futures = [None] * len(self.region_slots)
+            self.executor = self.start_executor()
+
+    # False once the pool broke too often, callers then work in process
+    @property
+    def available(self) -> bool:
+        return self.executor is not None
+
+    # Replace an executor whose worker died. Futures of the same executor fail too, only the first one replaces it.
+    def on_broken(self, executor: ProcessPoolExecutor) -> None:
+        if executor is not self.executor:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.region_futures = [None] * len(self.region_slots)
+        if self.restarts < MAX_RESTARTS:
+            self.restarts += 1
+            logger.error("Worker pool broke, restarting it (%d/%d)", self.restarts, MAX_RESTARTS)
+            self.executor = self.start_executor()
+        else:
+            logger.error("Worker pool broke %d times, scanning in process from now on", self.restarts + 1)
+            self.executor = None
+
+    # find_maps with the template variants split over the workers, overlap filtering runs again on the merged results.
+    # Falls back to find_maps in this process when the pool fails.
+    @traced('pool.find_maps')
+    def find_maps(self, screenshot: np.ndarray, threshold: float = 0.6, domain: Optional[str] = None, scales: Optional[List] = None, mask: Optional[ViewportMask] = None) -> List[MapMatch]:
+        executor = self.executor
+        if executor is not None:
+            try:
+                frame_ref = self.frame.write(screenshot)
+                futures = [executor.submit(detect_part, frame_ref, threshold, domain, scales, mask, (index, self.workers)) for index in range(self.workers)]
+                batches, template_files = [], []
+                for future in futures:
+                    records, template_files, telemetry = future.result()
+                    report_telemetry(telemetry)
+                    batches.append(MatchBatch(records))
+                return MatchBatch.concatenate(batches).non_max_suppression(MAX_OVERLAP).to_matches(template_files)
+            except Exception as e:
+                logger.error("Error matching templates in the worker pool, matching in process: %s", e)
+                if isinstance(e, BrokenProcessPool):
+                    self.on_broken(executor)
+        return find_maps(screenshot, threshold, domain, scales, mask)
+
+    # Start identifying a tooltip region. The returned callable gives (map_name, biomes, layout, notes, activities, title_box)
+    # or None, and raises when the worker failed. The region is copied into a slot right away, the caller may reuse its buffer.
+    def submit_identify(self, region_img: np.ndarray) -> Callable[[], Optional[Tuple]]:
+        executor = self.executor
+        if executor is None:
+            raise BrokenProcessPool("Worker pool is stopped")
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % len(self.region_slots)
+        # A slot is only rewritten once the worker reading it is done
+        if self.region_futures[slot] is not None:
+            wait([self.region_futures[slot]])
+        region_ref = self.region_slots[slot].write(np.ascontiguousarray(region_img))
+        try:
+            future = self.region_futures[slot] = executor.submit(identify_region, region_ref)
+        except BrokenProcessPool:
+            self.on_broken(executor)
+            raise
+
+        def result() -> Optional[Tuple]:
+            try:
+                identified, telemetry = future.result()
+            except BrokenProcessPool:
+                self.on_broken(executor)
+                raise
+            report_telemetry(telemetry)
+            return identified
+        return result
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        for shared_frame in [self.frame] + self.region_slots:
+            shared_frame.release()
+
+
+# Pool shared by the scanner, created on first use
+_pool: Dict = {}
+
+def get_worker_pool(catalog: MapCatalog) -> Optional[WorkerPool]:
+    if 'pool' not in _pool:
+        try:
+            _pool['pool'] = WorkerPool(catalog)
+            logger.info("Worker pool started with %d processes", _pool['pool'].workers)
+        except Exception as e:
+            logger.error("Error starting worker pool, scanning in process: %s", e)
+            _pool['pool'] = None
+    return _pool['pool']
+
+def shutdown_worker_pool() -> None:
+    pool = _pool.pop('pool', None)
+    if pool is not None:
+        pool.shutdown()